@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+オフライン計測用の道具一式（保存済みHTMLフィクスチャを使う）
+"""
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+ロードドライバー: 各サイトの scrape.py をローカル代役サーバー（bench/mock_server.py）に向けて実行し、
+処理速度とエラー処理の結果を表示する
+- 一時ディレクトリに入力CSV（代役サーバーのURL）を作り、スクリプトをそのまま子プロセスで起動
+- 結果: 経過時間、URL/秒、出力行数、ジャーナル上の成功/失敗件数、文字化け行数、
+  サーバー側で受けたリクエスト数と注入した障害の件数
+- 制限: 代役サーバーのURLは本番のURL空間ではなく /<サイト>/<パス> なので、URLは入力CSVで直接渡す。
+  サイトマップからのURL収集（SITEMAP_HOME、--incremental）と URL_RULES による絞り込みは通らない
+  （例えば dairitenbosyuu の URL_RULES は1階層のパスだけを対象にするため、代役サーバーのURLには一致しない）。
+  これらは fetch_urls.py を本番に向けて確認する
+
+使い方:
+  python bench/load.py dairitenhonpo --urls 500 --latency-ms 80 --jitter-ms 40
+  python bench/load.py franchise_no_madoguti --urls 200 --burst-every 5 --burst-len 1 --reset-rate 0.02
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.mock_server import BackgroundServer, MockServer, add_fault_args, fault_config_from_args
+
+# サイトごとの起動方法
+#   script: 実行するスクリプト、path: 代役サーバー上のURLパス（{} に連番）
+#   input: 入力CSVのファイル名、args: 追加の引数、output / journal: 出力とジャーナル
+SITES: Dict[str, dict] = {
+    "dairitenhonpo": {
+        "script": "dairitenhonpo/scrape.py",
+        "path": "syo/{}",
+        "input": "all_urls.csv",
+        "args": [],
+        "output": "company_info.csv",
+        "journal": "company_info.journal.jsonl",
+    },
+    "repre": {
+        "script": "repre/scrape.py",
+        "path": "dairiten-bosyu/{}",
+        "input": "all_urls.csv",
+        "args": ["all_urls.csv", "company_info_all.csv"],
+        "output": "company_info_all.csv",
+        "journal": "company_info_all.journal.jsonl",
+    },
+    "dairitenbosyuu": {
+        "script": "dairitenbosyuu/scrape.py",
+        "path": "{}",
+        "input": "urls.csv",
+        "args": [],
+        "output": "scraped_companies.csv",
+        "journal": "scraped_companies.journal.jsonl",
+    },
+    "franchise_no_madoguti": {
+        "script": "franchise_no_madoguti/scrape.py",
+        "path": "detail/{}",
+        "input": "urls.csv",
+        "args": ["urls.csv"],
+        "output": "company_info_output.csv",
+        "journal": "company_info_output.journal.jsonl",
+    },
+}
+
+
+def write_urls(path: Path, urls: List[str]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["url"])
+        for u in urls:
+            writer.writerow([u])
+
+
+def journal_summary(path: Path) -> Counter:
+    """URLごとの最終状態を数える（再試行で成功したものは成功）"""
+    last: Dict[str, str] = {}
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                last[entry["url"]] = entry["status"]
+    return Counter(last.values())
+
+
+def output_summary(path: Path) -> Dict[str, int]:
+    rows = mojibake = 0
+    if path.exists():
+        with open(path, "r", newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                rows += 1
+                if any("�" in (v or "") for v in row.values()):
+                    mojibake += 1
+    return {"rows": rows, "mojibake_rows": mojibake}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="scrape.py を代役サーバーに向けて実行する")
+    ap.add_argument("site", choices=sorted(SITES))
+    ap.add_argument("--urls", type=int, default=200, help="投入するURL数")
+    ap.add_argument("--keep", action="store_true", help="作業ディレクトリを残す")
+    ap.add_argument("--timeout", type=float, default=1800.0)
+    add_fault_args(ap)
+    args = ap.parse_args()
+    spec = SITES[args.site]
+
+    server = MockServer(fault_config_from_args(args))
+    with BackgroundServer(server) as bg:
+        workdir = Path(tempfile.mkdtemp(prefix=f"load_{args.site}_"))
+        urls = [f"{bg.base_url}/{args.site}/{spec['path'].format(i)}" for i in range(args.urls)]
+        write_urls(workdir / spec["input"], urls)
+
+        # キャッシュも作業ディレクトリに置き、前回の計測分を読まないようにする
+        env = dict(
+            os.environ, PYTHONPATH=str(ROOT), SCRAPE_HTTP_CACHE_DIR=str(workdir / ".http_cache")
+        )
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, str(ROOT / spec["script"]), *spec["args"]],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=args.timeout,
+        )
+        elapsed = time.perf_counter() - start
+
+    journal = journal_summary(workdir / spec["journal"])
+    out = output_summary(workdir / spec["output"])
+    stats = dict(server.stats)
+    report = {
+        "site": args.site,
+        "urls": args.urls,
+        "exit_code": proc.returncode,
+        "elapsed_sec": round(elapsed, 2),
+        "urls_per_sec": round(args.urls / elapsed, 1) if elapsed else None,
+        "journal_ok": journal.get("ok", 0),
+        "journal_failed": journal.get("failed", 0),
+        **out,
+        "server": stats,
+        # 1URLあたりのリクエスト数（再試行・再取得の多さの目安）
+        "requests_per_url": round(stats.get("requests", 0) / args.urls, 2) if args.urls else None,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:], file=sys.stderr)
+    if args.keep:
+        print(f"[INFO] 作業ディレクトリ: {workdir}", file=sys.stderr)
+    else:
+        shutil.rmtree(workdir)
+    sys.exit(proc.returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用フィクスチャ（bench/fixtures）の生成スクリプト
+- コーパスは実サイトの保存ページではなく、各サイトのページ構造（抽出器が見るタグ・クラス・
+  ラベル、ナビゲーションや script / style などの周辺部分）を模した合成HTML。
+  実サイトのページは再配布できず、取得し直すと中身が変わってベースラインと比べられないため
+- 抽出器の変更でサイト側の構造と食い違っていないかは、このコーパスでは分からない
+  （実ページでの確認は別途行う）
+- 乱数のシードを固定しているので、同じバージョンなら毎回同じ内容になる
+- 既存ページの生成順は変えず、ページを足すときは末尾に追加して CORPUS_VERSION を上げる
+
+使い方:
+  python bench/make_fixtures.py
+"""
+
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+CORPUS_VERSION = 2
+SEED = 1
+OUT = Path(__file__).resolve().parent / "fixtures"
+
+LOREM_WORDS = [
+    "本サービスは",
+    "全国で展開中の",
+    "安定した収益",
+    "サポート体制が",
+    "充実しています。",
+    "未経験でも",
+    "始められます。",
+]
+
+
+def lorem(n: int) -> str:
+    return "".join(random.choice(LOREM_WORDS) for _ in range(n))
+
+
+def nest(depth: int, inner: str, cls: str = "wrap") -> str:
+    return f'<div class="{cls}">' * depth + inner + "</div>" * depth
+
+
+def th_rows(rows: List[Tuple[str, str]]) -> str:
+    return "".join(f"<tr><th>{k}</th><td>{v}</td></tr>" for k, v in rows)
+
+
+def td_rows(rows: List[Tuple[str, str]]) -> str:
+    return "".join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in rows)
+
+
+def chrome(
+    title: str, body: str, charset: str = "utf-8", nav_items: int = 40, scripts: int = 6
+) -> str:
+    """本文の周りに実サイトと同程度の head（script / style）・ナビ・フッタを付ける"""
+    head = (
+        '<!DOCTYPE html>\n<html lang="ja">\n<head>\n'
+        f'<meta charset="{charset}">\n<title>{title}</title>\n'
+    )
+    for i in range(scripts):
+        data = ",".join(str(random.randint(0, 999)) for _ in range(200))
+        head += f"<script>\n(function(){{var d{i}=[{data}];window.__d{i}=d{i};}})();\n</script>\n"
+    head += "<style>\n"
+    head += "".join(f".c{i}{{margin:{i}px;padding:{i % 7}px;color:#{i:06x}}}\n" for i in range(300))
+    head += "</style>\n</head>\n"
+
+    paths = "".join(f'<path d="M{i} {i}L{i + 1} {i + 2}Z"/>' for i in range(40))
+    svg = f'<svg width="24" height="24" viewBox="0 0 24 24">{paths}</svg>'
+    nav = '<header><nav class="gnav"><ul>'
+    for i in range(nav_items):
+        icon = svg if i < 3 else ""
+        nav += f'<li><a href="/cat/{i}">{icon}カテゴリ{i}</a></li>'
+    nav += "</ul></nav></header>\n"
+    foot = "<footer><ul>"
+    foot += "".join(f'<li><a href="/info/{i}">ご利用案内{i}</a></li>' for i in range(nav_items))
+    foot += "</ul><p>Copyright</p></footer>\n"
+    return head + "<body>\n" + nav + body + foot + "</body>\n</html>\n"
+
+
+class Corpus:
+    def __init__(self, out: Path):
+        self.out = out
+        self.pages: List[Dict[str, str]] = []
+
+    def save(self, site: str, name: str, url: str, html: str, charset: str = "utf-8") -> None:
+        site_dir = self.out / site
+        site_dir.mkdir(parents=True, exist_ok=True)
+        data = html.encode("cp932" if charset == "shift_jis" else charset)
+        (site_dir / f"{name}.html").write_bytes(data)
+        self.pages.append(
+            {
+                "site": site,
+                "kind": name.rsplit("_", 1)[0],
+                "file": f"{site}/{name}.html",
+                "url": url,
+            }
+        )
+
+    def write_manifest(self) -> None:
+        with open(self.out / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": CORPUS_VERSION, "pages": self.pages}, f, ensure_ascii=False, indent=2
+            )
+
+
+# ---- v1: サイト・ページ種別ごとの標準的なページ ----
+
+
+def tabelog_list(corpus: Corpus) -> None:
+    base = "https://tabelog.com/osaka/A2701/A270108"
+    for p in (1, 2):
+        items = ""
+        for i in range(20):
+            rid = 27100000 + p * 100 + i
+            distance = random.randint(50, 900)
+            pr = lorem(6)
+            comment = lorem(10)
+            items += (
+                '<div class="list-rst js-rst-cassette-wrap"><div class="list-rst__wrap">'
+                '<h3 class="list-rst__rst-name">'
+                f'<a class="list-rst__rst-name-target cpy-rst-name" href="{base}/{rid}/" target="_blank">'
+                f"店舗{rid}</a></h3>"
+                f'<div class="list-rst__area-genre">福島駅 {distance}m / 居酒屋</div>'
+                f'<p class="list-rst__pr-title">{pr}</p>'
+                f'<div class="list-rst__rvw-comment">{comment}</div>'
+                f'<a class="list-rst__photo" href="{base}/{rid}/dtlphotolst/">写真</a>'
+                "</div></div>\n"
+            )
+        pager = '<div class="c-pagination"><ul>'
+        for n in range(1, 6):
+            current = " is-current" if n == p else ""
+            if n == p:
+                num = f'<span class="c-pagination__num">{n}</span>'
+            else:
+                num = f'<a class="c-pagination__num" href="{base}/rstLst/{n}/">{n}</a>'
+            pager += f'<li class="c-pagination__item{current}">{num}</li>'
+        pager += (
+            '<li><a class="c-pagination__arrow c-pagination__arrow--next" '
+            f'href="{base}/rstLst/{p + 1}/">次の20件</a></li></ul></div>'
+        )
+        count = (
+            '<p class="c-page-count">'
+            f'<span class="c-page-count__num"><strong>{(p - 1) * 20 + 1}</strong></span> ～ '
+            f'<span class="c-page-count__num"><strong>{p * 20}</strong></span> 件を表示 / 全 '
+            '<span class="c-page-count__num"><strong>1,234</strong></span> 件</p>'
+        )
+        body = f'<main><div class="list-controll">{count}</div>{items}{pager}</main>\n'
+        url = f"{base}/rstLst/{p}/" if p > 1 else f"{base}/rstLst/"
+        corpus.save("tabelog", f"list_{p}", url, chrome("福島のお店", body))
+
+
+def tabelog_detail(corpus: Corpus) -> None:
+    for i, (tel_in_table, hp) in enumerate([(True, True), (False, False), (True, False)]):
+        rows = [
+            (
+                "店名",
+                f'<div class="rstinfo-table__name-wrap"><span>鶏と魚と藁焼き酒場 テスト{i}</span></div>',
+            ),
+            ("ジャンル", "居酒屋、焼き鳥、海鮮"),
+        ]
+        if tel_in_table:
+            tel = (
+                '<p class="rstinfo-table__tel-num-wrap">'
+                f'<strong class="rstinfo-table__tel-num">050-5594-64{i:02d}</strong></p>'
+            )
+        else:
+            tel = "<p>予約はネットで</p>"
+        rows.append(("予約・<br>お問い合わせ", tel))
+        rows.append(
+            (
+                "住所",
+                '<p class="rstinfo-table__address"><span><a href="/osaka/">大阪府</a></span>'
+                '<span><a href="/osaka/C27128/">大阪市福島区</a></span>'
+                f"<span>福島7-7-{i + 1}</span></p>"
+                '<div class="rstinfo-table__map-wrap"><a href="/map/">大きな地図を見る</a>'
+                '<a href="/nearby/">周辺のお店を探す</a></div>',
+            )
+        )
+        for k in range(25):
+            rows.append((f"項目{k}", lorem(8) + f'<a href="/x/{k}">詳細</a>'))
+        if hp:
+            rows.append(
+                (
+                    "ホームページ",
+                    '<p class="homepage"><a href="https://example.jp/shop" rel="nofollow" '
+                    'target="_blank"><span>https://example.jp/shop</span></a></p>',
+                )
+            )
+        table = (
+            '<table class="c-table c-table--form rstinfo-table__table"><tbody>'
+            + th_rows(rows)
+            + "</tbody></table>"
+        )
+        reviews = ""
+        for k in range(40):
+            title = lorem(3)
+            comment = lorem(40)
+            reviews += (
+                f'<div class="rvw-item"><p class="rvw-item__title">{title}</p>'
+                f'<div class="rvw-item__rvw-comment"><p>{comment}</p></div>'
+                f'<table class="rvw-item__ratings"><tr><td>料理・味</td><td>3.{k % 10}</td></tr></table>'
+                "</div>"
+            )
+        body = (
+            '<div class="rdheader-info-data"><h2 class="display-name">'
+            f"<span>鶏と魚と藁焼き酒場 テスト{i}</span></h2></div>"
+            f'<main>{reviews}<section class="rstinfo-table"><h4>店舗基本情報</h4>{table}</section></main>\n'
+        )
+        if not tel_in_table:
+            body += '<div class="rstdtl-side-yoyaku"><p>お問い合わせ: 06-6453-1234</p></div>'
+        corpus.save(
+            "tabelog",
+            f"detail_{i + 1}",
+            f"https://tabelog.com/osaka/A2701/A270108/2714424{i}/",
+            chrome(f"テスト{i}", body),
+        )
+
+
+def dairitenhonpo_syo(corpus: Corpus) -> None:
+    for i in range(3):
+        info = [
+            ("会社名", f"株式会社ダイリテンテスト{i}"),
+            ("所在地", f"〒150-000{i} 東京都渋谷区渋谷1-{i}-1"),
+            ("設立", "2010年4月"),
+            ("代表者", "代表取締役 山田太郎"),
+            ("資本金", "1,000万円"),
+            ("事業内容", lorem(12)),
+            ("TEL", f"03-1234-56{i:02d}"),
+        ]
+        if i == 2:
+            info.append(("従業員数", "120名"))
+        detail = ""
+        for _ in range(15):
+            heading = lorem(2)
+            text = lorem(30)
+            detail += f'<section class="syo-block"><h3>{heading}</h3><p>{text}</p></section>'
+        cond = (
+            '<table class="cond"><tr><th>初期費用</th><td>0円</td></tr><tr><th>報酬</th><td>'
+            + lorem(5)
+            + "</td></tr></table>"
+        )
+        body = (
+            f"<main><h1>{lorem(3)}の代理店募集</h1>{detail}<h2>募集条件</h2>{cond}"
+            f'<h2>会社情報</h2><table class="company">{th_rows(info)}</table></main>\n'
+        )
+        corpus.save(
+            "dairitenhonpo",
+            f"syo_{i + 1}",
+            f"https://dairitenboshu.com/syo/{9453 + i}",
+            chrome("代理店本舗", body),
+        )
+
+
+def repre_page(corpus: Corpus) -> None:
+    for i in range(3):
+        info = [
+            ("名称", f"株式会社レプレテスト{i}"),
+            ("住所", f"大阪府大阪市北区梅田{i + 1}-1-1"),
+            ("TEL", f"06-1111-22{i:02d}"),
+            ("設立", "2015年"),
+            ("資本金", "500万円"),
+            ("年商", "3億円"),
+            ("部署", "営業部"),
+            ("従業員", "35名"),
+            ("事業", lorem(10)),
+        ]
+        blocks = ""
+        for _ in range(12):
+            heading = lorem(2)
+            text = lorem(25)
+            blocks += f'<div class="content-block"><h3>{heading}</h3><p>{text}</p></div>'
+        table = f'<table class="company-table">{td_rows(info)}</table>'
+        body = (
+            f"<main><h1>{lorem(3)}</h1>{blocks}"
+            f'<div class="recruit-company"><h3>募集企業</h3>{table}</div></main>\n'
+        )
+        corpus.save(
+            "repre",
+            f"page_{i + 1}",
+            f"https://bahn-rep.com/dairiten-bosyu/test{i}",
+            chrome("レプレ", body),
+        )
+
+
+def dairitenbosyuu_page(corpus: Corpus) -> None:
+    for i in range(3):
+        kv = [
+            ("募集企業", f"株式会社ビーシーズテスト{i}"),
+            ("所在地", f"東京都新宿区西新宿{i + 1}-2-3"),
+            ("代表者", "佐藤花子"),
+            ("設立", "2008年"),
+            ("資本金", "3,000万円"),
+            ("募集地域", "全国"),
+            ("初期費用", "10万円"),
+        ]
+        blocks = ""
+        for _ in range(12):
+            heading = lorem(2)
+            text = lorem(25)
+            items = "".join(f"<li>{lorem(3)}</li>" for _ in range(4))
+            blocks += f'<div class="sec"><h3>{heading}</h3><p>{text}</p><ul>{items}</ul></div>'
+        contact = ""
+        if i != 1:
+            contact = f'<p class="contact">お問い合わせ: 03-9999-88{i:02d} / info{i}@example.jp</p>'
+        else:
+            # 住所がテーブルになく本文にだけあるページ
+            kv = [(k, v) for k, v in kv if k != "所在地"]
+            blocks += '<div class="addr"><p>本社 〒160-0023 東京都新宿区西新宿9-9-9</p></div>'
+        table = f'<table class="spec">{th_rows(kv)}</table>'
+        body = f"<main><h1>{lorem(3)}の代理店募集</h1>{blocks}{table}{contact}</main>\n"
+        corpus.save(
+            "dairitenbosyuu",
+            f"page_{i + 1}",
+            f"https://b-seeds.com/test{i}",
+            chrome("ビーシーズ", body),
+        )
+
+
+def franchise_detail(corpus: Corpus) -> None:
+    for i in range(3):
+        crumb = (
+            '<ol class="breadcrumb"><li><a href="/">TOP</a></li>'
+            '<li><a href="/list/">フランチャイズ一覧</a></li>'
+            f"<li><span>株式会社エフシーテスト{i}</span></li></ol>"
+        )
+        blocks = ""
+        for _ in range(20):
+            heading = lorem(2)
+            text = lorem(30)
+            blocks += (
+                '<div class="detail-box"><div class="inner"><div class="text">'
+                f"<h3>{heading}</h3><p>{text}</p></div></div></div>"
+            )
+        # 会社情報の書き方はページごとに違う（dl / table / 段落）
+        if i == 0:
+            items = [
+                ("会社名", f"株式会社エフシーテスト{i}"),
+                ("所在地", "東京都港区芝1-1-1"),
+                ("設立", "2001年"),
+                ("代表者", "鈴木一郎"),
+                ("資本金", "5,000万円"),
+                ("事業内容", lorem(10)),
+            ]
+            dl = "".join(f"<dt>{k}</dt><dd>{v}</dd>" for k, v in items)
+            company = f'<div class="company"><h2>会社情報</h2><dl>{dl}</dl></div>'
+        elif i == 1:
+            items = [
+                ("商号", f"株式会社エフシーテスト{i}"),
+                ("住所", "愛知県名古屋市中区栄1-1-1"),
+                ("電話番号", "052-111-2222"),
+                ("従業員数", "80名"),
+            ]
+            company = f'<div class="company"><h2>会社概要</h2><table>{th_rows(items)}</table></div>'
+        else:
+            company = (
+                '<div class="company"><h2>会社情報</h2>'
+                "<p>所在地：福岡県福岡市中央区天神1-1-1</p><p>設立：1999年</p></div>"
+            )
+        body = (
+            f"<main>{crumb}<h1>{lorem(3)}のフランチャイズ</h1>{blocks}{company}"
+            f'<p><a href="https://example.co.jp/fc{i}">公式サイト</a></p></main>\n'
+        )
+        charset = "shift_jis" if i == 2 else "utf-8"
+        corpus.save(
+            "franchise_no_madoguti",
+            f"detail_{i + 1}",
+            f"https://www.fc-mado.com/detail/{2902 + i}",
+            chrome("フランチャイズの窓口", body, charset=charset),
+            charset=charset,
+        )
+
+
+# ---- v2: サイトごとに大きく入れ子の深いページを1件ずつ（p99 / 最大RSS を見るため） ----
+
+
+def large_pages(corpus: Corpus) -> None:
+    # tabelog detail: 口コミが多く、店舗情報テーブルが深い位置にあるページ
+    rows = [
+        ("店名", "<span>大規模テスト店</span>"),
+        ("予約・<br>お問い合わせ", '<strong class="rstinfo-table__tel-num">06-6000-0000</strong>'),
+        (
+            "住所",
+            '<p class="rstinfo-table__address"><span>大阪府大阪市北区</span><span>梅田9-9-9</span></p>'
+            '<a href="/map/">大きな地図を見る</a>',
+        ),
+    ]
+    rows += [(f"項目{k}", lorem(8)) for k in range(60)]
+    table = f'<table class="c-table rstinfo-table__table"><tbody>{th_rows(rows)}</tbody></table>'
+    reviews = ""
+    for _ in range(200):
+        title = lorem(3)
+        text = lorem(60)
+        reviews += nest(8, f'<p class="rvw-item__title">{title}</p><p>{text}</p>', "rvw-item")
+    body = (
+        '<h2 class="display-name"><span>大規模テスト店</span></h2>'
+        f"<main>{reviews}{nest(30, table)}</main>\n"
+    )
+    corpus.save(
+        "tabelog",
+        "detail_4",
+        "https://tabelog.com/osaka/A2701/A270101/27199999/",
+        chrome("大規模テスト店", body, nav_items=200),
+    )
+
+    # dairitenboshu.com: 紹介セクションが多いページ
+    info = [
+        ("会社名", "株式会社ダイリテン大規模"),
+        ("所在地", "〒100-0001 東京都千代田区千代田1-1"),
+        ("代表者", "代表取締役 大山一郎"),
+        ("事業内容", lorem(40)),
+    ]
+    detail = ""
+    for _ in range(150):
+        heading = lorem(2)
+        text = lorem(60)
+        detail += nest(6, f'<section class="syo-block"><h3>{heading}</h3><p>{text}</p></section>')
+    body = (
+        f"<main><h1>{lorem(3)}の代理店募集</h1>{detail}"
+        f'<h2>会社情報</h2><table class="company">{th_rows(info)}</table></main>\n'
+    )
+    corpus.save(
+        "dairitenhonpo",
+        "syo_4",
+        "https://dairitenboshu.com/syo/9999",
+        chrome("代理店本舗", body, nav_items=200),
+    )
+
+    # bahn-rep.com: 募集企業テーブルが深い位置にあるページ
+    info = [
+        ("名称", "株式会社レプレ大規模"),
+        ("住所", "愛知県名古屋市中村区名駅1-1-1"),
+        ("TEL", "052-000-0000"),
+        ("事業", lorem(30)),
+    ]
+    blocks = ""
+    for _ in range(150):
+        heading = lorem(2)
+        text = lorem(50)
+        blocks += nest(6, f"<h3>{heading}</h3><p>{text}</p>", "content-block")
+    table = f'<table class="company-table">{td_rows(info)}</table>'
+    body = (
+        f"<main><h1>{lorem(3)}</h1>{blocks}"
+        f'{nest(20, "<h3>募集企業</h3>" + table, "recruit-company")}</main>\n'
+    )
+    corpus.save(
+        "repre",
+        "page_4",
+        "https://bahn-rep.com/dairiten-bosyu/large",
+        chrome("レプレ", body, nav_items=200),
+    )
+
+    # b-seeds.com: 住所がテーブルになく、深い入れ子の末尾の本文にだけあるページ
+    kv = [("募集企業", "株式会社ビーシーズ大規模"), ("代表者", "高橋次郎"), ("募集地域", "関東")]
+    blocks = ""
+    for _ in range(120):
+        heading = lorem(2)
+        text = lorem(40)
+        items = "".join(f"<li>{lorem(3)}</li>" for _ in range(6))
+        blocks += f'<div class="sec"><h3>{heading}</h3><p>{text}</p><ul>{items}</ul></div>'
+    table = f'<table class="spec">{th_rows(kv)}</table>'
+    address = "<p>本社 〒220-0012 神奈川県横浜市西区みなとみらい1-1-1</p>"
+    body = f"<main><h1>{lorem(3)}の代理店募集</h1>{nest(40, blocks + address)}{table}</main>\n"
+    corpus.save(
+        "dairitenbosyuu",
+        "page_4",
+        "https://b-seeds.com/large",
+        chrome("ビーシーズ", body, nav_items=200),
+    )
+
+    # fc-mado.com: div の入れ子が深く、会社情報が最下部にあるページ
+    crumb = (
+        '<ol class="breadcrumb"><li><a href="/">TOP</a></li>'
+        "<li><span>株式会社エフシー大規模</span></li></ol>"
+    )
+    blocks = ""
+    for _ in range(120):
+        heading = lorem(2)
+        text = lorem(40)
+        blocks += nest(10, f"<h3>{heading}</h3><p>{text}</p>", "detail-box")
+    items = [
+        ("会社名", "株式会社エフシー大規模"),
+        ("所在地", "北海道札幌市中央区北1条西1-1"),
+        ("代表者", "北村三郎"),
+    ]
+    dl = "".join(f"<dt>{k}</dt><dd>{v}</dd>" for k, v in items)
+    company = f'<div class="company"><h2>会社情報</h2><dl>{dl}</dl></div>'
+    body = f"<main>{crumb}<h1>{lorem(3)}のフランチャイズ</h1>{nest(60, blocks + company)}</main>\n"
+    corpus.save(
+        "franchise_no_madoguti",
+        "detail_4",
+        "https://www.fc-mado.com/detail/9999",
+        chrome("フランチャイズの窓口", body, nav_items=200),
+    )
+
+
+def main():
+    random.seed(SEED)
+    corpus = Corpus(OUT)
+    tabelog_list(corpus)
+    tabelog_detail(corpus)
+    dairitenhonpo_syo(corpus)
+    repre_page(corpus)
+    dairitenbosyuu_page(corpus)
+    franchise_detail(corpus)
+    large_pages(corpus)
+    corpus.write_manifest()
+    print(f"corpus v{CORPUS_VERSION}: {len(corpus.pages)} pages -> {OUT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+負荷試験・障害注入用のローカル代役サーバー（本番サイトには一切アクセスしない）
+- bench/fixtures の保存ページを、サイトごとのURL空間 /<サイト>/<任意のパス> で返す
+  （同じパスには常に同じページ。パスのハッシュでフィクスチャを選ぶ）
+- 本番サイトのURL空間（ホスト名やパスの形）やサイトマップは再現しない。全サイトが同じホストに載り、
+  パスも本番とは違うので、URL_RULES による絞り込みやサイトマップからのURL収集は試せない
+  （取得・解析・書き出しとエラー処理の確認用）
+- 障害注入（すべて FaultConfig で設定）:
+    latency_ms / jitter_ms   応答までの待ち時間
+    burst_every / burst_len  burst_every 秒ごとに burst_len 秒間、429/503 を Retry-After 付きで返す
+    slow_rate / slow_ms      一部の応答本文を細切れにして slow_ms かけて送る
+    reset_rate               本文の途中で接続を切る
+    wrong_charset_rate       Content-Type に誤った charset を付ける
+- /__stats で受けたリクエスト数・注入した障害の件数をJSONで返す
+
+使い方:
+  python bench/mock_server.py --port 8080 --latency-ms 50 --burst-every 10 --burst-len 2
+  curl http://127.0.0.1:8080/dairitenhonpo/syo/1
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.sites import load_corpus
+
+# 誤った charset として付けるもの（実際の本文の文字コードと食い違う）
+WRONG_CHARSETS = {"utf-8": "shift_jis", "cp932": "utf-8", "shift_jis": "utf-8"}
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    burst_every: float = 0.0  # 0 ならバーストなし
+    burst_len: float = 0.0
+    burst_statuses: Tuple[int, ...] = (429, 503)
+    retry_after: int = 1  # 秒
+    slow_rate: float = 0.0
+    slow_ms: float = 2000.0
+    reset_rate: float = 0.0
+    wrong_charset_rate: float = 0.0
+    seed: int = 1
+
+
+def site_kind(site: str, path: str, kinds: List[str]) -> str:
+    """URLパスからページ種別を決める（種別が1つのサイトはそれ）"""
+    if len(kinds) == 1:
+        return kinds[0]
+    if site == "tabelog":
+        return "list" if "/rstLst/" in f"/{path}" else "detail"
+    return kinds[0]
+
+
+class MockServer:
+    def __init__(self, config: Optional[FaultConfig] = None):
+        self.config = config or FaultConfig()
+        self.stats: Counter = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._started = time.monotonic()
+        # (サイト, 種別) -> [(本文, 文字コード), ...]
+        self.pages: Dict[Tuple[str, str], List[Tuple[bytes, str]]] = {}
+        _, corpus = load_corpus()
+        for p in corpus:
+            self.pages.setdefault((p["site"], p["kind"]), []).append(
+                (p["body"], p["encoding"])
+            )
+        self.kinds: Dict[str, List[str]] = {}
+        for site, kind in self.pages:
+            self.kinds.setdefault(site, []).append(kind)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/__stats", self.handle_stats)
+        app.router.add_get("/{site}/{path:.*}", self.handle_page)
+        return app
+
+    def in_burst(self) -> bool:
+        cfg = self.config
+        if cfg.burst_every <= 0 or cfg.burst_len <= 0:
+            return False
+        return (time.monotonic() - self._started) % cfg.burst_every < cfg.burst_len
+
+    def pick(self, site: str, path: str) -> Optional[Tuple[bytes, str]]:
+        kinds = self.kinds.get(site)
+        if not kinds:
+            return None
+        candidates = self.pages[(site, site_kind(site, path, kinds))]
+        h = int.from_bytes(hashlib.md5(path.encode("utf-8")).digest()[:4], "big")
+        return candidates[h % len(candidates)]
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    async def handle_page(self, request: web.Request) -> web.StreamResponse:
+        cfg = self.config
+        self.stats["requests"] += 1
+        delay = cfg.latency_ms + self._rng.uniform(0, cfg.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if self.in_burst():
+            status = self._rng.choice(cfg.burst_statuses)
+            self.stats[f"burst_{status}"] += 1
+            return web.Response(
+                status=status,
+                text="busy",
+                headers={"Retry-After": str(cfg.retry_after)},
+            )
+
+        page = self.pick(request.match_info["site"], request.match_info["path"])
+        if page is None:
+            self.stats["not_found"] += 1
+            return web.Response(status=404, text="not found")
+        body, encoding = page
+
+        charset = encoding
+        if self._rng.random() < cfg.wrong_charset_rate:
+            charset = WRONG_CHARSETS.get(encoding, "iso-8859-1")
+            self.stats["wrong_charset"] += 1
+
+        resp = web.StreamResponse(
+            status=200,
+            headers={"Content-Type": f"text/html; charset={charset}"},
+        )
+        resp.content_length = len(body)
+        await resp.prepare(request)
+
+        if self._rng.random() < cfg.reset_rate:
+            # 本文の途中で切断（クライアントからは接続リセット / 本文不足に見える）
+            self.stats["reset"] += 1
+            await resp.write(body[: len(body) // 3])
+            request.transport.abort()
+            return resp
+
+        if self._rng.random() < cfg.slow_rate:
+            self.stats["slow"] += 1
+            chunks = [body[i : i + 4096] for i in range(0, len(body), 4096)]
+            for chunk in chunks:
+                await resp.write(chunk)
+                await asyncio.sleep(cfg.slow_ms / 1000 / len(chunks))
+        else:
+            await resp.write(body)
+        self.stats["ok"] += 1
+        await resp.write_eof()
+        return resp
+
+
+class BackgroundServer:
+    """別スレッドのイベントループでサーバーを動かす（ロードドライバー用）"""
+
+    def __init__(self, server: MockServer, host: str = "127.0.0.1", port: int = 0):
+        self.server = server
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self) -> "BackgroundServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self) -> None:
+        self._runner = web.AppRunner(self.server.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # port=0 の場合は OS が割り当てたポート
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def stop(self) -> None:
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def add_fault_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--burst-every", type=float, default=0.0, help="この秒数ごとにバースト")
+    ap.add_argument("--burst-len", type=float, default=0.0, help="バーストの長さ（秒）")
+    ap.add_argument("--burst-statuses", default="429,503")
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--slow-rate", type=float, default=0.0)
+    ap.add_argument("--slow-ms", type=float, default=2000.0)
+    ap.add_argument("--reset-rate", type=float, default=0.0)
+    ap.add_argument("--wrong-charset-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=1)
+
+
+def fault_config_from_args(args: argparse.Namespace) -> FaultConfig:
+    values = {f.name: getattr(args, f.name) for f in fields(FaultConfig) if hasattr(args, f.name)}
+    values["burst_statuses"] = tuple(int(s) for s in args.burst_statuses.split(",") if s)
+    return FaultConfig(**values)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="負荷試験・障害注入用のローカル代役サーバー")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    add_fault_args(ap)
+    args = ap.parse_args()
+    server = MockServer(fault_config_from_args(args))
+    print(f"[INFO] serving {sorted(server.kinds)} on http://{args.host}:{args.port}/<site>/...")
+    web.run_app(server.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+HTMLパーサのバックエンド比較
+- フィクスチャ全ページを各バックエンドで抽出し、html.parser と同じレコードになるか検証
+- バックエンドごとの処理速度（ページ/秒）を表示
+
+使い方:
+  python bench/parser_backends.py [繰り返し回数]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.sites import extract, load_corpus
+from common import html_parser
+
+
+def run_backend(backend: str, pages, repeat: int):
+    html_parser.set_backend(backend)
+    records = [extract(p) for p in pages]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for p in pages:
+            extract(p)
+    elapsed = time.perf_counter() - start
+    return records, len(pages) * repeat / elapsed
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) >= 2 else 5
+    version, pages = load_corpus()
+    print(f"corpus v{version}: {len(pages)} pages, repeat={repeat}")
+
+    baseline = None
+    ok = True
+    for backend in html_parser.BACKENDS:
+        try:
+            records, pps = run_backend(backend, pages, repeat)
+        except ImportError as e:
+            print(f"{backend:12s} skipped ({e})")
+            continue
+        if baseline is None:
+            baseline = records
+        diffs = [p["file"] for p, a, b in zip(pages, baseline, records) if a != b]
+        status = "identical" if not diffs else f"DIFF: {', '.join(diffs)}"
+        ok = ok and not diffs
+        print(f"{backend:12s} {pps:8.1f} pages/sec  {status}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+抽出器のオフラインベンチマーク（ネットワークには出ない）
+- bench/fixtures の全ページを各サイトの抽出器にかけ、サイト・ページ種別ごとに
+  処理速度（ページ/秒）、1ページあたりの p50 / p99 レイテンシ、最大RSS を表示
+- 最大RSS をサイトごとに測るため、サイト・種別ごとに子プロセスで実行する
+- 保存済みのベースライン（bench/baseline.json）と比較し、差分を % で表示
+
+使い方:
+  python bench/run.py                      # 計測してベースラインと比較
+  python bench/run.py --save-baseline      # 計測結果をベースラインとして保存
+  python bench/run.py --check              # 許容幅を超えて遅くなっていたら終了コード 1
+  python bench/run.py --site tabelog --repeat 50 --backend lxml
+"""
+
+import argparse
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.sites import extract, load_corpus
+from common import html_parser
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_REPEAT = 20
+DEFAULT_TOLERANCE = 0.10  # ベースライン比でこれ以上悪化したら --check で失敗
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS は bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def measure(group: str, repeat: int) -> Dict[str, object]:
+    """1グループ（"サイト/種別"）を計測する。子プロセス側で呼ばれる"""
+    site, kind = group.split("/", 1)
+    _, pages = load_corpus()
+    pages = [p for p in pages if p["site"] == site and p["kind"] == kind]
+    # 初回の import やキャッシュの温まりは計測から外す
+    for p in pages:
+        extract(p)
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for p in pages:
+            t0 = time.perf_counter()
+            extract(p)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "pages": len(latencies),
+        "pages_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_group(group: str, repeat: int, backend: str) -> Dict[str, object]:
+    cmd = [
+        sys.executable,
+        str(Path(__file__).resolve()),
+        "--child",
+        group,
+        "--repeat",
+        str(repeat),
+        "--backend",
+        backend,
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def load_baseline(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fmt_delta(
+    now: float, base: Optional[float], higher_is_better: bool, tolerance: float
+) -> str:
+    """ベースライン比の差分。許容幅を超えて悪化していれば ! を付ける"""
+    if not base:
+        return ""
+    d = (now - base) / base
+    worse = d < 0 if higher_is_better else d > 0
+    return f" ({d:+.0%}{'!' if worse and abs(d) > tolerance else ''})"
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    out = []
+    for group, r in results.items():
+        b = baseline["results"].get(group)
+        if not b:
+            continue
+        if r["pages_per_sec"] < b["pages_per_sec"] * (1 - tolerance):
+            out.append(f"{group}: pages/sec {b['pages_per_sec']:.1f} -> {r['pages_per_sec']:.1f}")
+        if r["p99_ms"] > b["p99_ms"] * (1 + tolerance):
+            out.append(f"{group}: p99 {b['p99_ms']:.2f}ms -> {r['p99_ms']:.2f}ms")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="抽出器のオフラインベンチマーク")
+    ap.add_argument("--site", help="このサイトだけ計測（例: tabelog）")
+    ap.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="各ページの繰り返し回数")
+    ap.add_argument("--backend", default=html_parser.HTML_PARSER, choices=html_parser.BACKENDS)
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存")
+    ap.add_argument("--check", action="store_true", help="許容幅を超える悪化があれば終了コード 1")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    html_parser.set_backend(args.backend)
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat)))
+        return
+
+    version, pages = load_corpus()
+    groups = list(dict.fromkeys(f"{p['site']}/{p['kind']}" for p in pages))
+    if args.site:
+        groups = [g for g in groups if g.split("/", 1)[0] == args.site]
+
+    baseline = load_baseline(args.baseline)
+    if baseline and (
+        baseline.get("corpus_version") != version or baseline.get("backend") != args.backend
+    ):
+        print(
+            f"[INFO] ベースラインの条件が異なるため比較しません"
+            f"（corpus v{baseline.get('corpus_version')} / {baseline.get('backend')}）"
+        )
+        baseline = None
+
+    print(f"corpus v{version}, backend={args.backend}, repeat={args.repeat}")
+    print(f"{'group':30s} {'pages/s':>16s} {'p50 ms':>16s} {'p99 ms':>16s} {'peak RSS MB':>12s}")
+    results: Dict[str, dict] = {}
+    for group in groups:
+        r = run_group(group, args.repeat, args.backend)
+        results[group] = r
+        b = (baseline or {}).get("results", {}).get(group, {})
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(
+            f"{group:30s}"
+            f" {r['pages_per_sec']:7.1f}{fmt_delta(r['pages_per_sec'], b.get('pages_per_sec'), True, args.tolerance):>9s}"
+            f" {r['p50_ms']:7.2f}{fmt_delta(r['p50_ms'], b.get('p50_ms'), False, args.tolerance):>9s}"
+            f" {r['p99_ms']:7.2f}{fmt_delta(r['p99_ms'], b.get('p99_ms'), False, args.tolerance):>9s}"
+            f" {rss:>12s}"
+        )
+
+    if args.save_baseline:
+        saved = load_baseline(args.baseline) if args.site else None
+        merged = dict(saved["results"]) if saved and saved.get("corpus_version") == version else {}
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "corpus_version": version,
+                    "backend": args.backend,
+                    "repeat": args.repeat,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": merged,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"[INFO] ベースラインを保存: {args.baseline}")
+        return
+
+    if args.check and baseline:
+        bad = regressions(results, baseline, args.tolerance)
+        for line in bad:
+            print(f"[REGRESSION] {line}")
+        sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+フィクスチャのページ種別ごとに、各サイトの抽出器を共通の形で呼び出すための定義
+- extract(url, body, encoding) -> レコードのリスト
+- 取得日時など実行ごとに変わる列は比較のため取り除く
+"""
+
+import importlib.util
+import json
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = ROOT / "bench" / "fixtures"
+sys.path.insert(0, str(ROOT))
+
+from common.encoding import resolve_encoding
+
+VOLATILE_COLUMNS = ("取得日時",)
+
+Record = Dict[str, object]
+Extractor = Callable[[str, bytes, str], List[Record]]
+
+_modules: Dict[str, object] = {}
+
+
+def load_module(rel_path: str):
+    """サイトのスクリプトをモジュールとして読み込む（scrape.py が複数あるのでパスで区別）"""
+    if rel_path not in _modules:
+        name = "site_" + rel_path.replace("/", "_").replace(".py", "")
+        spec = importlib.util.spec_from_file_location(name, ROOT / rel_path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _modules[rel_path] = mod
+    return _modules[rel_path]
+
+
+def _strip(records: List[Record]) -> List[Record]:
+    return [
+        {k: v for k, v in r.items() if k not in VOLATILE_COLUMNS}
+        for r in records
+        if r
+    ]
+
+
+def _tabelog_list(url: str, body: bytes, encoding: str) -> List[Record]:
+    mod = load_module("tabelog_all.py")
+    detail_urls, next_url, total = mod.parse_list_page(body.decode(encoding), url)
+    return [{"detail_urls": detail_urls, "next_url": next_url, "total": total}]
+
+
+def _tabelog_detail(url: str, body: bytes, encoding: str) -> List[Record]:
+    mod = load_module("tabelog_all.py")
+    return [mod.extract_store_info(body.decode(encoding))]
+
+
+def _dairitenhonpo(url: str, body: bytes, encoding: str) -> List[Record]:
+    mod = load_module("dairitenhonpo/scrape.py")
+    return _strip([mod.extract_record(url, body.decode(encoding))])
+
+
+def _repre(url: str, body: bytes, encoding: str) -> List[Record]:
+    mod = load_module("repre/scrape.py")
+    return _strip(mod.scrape_company_info_single(url, body.decode(encoding)))
+
+
+def _dairitenbosyuu(url: str, body: bytes, encoding: str) -> List[Record]:
+    mod = load_module("dairitenbosyuu/scrape.py")
+    return _strip([mod.parse_page(url, body.decode(encoding))])
+
+
+def _fc_mado(url: str, body: bytes, encoding: str) -> List[Record]:
+    mod = load_module("franchise_no_madoguti/scrape.py")
+    return _strip([mod.scrape_one(url, body, encoding)])
+
+
+# (サイト, ページ種別) -> 抽出器
+EXTRACTORS: Dict[Tuple[str, str], Extractor] = {
+    ("tabelog", "list"): _tabelog_list,
+    ("tabelog", "detail"): _tabelog_detail,
+    ("dairitenhonpo", "syo"): _dairitenhonpo,
+    ("repre", "page"): _repre,
+    ("dairitenbosyuu", "page"): _dairitenbosyuu,
+    ("franchise_no_madoguti", "detail"): _fc_mado,
+}
+
+
+def load_corpus() -> Tuple[int, List[dict]]:
+    """
+    manifest.json を読み、(コーパスのバージョン, ページ一覧) を返す。
+    各ページには body（bytes）と encoding を付ける。
+    """
+    with open(FIXTURES_DIR / "manifest.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    pages = []
+    for entry in manifest["pages"]:
+        body = (FIXTURES_DIR / entry["file"]).read_bytes()
+        encoding, _ = resolve_encoding(body, None, cache=None)
+        pages.append({**entry, "body": body, "encoding": encoding})
+    return manifest["version"], pages
+
+
+def extract(page: dict) -> List[Record]:
+    fn = EXTRACTORS[(page["site"], page["kind"])]
+    return fn(page["url"], page["body"], page["encoding"])
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+各サイトのスクレイパーで共有する部品（フェッチ・デコード・出力など）
+"""
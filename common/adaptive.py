@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+ホストごとの同時リクエスト数の自動調整（AIMD）
+- 応答が安定している間は加算的に増やす（limit 件の成功ごとにおよそ +increase）
+- 429 / 503・タイムアウト・接続エラーでは乗算的に減らす（× decrease）
+- 応答時間（TTFB）の直近平均が基準（最小に近い値）の latency_tolerance 倍を超えたら
+  サーバー側の詰まりとみなして少し減らす（× latency_decrease）
+- 同じ混雑で同時に返ってきた失敗で何度も減らさないよう、減らした後は直近の応答時間
+  （最低 cooldown 秒）だけ次の引き下げを見送る（1往復に1回まで）
+- 上限は max_limit（サイトの設定値は「固定の同時数」ではなく「上限」になる）
+
+FetchBudget(adaptive=AimdConfig(...)) で使う。単体では:
+  limit = AdaptiveLimit(AimdConfig(initial=4, max_limit=32))
+  await limit.acquire()
+  ... limit.release(latency=0.12, overloaded=False)
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional
+
+# これらのステータスは「混雑している」合図として扱う
+OVERLOAD_STATUSES = (429, 503)
+
+
+@dataclass
+class AimdConfig:
+    initial: int = 4
+    min_limit: int = 1
+    max_limit: int = 32
+    increase: float = 1.0  # limit 件の成功ごとに増やす数
+    decrease: float = 0.5  # 429/503・タイムアウト時の係数
+    latency_decrease: float = 0.9  # 応答時間が伸びたときの係数
+    latency_tolerance: float = 2.0  # 基準の何倍で「伸びた」とみなすか
+    latency_margin: float = 0.05  # 基準との差がこれ（秒）未満なら伸びとみなさない
+    cooldown: float = 0.05  # 引き下げ後、次の引き下げを見送る最短時間（秒）
+    baseline_window: float = 60.0  # 基準がこの秒数ほどで直近の応答時間に追いつく（サーバー自体が遅くなった場合）
+
+
+class AdaptiveLimit:
+    """1ホスト分の可変上限付きセマフォ（イベントループ内でのみ使う）"""
+
+    def __init__(self, config: AimdConfig):
+        self.config = config
+        self.limit = float(max(config.min_limit, min(config.initial, config.max_limit)))
+        self.in_flight = 0
+        self.backoffs = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._recent: Optional[float] = None  # 応答時間の直近平均（EWMA）
+        self._baseline: Optional[float] = None  # 最小値に近い基準（上がるときはゆっくり）
+        self._last_decrease = 0.0
+        self._last_observe = 0.0
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 枠を受け取った直後にキャンセルされた場合は返しておく
+            if fut.done() and not fut.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            raise
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        self.in_flight -= 1
+        if overloaded:
+            self._decrease(self.config.decrease)
+        elif latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    def _observe(self, latency: float) -> None:
+        cfg = self.config
+        now = time.monotonic()
+        elapsed, self._last_observe = now - self._last_observe, now
+        self._recent = latency if self._recent is None else self._recent * 0.8 + latency * 0.2
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            # 件数ではなく経過時間で寄せる（リクエストが多いほど速く動かないように）
+            self._baseline += (latency - self._baseline) * min(1.0, elapsed / cfg.baseline_window)
+        if (
+            self._recent > self._baseline * cfg.latency_tolerance
+            and self._recent - self._baseline > cfg.latency_margin
+        ):
+            # 詰まっている間は増やさない
+            self._decrease(cfg.latency_decrease)
+        else:
+            self.limit = min(cfg.max_limit, self.limit + cfg.increase / self.limit)
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.config.cooldown, self._recent or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.config.min_limit, self.limit * factor)
+        self.backoffs += 1
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+ストリーミングCSV出力（メモリ使用量は件数に依存しない）
+- 行は完了したそばからディスクへ書く
+- columns を宣言済みスキーマとして扱う場合（dynamic=False）は未知の列を捨てる
+- dynamic=True の場合、途中で初めて出てきた列は別ファイル（<出力>.extra.jsonl）に退避し、
+  close() 時に1回だけ全体を書き直してヘッダへ統合する（新しい列が無ければ書き直さない）
+- sort_by を指定すると close() 時の書き直しでその列の順に並べ替える（同じ値は書いた順のまま）。
+  sort_chunk 行ずつ並べた一時ファイルをマージするので、メモリ使用量は件数に依存しない
+"""
+
+import csv
+import heapq
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class CsvSink:
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        dynamic: bool = True,
+        sort_extra: bool = False,
+        encoding: str = "utf-8",
+        sort_by: Optional[str] = None,
+        sort_chunk: int = 50_000,
+    ):
+        self.path = path
+        self.encoding = encoding
+        self.dynamic = dynamic
+        self.sort_extra = sort_extra
+        self.sort_by = sort_by
+        self.sort_chunk = sort_chunk
+        self.count = 0
+        self._header: List[str] = list(columns)
+        self._known = set(self._header)
+        self._new_columns: List[str] = []
+        self._extra_path = path + ".extra.jsonl"
+        self._extra_f = None
+        self._f = open(path, "w", newline="", encoding=encoding)
+        self._writer = csv.DictWriter(
+            self._f, fieldnames=self._header, extrasaction="ignore"
+        )
+        self._writer.writeheader()
+
+    def __enter__(self) -> "CsvSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, row: Dict[str, Optional[str]]) -> None:
+        self._writer.writerow(row)
+        if self.dynamic:
+            extra = {k: v for k, v in row.items() if k not in self._known}
+            if extra:
+                for k in extra:
+                    if k not in self._new_columns:
+                        self._new_columns.append(k)
+                if self._extra_f is None:
+                    self._extra_f = open(self._extra_path, "w", encoding="utf-8")
+                self._extra_f.write(
+                    json.dumps({"i": self.count, "extra": extra}, ensure_ascii=False)
+                    + "\n"
+                )
+        self.count += 1
+
+    def columns(self) -> List[str]:
+        """最終的な列順（宣言済み列 + 途中で出てきた列）"""
+        extra = sorted(self._new_columns) if self.sort_extra else self._new_columns
+        return self._header + extra
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        self._f.close()
+        if self._extra_f is not None:
+            self._extra_f.close()
+        if self._extra_f is None and self.sort_by is None:
+            return
+        self._rewrite()
+        if self._extra_f is not None:
+            os.remove(self._extra_path)
+
+    def _rewrite(self) -> None:
+        """退避した列を統合し、sort_by があれば並べ替えて1回で書き直す"""
+        tmp_path = self.path + ".tmp"
+        run_paths: List[str] = []
+        try:
+            with open(self.path, "r", newline="", encoding=self.encoding) as src:
+                rows = self._merged_rows(csv.DictReader(src))
+                if self.sort_by is not None:
+                    run_paths = self._write_sorted_runs(rows)
+                    self._write_merged_runs(run_paths, tmp_path)
+                else:
+                    self._write_rows(rows, tmp_path)
+            os.replace(tmp_path, self.path)
+        finally:
+            for run_path in run_paths:
+                os.remove(run_path)
+
+    def _merged_rows(self, reader: csv.DictReader) -> Iterator[Dict[str, str]]:
+        """本体CSVと退避ファイルを先頭から並べて読み、退避した列を戻した行を返す"""
+        if self._extra_f is None:
+            yield from reader
+            return
+        with open(self._extra_path, "r", encoding="utf-8") as extra_f:
+            pending = _next_extra(extra_f)
+            for i, row in enumerate(reader):
+                if pending is not None and pending["i"] == i:
+                    row.update(pending["extra"])
+                    pending = _next_extra(extra_f)
+                yield row
+
+    def _write_rows(self, rows: Iterable[Dict[str, str]], path: str) -> None:
+        with open(path, "w", newline="", encoding=self.encoding) as dst:
+            writer = csv.DictWriter(dst, fieldnames=self.columns())
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def _write_sorted_runs(self, rows: Iterator[Dict[str, str]]) -> List[str]:
+        """sort_chunk 行ずつ sort_by で並べて一時ファイルに書く（書いたファイルのパスを返す）"""
+        run_paths: List[str] = []
+        chunk: List[Dict[str, str]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.sort_chunk:
+                run_paths.append(self._write_run(chunk, len(run_paths)))
+                chunk = []
+        if chunk or not run_paths:
+            run_paths.append(self._write_run(chunk, len(run_paths)))
+        return run_paths
+
+    def _write_run(self, chunk: List[Dict[str, str]], n: int) -> str:
+        run_path = f"{self.path}.run{n}"
+        chunk.sort(key=self._sort_key)
+        self._write_rows(chunk, run_path)
+        return run_path
+
+    def _write_merged_runs(self, run_paths: List[str], path: str) -> None:
+        # heapq.merge は同じキーなら先のファイルの行を先に出すので、並べ替えは安定
+        files = [open(p, "r", newline="", encoding=self.encoding) for p in run_paths]
+        try:
+            readers = [csv.DictReader(f) for f in files]
+            self._write_rows(heapq.merge(*readers, key=self._sort_key), path)
+        finally:
+            for f in files:
+                f.close()
+
+    def _sort_key(self, row: Dict[str, str]) -> str:
+        return row.get(self.sort_by) or ""
+
+
+def _next_extra(f) -> Optional[dict]:
+    line = f.readline()
+    return json.loads(line) if line else None
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+レスポンス本文の文字コード判定（高速パス付き）
+判定順:
+  1) BOM
+  2) Content-Type ヘッダの charset（ISO-8859-1 はサーバ既定値のことが多いので無視）
+  3) 先頭数KBの <meta charset> / http-equiv
+  4) ホストごとに学習済みの文字コード
+  5) 最後の手段として charset_normalizer による推定（先頭のみ）
+2)〜4) は本文の先頭 VALIDATE_BYTES を厳密デコードできた場合のみ採用する（誤ったラベルで
+文字化けしたまま抽出しない）。ヘッダと <meta> が食い違う場合もヘッダは使わない。
+ホストごとの学習は検証済みの文字コードだけを覚える
+"""
+
+import codecs
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+META_SNIFF_BYTES = 4096
+DETECT_SAMPLE_BYTES = 64 * 1024
+VALIDATE_BYTES = 64 * 1024
+
+_META_CHARSET = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_\-:.]+)""", re.IGNORECASE
+)
+
+# 日本語サイトで使われる別名を Python の実用的なコーデックに寄せる
+_ALIASES = {
+    "shift_jis": "cp932",
+    "shift-jis": "cp932",
+    "sjis": "cp932",
+    "x-sjis": "cp932",
+    "windows-31j": "cp932",
+    "ms932": "cp932",
+    "euc-jp": "euc_jis_2004",
+    "x-euc-jp": "euc_jis_2004",
+}
+_UNRELIABLE = {"iso8859-1"}  # codecs.lookup 後の名前で比較
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def normalize_encoding(name: Optional[str]) -> Optional[str]:
+    """文字コード名を正規化。Python が知らない名前なら None"""
+    if not name:
+        return None
+    name = name.strip().strip("\"'").lower()
+    name = _ALIASES.get(name, name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    if not content_type:
+        return None
+    for part in content_type.split(";")[1:]:
+        k, _, v = part.strip().partition("=")
+        if k.lower() == "charset" and v:
+            return v.strip("\"' ")
+    return None
+
+
+def sniff_meta_charset(body: bytes, limit: int = META_SNIFF_BYTES) -> Optional[str]:
+    m = _META_CHARSET.search(body[:limit])
+    if not m:
+        return None
+    return m.group(1).decode("ascii", errors="ignore")
+
+
+def detect_encoding(body: bytes, sample: int = DETECT_SAMPLE_BYTES) -> Optional[str]:
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:
+        return None
+    best = from_bytes(body[:sample]).best()
+    return best.encoding if best else None
+
+
+def decodes_strictly(body: bytes, encoding: str, limit: int = VALIDATE_BYTES) -> bool:
+    """本文の先頭 limit バイトを encoding で厳密にデコードできるか（末尾で切れた多バイト文字は許す）"""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+        decoder.decode(body[:limit], final=len(body) <= limit)
+    except (UnicodeDecodeError, LookupError):
+        return False
+    return True
+
+
+class EncodingCache:
+    """ホストごとに最後に確定した文字コードを覚えておく（スレッドセーフ）"""
+
+    def __init__(self):
+        self._by_host: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> Optional[str]:
+        with self._lock:
+            return self._by_host.get(host)
+
+    def learn(self, host: str, encoding: str) -> None:
+        if not host:
+            return
+        with self._lock:
+            self._by_host[host] = encoding
+
+
+ENCODING_CACHE = EncodingCache()
+
+
+def resolve_encoding(
+    body: bytes,
+    content_type: Optional[str] = None,
+    host: str = "",
+    cache: Optional[EncodingCache] = ENCODING_CACHE,
+) -> Tuple[str, str]:
+    """
+    (文字コード, 判定元) を返す。判定元は
+    "bom" / "header" / "meta" / "learned" / "detected" / "default"。
+    """
+    for bom, enc in _BOMS:
+        if body.startswith(bom):
+            return enc, "bom"
+
+    header = normalize_encoding(charset_from_content_type(content_type))
+    meta = normalize_encoding(sniff_meta_charset(body))
+    if (
+        header
+        and header not in _UNRELIABLE
+        and (meta is None or meta == header)
+        and decodes_strictly(body, header)
+    ):
+        if cache is not None:
+            cache.learn(host, header)
+        return header, "header"
+
+    if meta and decodes_strictly(body, meta):
+        if cache is not None:
+            cache.learn(host, meta)
+        return meta, "meta"
+
+    learned = cache.get(host) if cache is not None else None
+    if learned and decodes_strictly(body, learned):
+        return learned, "learned"
+
+    detected = normalize_encoding(detect_encoding(body))
+    if detected:
+        if cache is not None:
+            cache.learn(host, detected)
+        return detected, "detected"
+    return "utf-8", "default"
+
+
+def decode_body(
+    body: bytes,
+    content_type: Optional[str] = None,
+    host: str = "",
+    cache: Optional[EncodingCache] = ENCODING_CACHE,
+) -> str:
+    enc, _ = resolve_encoding(body, content_type, host, cache)
+    return body.decode(enc, errors="replace")
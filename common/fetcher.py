@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+全スクレイパー共通の非同期フェッチエンジン
+- aiohttp によるコネクションプール / keep-alive / DNSキャッシュ
+- 同時リクエスト数（in-flight 上限）は FetchConfig で設定
+- rate_limiter を渡すとホスト単位のトークンバケットで送信レートを制限
+- 再試行は Retry-After かジッター付き指数バックオフで待ち、iter_fetch / fetch_or_defer では
+  待っている間も同時数の枠を空けてほかのURLを進める。失敗が続くホストは
+  サーキットブレーカーで一時的に止める（common.retry）
+- 文字コードは common.encoding の高速パスで判定（res.encoding / res.text）
+- cache を渡すと common.http_cache のディスクキャッシュを使い、再実行時は 304 で済ませる
+- 非同期コードからは AsyncFetcher、同期コードからは Fetcher を使う
+- 複数サイトを同時に回す場合は FetchBudget を共有し、全体とホストごとの同時数を抑える
+- adaptive を渡すとホストごとの同時数を common.adaptive の AIMD で自動調整する
+  （応答時間・429/503・タイムアウトを見て増減。concurrency は全体の上限になる）
+- 大きいファイル（サイトマップなど）は stream() で本文を逐次読む
+- 段ごとの所要時間（DNS・接続・TTFB・本文受信・文字コード判定）とホストごとのカウンタを
+  common.metrics.METRICS に記録する
+
+使い方（同期）:
+  with Fetcher(FetchConfig(concurrency=200)) as fetcher:
+      for res in fetcher.iter_fetch(urls):
+          if res.ok:
+              html = res.text
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+from common.adaptive import OVERLOAD_STATUSES, AdaptiveLimit, AimdConfig
+from common.encoding import resolve_encoding
+from common.http_cache import CacheEntry, HttpCache
+from common.metrics import METRICS
+from common.rate_limit import HostRateLimiter
+from common.retry import BACKLOG_PER_WORKER, CircuitBreaker, RetryQueue, retry_delay
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+DEFAULT_HEADERS = {
+    "User-Agent": DEFAULT_USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ja,en;q=0.9",
+}
+
+
+@dataclass
+class FetchConfig:
+    concurrency: int = 100  # 全体の同時リクエスト数
+    per_host: int = 0  # ホストごとの同時接続数（0 は無制限）
+    timeout: float = 20.0  # 1リクエストの総タイムアウト（秒）
+    retries: int = 2  # 失敗時の再試行回数
+    retry_backoff: float = 1.5  # 再試行までの待機の基準（秒）。試行ごとに倍（ジッター付き）
+    retry_max_delay: float = 60.0  # 再試行までの待機の上限（秒）。Retry-After もここで打ち切る
+    dns_ttl: int = 300  # DNSキャッシュの有効期間（秒）
+    keepalive_timeout: float = 30.0  # アイドル接続を保持する時間（秒）
+    headers: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_HEADERS))
+    # ホスト単位のレート制限（None なら制限なし）。複数の Fetcher で共有してよい
+    rate_limiter: Optional[HostRateLimiter] = None
+    # ディスクキャッシュ（None なら使わない）。TTL 切れは条件付きGETで再検証
+    cache: Optional[HttpCache] = None
+    # ホストごとの同時数の自動調整（None なら固定）。上限は adaptive.max_limit
+    adaptive: Optional[AimdConfig] = None
+    # ホスト単位のサーキットブレーカー（None なら AsyncFetcher ごとに既定の設定で作る）
+    breaker: Optional[CircuitBreaker] = None
+
+
+@dataclass
+class FetchResult:
+    url: str
+    final_url: str
+    status: Optional[int]
+    body: bytes = b""
+    headers: Mapping[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+    from_cache: bool = False
+    _encoding: Optional[str] = field(default=None, repr=False, compare=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status is not None and 200 <= self.status < 300
+
+    @property
+    def encoding(self) -> str:
+        """
+        本文の文字コード（ヘッダ → meta → ホスト学習 → 推定 の順で判定）。
+        BeautifulSoup に bytes を直接渡す場合は from_encoding にこれを指定する。
+        """
+        if self._encoding is None:
+            t0 = time.perf_counter()
+            host = urlsplit(self.final_url).hostname or ""
+            self._encoding, _ = resolve_encoding(
+                self.body, self.headers.get("Content-Type"), host
+            )
+            METRICS.observe("charset", time.perf_counter() - t0, self.url)
+        return self._encoding
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(self.encoding, errors="replace")
+
+
+def _from_entry(entry: CacheEntry) -> FetchResult:
+    return FetchResult(
+        url=entry.url,
+        final_url=entry.final_url,
+        status=entry.status,
+        body=entry.body,
+        headers=CIMultiDict(entry.headers),
+        from_cache=True,
+    )
+
+
+def _is_retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """DNS解決・新規接続の開始/終了時刻を trace_request_ctx（dict）に記録する"""
+
+    def mark(key: str):
+        async def on_event(session, ctx, params) -> None:
+            if isinstance(ctx.trace_request_ctx, dict):
+                ctx.trace_request_ctx[key] = time.perf_counter()
+
+        return on_event
+
+    trace = aiohttp.TraceConfig()
+    trace.on_dns_resolvehost_start.append(mark("dns_start"))
+    trace.on_dns_resolvehost_end.append(mark("dns_end"))
+    trace.on_connection_create_start.append(mark("conn_start"))
+    trace.on_connection_create_end.append(mark("conn_end"))
+    return trace
+
+
+def _record_timings(
+    url: str, marks: Dict[str, float], start: float, headers_at: float, body_at: float
+) -> None:
+    """1リクエスト分の段ごとの所要時間を記録する（接続を使い回した場合は dns/connect なし）"""
+    timings: Dict[str, float] = {}
+    dns = 0.0
+    if "dns_start" in marks and "dns_end" in marks:
+        dns = marks["dns_end"] - marks["dns_start"]
+        timings["dns"] = dns
+    sent = start
+    if "conn_start" in marks and "conn_end" in marks:
+        timings["connect"] = max(0.0, marks["conn_end"] - marks["conn_start"] - dns)
+        sent = marks["conn_end"]
+    timings["ttfb"] = headers_at - sent
+    timings["download"] = body_at - headers_at
+    METRICS.observe_all(timings, url)
+
+
+class SlotTicket:
+    """slot() の中で行った1リクエストの結果（同時数の自動調整に渡す）"""
+
+    __slots__ = ("latency", "overloaded")
+
+    def __init__(self):
+        self.latency: Optional[float] = None  # TTFB（秒）。不明なら None
+        self.overloaded = False  # 429/503・タイムアウト・接続エラー
+
+
+class FetchBudget:
+    """
+    同時リクエスト数の上限（全体 total / ホストごと per_host）。
+    複数の AsyncFetcher に同じものを渡すと、サイトをまたいで上限を共有する。
+    ホストの枠を待つ間は全体の枠を消費しない。
+    adaptive を渡すとホストごとの枠は固定の per_host ではなく AIMD で増減する。
+    """
+
+    def __init__(
+        self, total: int, per_host: int = 0, adaptive: Optional[AimdConfig] = None
+    ):
+        self.total = total
+        self.per_host = per_host
+        self.adaptive = adaptive
+        self._sem = asyncio.Semaphore(total)
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        self._host_limits: Dict[str, AdaptiveLimit] = {}
+
+    def host_limit(self, url: str) -> int:
+        """url のホストの現在の同時数の上限（0 は無制限）"""
+        if self.adaptive is not None:
+            limit = self._host_limits.get(urlsplit(url).hostname or "")
+            if limit is None:
+                return max(self.adaptive.min_limit, min(self.adaptive.initial, self.adaptive.max_limit))
+            return int(limit.limit)
+        return self.per_host
+
+    def limits(self) -> Dict[str, float]:
+        """ホストごとの現在の同時数の上限（自動調整しているホストのみ）"""
+        return {host: round(lim.limit, 2) for host, lim in self._host_limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[SlotTicket]:
+        ticket = SlotTicket()
+        if self.adaptive is not None:
+            host = urlsplit(url).hostname or ""
+            limit = self._host_limits.get(host)
+            if limit is None:
+                limit = self._host_limits[host] = AdaptiveLimit(self.adaptive)
+            await limit.acquire()
+            try:
+                async with self._sem:
+                    yield ticket
+            finally:
+                backoffs = limit.backoffs
+                limit.release(ticket.latency, ticket.overloaded)
+                if limit.backoffs != backoffs:
+                    METRICS.count(host, "backoffs")
+            return
+        if self.per_host <= 0:
+            async with self._sem:
+                yield ticket
+            return
+        host = urlsplit(url).hostname or ""
+        host_sem = self._host_sems.get(host)
+        if host_sem is None:
+            host_sem = self._host_sems[host] = asyncio.Semaphore(self.per_host)
+        async with host_sem:
+            async with self._sem:
+                yield ticket
+
+
+class AsyncFetcher:
+    """
+    aiohttp セッションを1つだけ持ち、全リクエストで接続を使い回す。
+    async with で開閉する。
+    budget を渡すと同時数の上限をほかの AsyncFetcher と共有する
+    （渡さなければ config.concurrency の専用の上限）。
+    """
+
+    def __init__(
+        self, config: Optional[FetchConfig] = None, budget: Optional[FetchBudget] = None
+    ):
+        self.config = config or FetchConfig()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._budget = budget
+        self.breaker = self.config.breaker or CircuitBreaker()
+
+    async def __aenter__(self) -> "AsyncFetcher":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        cfg = self.config
+        connector = aiohttp.TCPConnector(
+            limit=cfg.concurrency,
+            limit_per_host=cfg.per_host,
+            ttl_dns_cache=cfg.dns_ttl,
+            keepalive_timeout=cfg.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=cfg.headers,
+            timeout=aiohttp.ClientTimeout(total=cfg.timeout),
+            trace_configs=[_trace_config()],
+        )
+        if self._budget is None:
+            self._budget = FetchBudget(cfg.concurrency, cfg.per_host, adaptive=cfg.adaptive)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def host_limit(self, url: str) -> int:
+        """url のホストの現在の同時数の上限（0 は無制限）。open() の後で使う"""
+        return self._budget.host_limit(url) if self._budget is not None else 0
+
+    async def fetch(self, url: str) -> FetchResult:
+        """再試行を含めて1URLを取得する（待ち時間の間もこのコルーチンは戻らない）"""
+        attempt = 0
+        while True:
+            res, delay = await self.try_fetch(url, attempt)
+            if delay is None:
+                return res
+            if res is not None:
+                attempt += 1
+            await asyncio.sleep(delay)
+
+    async def fetch_or_defer(self, url: str, retry: RetryQueue) -> Optional[FetchResult]:
+        """
+        1回だけ試し、再試行が必要なら retry に預けて None を返す（呼び出し側は待たずに次へ進む）。
+        最終的な結果（成功、または再試行を使い切った失敗）なら FetchResult を返す
+        """
+        res, delay = await self.try_fetch(url, retry.attempt(url))
+        if delay is None:
+            retry.forget(url)
+            return res
+        retry.defer(url, delay, count=res is not None)
+        return None
+
+    async def try_fetch(
+        self, url: str, attempt: int = 0
+    ) -> Tuple[Optional[FetchResult], Optional[float]]:
+        """
+        attempt 回目（0始まり）の取得を1回だけ行う。戻り値は
+          (結果, None)   最終的な結果
+          (結果, 秒)     再試行すべき失敗。秒は Retry-After またはジッター付き指数バックオフ
+          (None, 秒)     ホストがサーキットブレーカーで止まっているので送らなかった
+        落ちているとみなしたホストへは送らずに error="circuit open" の結果をすぐ返す
+        """
+        assert self._session is not None, "open() が必要です"
+        cfg = self.config
+        host = urlsplit(url).hostname or ""
+        cache = cfg.cache
+        entry: Optional[CacheEntry] = None
+        if cache is not None:
+            entry = await asyncio.to_thread(cache.get, url)
+            if entry is not None and cache.is_fresh(entry):
+                METRICS.count(host, "cache_hits")
+                return _from_entry(entry), None
+
+        if self.breaker.fail_fast(host):
+            return FetchResult(url, url, None, error="circuit open"), None
+        wait = self.breaker.wait_time(host)
+        if wait > 0:
+            return None, wait
+        if attempt:
+            METRICS.count(host, "retries")
+        # トークン待ちの間は in-flight 枠を消費しない
+        if cfg.rate_limiter is not None:
+            await cfg.rate_limiter.acquire_async(url)
+        extra = entry.validators() if entry is not None else None
+        async with self._budget.slot(url) as ticket:
+            last = await self._get_once(url, extra, ticket)
+        # 成功・304・4xx（429除く）は再試行しない
+        retryable = last.status is None or _is_retryable(last.status)
+        self.breaker.record(host, not retryable)
+        if retryable and attempt < cfg.retries:
+            retry_after = last.headers.get("Retry-After") if last.status in OVERLOAD_STATUSES else None
+            delay = retry_delay(attempt, cfg.retry_backoff, cfg.retry_max_delay, retry_after)
+            if retry_after is not None:
+                # サーバーが待てと言っているので、ほかのURLも含めてホストごと待つ
+                self.breaker.pause(host, delay)
+            return last, delay
+
+        if cache is not None:
+            if last.status == 304 and entry is not None:
+                METRICS.count(host, "cache_revalidated")
+                await asyncio.to_thread(cache.touch, entry)
+                return _from_entry(entry), None
+            if last.ok:
+                await asyncio.to_thread(
+                    cache.put,
+                    url,
+                    last.final_url,
+                    last.status,
+                    last.headers,
+                    last.body,
+                )
+        return last, None
+
+    @asynccontextmanager
+    async def stream(self, url: str) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        本文を読み込まずにレスポンスを返す（サイトマップなど大きいファイルを逐次処理する用）。
+        レート制限と同時数の上限は fetch と同じだが、枠を使うのはヘッダを受け取るまでで、
+        本文の読み込み中（受け手の処理待ちを含む）は枠を空ける。キャッシュ・再試行は使わず、
+        通信エラーは aiohttp の例外がそのまま上がる。
+        タイムアウトは総時間ではなく接続・1回の読み込みごとに config.timeout
+        """
+        assert self._session is not None, "open() が必要です"
+        cfg = self.config
+        if cfg.rate_limiter is not None:
+            await cfg.rate_limiter.acquire_async(url)
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=cfg.timeout, sock_read=cfg.timeout
+        )
+        host = urlsplit(url).hostname or ""
+        METRICS.count(host, "requests")
+        async with self._budget.slot(url) as ticket:
+            resp = await self._session.get(url, timeout=timeout)
+            METRICS.count(host, f"status_{resp.status}")
+            # 本文の読み込み時間はファイルの大きさ次第なので、応答時間は調整に使わない
+            ticket.overloaded = resp.status in OVERLOAD_STATUSES
+        async with resp:
+            yield resp
+
+    async def _get_once(
+        self,
+        url: str,
+        extra_headers: Optional[Dict[str, str]] = None,
+        ticket: Optional[SlotTicket] = None,
+    ) -> FetchResult:
+        host = urlsplit(url).hostname or ""
+        METRICS.count(host, "requests")
+        marks: Dict[str, float] = {}
+        start = time.perf_counter()
+        try:
+            async with self._session.get(
+                url, headers=extra_headers, trace_request_ctx=marks
+            ) as resp:
+                headers_at = time.perf_counter()
+                status = resp.status
+                if ticket is not None:
+                    ticket.latency = headers_at - start
+                    ticket.overloaded = status in OVERLOAD_STATUSES
+                body = await resp.read()
+                _record_timings(url, marks, start, headers_at, time.perf_counter())
+                METRICS.count(host, f"status_{status}")
+                METRICS.count(host, "bytes", len(body))
+                error = None if 200 <= status < 300 else f"HTTP {status}"
+                return FetchResult(
+                    url=url,
+                    final_url=str(resp.url),
+                    status=status,
+                    body=body,
+                    headers=CIMultiDict(resp.headers),
+                    error=error,
+                )
+        except asyncio.TimeoutError:
+            METRICS.count(host, "error_timeout")
+            if ticket is not None:
+                ticket.overloaded = True
+            return FetchResult(url, url, None, error="timeout")
+        except aiohttp.ClientError as e:
+            METRICS.count(host, f"error_{type(e).__name__}")
+            if ticket is not None:
+                ticket.overloaded = True
+            return FetchResult(url, url, None, error=f"{type(e).__name__}: {e}")
+
+    async def iter_fetch(self, urls: Iterable[str]) -> AsyncIterator[FetchResult]:
+        """
+        URL群を並列取得し、完了順に返す。
+        同時に走るタスクは concurrency 件までに抑える。
+        再試行待ちのURLは RetryQueue に預け、待っている間もほかのURLの取得を進める
+        （預けている件数が concurrency の BACKLOG_PER_WORKER 倍に達したら新しいURLは読まない）
+        """
+        limit = self.config.concurrency
+        retry = RetryQueue(backlog=limit * BACKLOG_PER_WORKER)
+        pending: Dict[asyncio.Future, str] = {}
+        it = iter(urls)
+        exhausted = False
+
+        def start(url: str) -> None:
+            pending[asyncio.ensure_future(self.fetch_or_defer(url, retry))] = url
+
+        try:
+            while True:
+                # 期限の来た再試行を優先し、空いた分だけ新しいURLを読む
+                for url in retry.pop_due(limit - len(pending)):
+                    start(url)
+                while not exhausted and len(pending) < limit and retry.has_room():
+                    try:
+                        url = next(it)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    start(url)
+                if not pending:
+                    delay = retry.next_delay()
+                    if delay is None:
+                        return
+                    await asyncio.sleep(delay)
+                    continue
+                done, _ = await asyncio.wait(
+                    pending, timeout=retry.next_delay(), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    del pending[task]
+                    res = task.result()
+                    if res is not None:
+                        yield res
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class Fetcher:
+    """
+    AsyncFetcher を専用スレッドのイベントループ上で動かす同期ラッパー。
+    既存の同期スクレイパーからはこちらを使う。
+    """
+
+    def __init__(self, config: Optional[FetchConfig] = None):
+        self.config = config or FetchConfig()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._async = AsyncFetcher(self.config)
+        self._call(self._async.open())
+
+    def __enter__(self) -> "Fetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._call(self._async.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def fetch(self, url: str) -> FetchResult:
+        return self._call(self._async.fetch(url))
+
+    def iter_fetch(self, urls: Iterable[str]) -> Iterator[FetchResult]:
+        agen = self._async.iter_fetch(urls)
+        try:
+            while True:
+                try:
+                    yield self._call(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._call(agen.aclose())
+
+
+def fetch_once(url: str, config: Optional[FetchConfig] = None) -> FetchResult:
+    """単発取得用のショートカット"""
+    with Fetcher(config) as fetcher:
+        return fetcher.fetch(url)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+HTMLパーサの切り替え（全スクレイパー共通の設定）
+- "html.parser": 標準ライブラリ（純Python、遅いが依存なし）
+- "lxml":        C実装。BeautifulSoup のビルダーとして使う
+- "lexbor":      selectolax (lexbor)。CSSセレクタだけで済む抽出器向けの高速パス。
+                 BeautifulSoup が必要な抽出器では lxml（無ければ html.parser）で代用する
+
+環境変数 SCRAPE_HTML_PARSER で選択（既定は lxml、未インストールなら html.parser）。
+
+解析範囲（ParseScope）: 各サイトは抽出器が見る範囲を宣言でき、木を小さくして解析を速くする
+- prune: パース前に script / style の中身をテキストのまま取り除く（bs4 の get_text() も
+         抽出器も読まない部分。前後のテキストがつながらないよう空コメントに置き換える）。
+         コメント（IE の条件付きコメントを含む）の中はそのまま残す
+- tags:  SoupStrainer で指定タグ（とその子孫）だけを木にする。抽出器が決まったタグの中しか
+         見ない場合だけ指定する（親・兄弟をたどる抽出器や全文を使う抽出器では空のまま）
+tags は bs4 でしか効かないので、バックエンドで結果が変わらないよう CssDoc では使えない
+（CssDoc は prune だけを使う）。
+"""
+
+import importlib.util
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from common.metrics import clock_add
+
+BACKENDS = ("html.parser", "lxml", "lexbor")
+
+
+def _available(backend: str) -> bool:
+    if backend == "lxml":
+        return importlib.util.find_spec("lxml") is not None
+    if backend == "lexbor":
+        return importlib.util.find_spec("selectolax") is not None
+    return True
+
+
+def _default_backend() -> str:
+    name = os.environ.get("SCRAPE_HTML_PARSER", "lxml")
+    if name not in BACKENDS:
+        raise ValueError(f"SCRAPE_HTML_PARSER は {BACKENDS} のいずれかを指定してください: {name}")
+    return name if _available(name) else "html.parser"
+
+
+HTML_PARSER = _default_backend()
+
+
+def set_backend(name: str) -> None:
+    """実行中にパーサを切り替える（ベンチマーク用）"""
+    global HTML_PARSER
+    if name not in BACKENDS:
+        raise ValueError(f"未知のパーサです: {name}")
+    if not _available(name):
+        raise ImportError(f"{name} がインストールされていません")
+    HTML_PARSER = name
+
+
+def soup_builder() -> str:
+    """BeautifulSoup に渡すビルダー名"""
+    if HTML_PARSER == "lexbor":
+        return "lxml" if _available("lxml") else "html.parser"
+    return HTML_PARSER
+
+
+# 既定で取り除くタグ（中身は生テキストとして読まれ、抽出に使われない）
+PRUNE_TAGS = ("script", "style")
+
+
+@dataclass(frozen=True)
+class ParseScope:
+    tags: Tuple[str, ...] = ()  # 木にするタグ（空なら文書全体）
+    prune: Tuple[str, ...] = PRUNE_TAGS  # パース前に取り除くタグ
+
+
+_PRUNE_STR: Dict[Tuple[str, ...], "re.Pattern[str]"] = {}
+_PRUNE_BYTES: Dict[Tuple[str, ...], "re.Pattern[bytes]"] = {}
+
+
+def _prune_pattern(tags: Tuple[str, ...], binary: bool):
+    cache = _PRUNE_BYTES if binary else _PRUNE_STR
+    pat = cache.get(tags)
+    if pat is None:
+        # <script ...> から最初の </script> まで（HTMLパーサと同じく中身は入れ子にならない）。
+        # コメントは先に丸ごと読み飛ばす（中の <script> を消すとコメントが途中で閉じてしまう）
+        names = "|".join(re.escape(t) for t in tags)
+        src = rf"(<!--.*?(?:-->|\Z))|<({names})\b[^>]*>.*?</\2\s*>"
+        flags = re.IGNORECASE | re.DOTALL
+        pat = re.compile(src.encode("ascii") if binary else src, flags)
+        cache[tags] = pat
+    return pat
+
+
+def _ascii_compatible(markup: bytes, encoding: Optional[str]) -> bool:
+    """バイト列のまま < > やタグ名を探してよい文字コードか（UTF-16/32・ISO-2022 は不可）"""
+    if encoding:
+        name = encoding.lower().replace("_", "-")
+        return not any(k in name for k in ("16", "32", "2022"))
+    return not markup.startswith((b"\xff\xfe", b"\xfe\xff")) and b"\x1b$" not in markup
+
+
+def prune_markup(
+    markup: Union[str, bytes],
+    tags: Tuple[str, ...] = PRUNE_TAGS,
+    encoding: Optional[str] = None,
+) -> Union[str, bytes]:
+    """
+    tags の要素を中身ごと取り除いた markup を返す（デコード前のバイト列のままでもよい）。
+    Shift_JIS / EUC-JP / UTF-8 では < > が2バイト文字の途中に現れないのでバイト列で処理できる
+    """
+    if not tags:
+        return markup
+    binary = isinstance(markup, bytes)
+    if binary and not _ascii_compatible(markup, encoding):
+        return markup
+    t0 = time.perf_counter()
+    empty = b"<!---->" if binary else "<!---->"
+    pruned = _prune_pattern(tags, binary).sub(
+        lambda m: m.group(0) if m.group(1) is not None else empty, markup
+    )
+    clock_add("prune", time.perf_counter() - t0)
+    return pruned
+
+
+def make_soup(
+    markup: Union[str, bytes],
+    from_encoding: Optional[str] = None,
+    scope: Optional[ParseScope] = None,
+) -> BeautifulSoup:
+    """
+    設定中のパーサで BeautifulSoup を作る。
+    bytes を渡す場合は from_encoding（FetchResult.encoding）を指定するとデコードを省ける。
+    scope を渡すと script / style を取り除き、指定があればそのタグだけを木にする。
+    """
+    parse_only = None
+    if scope is not None:
+        markup = prune_markup(markup, scope.prune, from_encoding)
+        if scope.tags:
+            parse_only = SoupStrainer(list(scope.tags))
+    t0 = time.perf_counter()
+    if isinstance(markup, bytes):
+        soup = BeautifulSoup(
+            markup, soup_builder(), from_encoding=from_encoding, parse_only=parse_only
+        )
+    else:
+        soup = BeautifulSoup(markup, soup_builder(), parse_only=parse_only)
+    clock_add("parse", time.perf_counter() - t0)
+    return soup
+
+
+def use_css_fast_path() -> bool:
+    """CSSセレクタだけで済む抽出器が selectolax を使うべきか"""
+    return HTML_PARSER == "lexbor"
+
+
+def make_css_tree(markup: Union[str, bytes], encoding: Optional[str] = None):
+    """selectolax (lexbor) のツリーを作る。use_css_fast_path() が True のときだけ使う"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    t0 = time.perf_counter()
+    if isinstance(markup, bytes):
+        markup = markup.decode(encoding or "utf-8", errors="replace")
+    tree = LexborHTMLParser(markup)
+    clock_add("parse", time.perf_counter() - t0)
+    return tree
+
+
+class CssNode:
+    """bs4 の Tag / selectolax の Node を同じ形で扱うための薄いラッパー"""
+
+    __slots__ = ("_node", "_lexbor")
+
+    def __init__(self, node, lexbor: bool):
+        self._node = node
+        self._lexbor = lexbor
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        if self._lexbor:
+            attrs = self._node.attributes
+            if name not in attrs:
+                return default
+            # 値なし属性は bs4 と同じく空文字にそろえる
+            return attrs[name] or ""
+        return self._node.get(name, default)
+
+    def text(self, separator: str = "", strip: bool = False) -> str:
+        if not self._lexbor:
+            return self._node.get_text(separator, strip=strip)
+        if not strip:
+            return self._node.text(separator=separator)
+        # bs4 の get_text(strip=True) と同じく空になった断片は捨てる
+        parts = self._node.text(separator="\x00", strip=True).split("\x00")
+        return separator.join(p for p in parts if p)
+
+
+class CssDoc:
+    """CSSセレクタだけで済む抽出器向けの文書。バックエンドは設定に従う"""
+
+    def __init__(
+        self,
+        markup: Union[str, bytes],
+        from_encoding: Optional[str] = None,
+        scope: Optional[ParseScope] = None,
+    ):
+        if scope is not None and scope.tags:
+            raise ValueError("CssDoc では ParseScope.tags は使えません（lexbor では絞り込めないため）")
+        self._lexbor = use_css_fast_path()
+        if self._lexbor:
+            if scope is not None:
+                markup = prune_markup(markup, scope.prune, from_encoding)
+            self._tree = make_css_tree(markup, from_encoding)
+        else:
+            self._tree = make_soup(markup, from_encoding, scope)
+
+    def select(self, selector: str) -> List[CssNode]:
+        if not self._lexbor:
+            return [CssNode(n, False) for n in self._tree.select(selector)]
+        # lexbor はセレクタリストで同じ要素を重複して返すことがあるので除く
+        seen = set()
+        out: List[CssNode] = []
+        for n in self._tree.css(selector):
+            if n.mem_id in seen:
+                continue
+            seen.add(n.mem_id)
+            out.append(CssNode(n, True))
+        return out
+
+    def select_one(self, selector: str) -> Optional[CssNode]:
+        if not self._lexbor:
+            n = self._tree.select_one(selector)
+        else:
+            n = self._tree.css_first(selector)
+        return CssNode(n, self._lexbor) if n is not None else None
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+ディスク上のHTTPレスポンスキャッシュ
+- キーは URL の SHA-256。本文は gzip 圧縮、メタ情報（ETag / Last-Modified 等）は JSON
+- TTL 内ならネットワークに出ず、その場でキャッシュを返す
+- TTL 切れは If-None-Match / If-Modified-Since で再検証し、304 なら本文を再利用
+- 合計サイズが max_bytes を超えたら最終アクセスの古いものから削除
+- 合計サイズは同じディレクトリを指す HttpCache 同士で共有し（サイトごとに別のインスタンスでも
+  上限は1つ）、最初の書き込み時に一度だけ数える（作るたびにディレクトリを走査しない）
+- 既定の置き場所は DEFAULT_CACHE_DIR（環境変数 SCRAPE_HTTP_CACHE_DIR、無ければリポジトリ直下の
+  .http_cache。実行時のカレントに依存しない）
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get("SCRAPE_HTTP_CACHE_DIR")
+    or Path(__file__).resolve().parent.parent / ".http_cache"
+)
+
+
+class _DirUsage:
+    """1ディレクトリ分の合計サイズ（未計算なら None）とロック"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total: Optional[int] = None
+
+
+_USAGE: Dict[Path, _DirUsage] = {}
+_USAGE_LOCK = threading.Lock()
+
+
+def _usage(directory: Path) -> _DirUsage:
+    with _USAGE_LOCK:
+        usage = _USAGE.get(directory)
+        if usage is None:
+            usage = _USAGE[directory] = _DirUsage()
+        return usage
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    final_url: str
+    status: int
+    headers: Dict[str, str]
+    fetched_at: float
+    body: bytes
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.fetched_at
+
+    def validators(self) -> Dict[str, str]:
+        """条件付きリクエスト用のヘッダ"""
+        out: Dict[str, str] = {}
+        if self.headers.get("ETag"):
+            out["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            out["If-Modified-Since"] = self.headers["Last-Modified"]
+        return out
+
+
+class HttpCache:
+    def __init__(
+        self,
+        directory: Union[str, Path] = DEFAULT_CACHE_DIR,
+        ttl: float = 24 * 3600,
+        max_bytes: int = 2 * 1024**3,
+        compresslevel: int = 6,
+    ):
+        self.directory = Path(directory).resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self._usage = _usage(self.directory)
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        k = self.key(url)
+        base = self.directory / k[:2]
+        return base / f"{k}.json", base / f"{k}.body.gz"
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with gzip.open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, EOFError):
+            return None
+        # 最終アクセス時刻を更新（削除順の判定に使う）
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return CacheEntry(
+            url=meta["url"],
+            final_url=meta.get("final_url", meta["url"]),
+            status=meta["status"],
+            headers=meta.get("headers", {}),
+            fetched_at=meta["fetched_at"],
+            body=body,
+        )
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.age() < self.ttl
+
+    def put(
+        self,
+        url: str,
+        final_url: str,
+        status: int,
+        headers,
+        body: bytes,
+    ) -> None:
+        meta_path, body_path = self._paths(url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        kept = {h: headers[h] for h in _KEPT_HEADERS if headers.get(h)}
+        meta = {
+            "url": url,
+            "final_url": final_url,
+            "status": status,
+            "headers": kept,
+            "fetched_at": time.time(),
+        }
+        with self._usage.lock:
+            if self._usage.total is None:
+                # このディレクトリへの最初の書き込みで一度だけ数える
+                self._usage.total = sum(size for _, size, _ in self._scan())
+        old = self._size(meta_path, body_path)
+        # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+        tmp_body = body_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with gzip.open(tmp_body, "wb", compresslevel=self.compresslevel) as f:
+            f.write(body)
+        os.replace(tmp_body, body_path)
+        tmp_meta = meta_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+        with self._usage.lock:
+            self._usage.total += self._size(meta_path, body_path) - old
+            over = self._usage.total > self.max_bytes
+        if over:
+            self.evict()
+
+    def touch(self, entry: CacheEntry) -> None:
+        """304 で再検証できたエントリの取得時刻を更新"""
+        meta_path, _ = self._paths(entry.url)
+        entry.fetched_at = time.time()
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["fetched_at"] = entry.fetched_at
+            tmp_meta = meta_path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, meta_path)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _size(*paths: Path) -> int:
+        total = 0
+        for p in paths:
+            try:
+                total += p.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _scan(self) -> Iterator[Tuple[Path, int, float]]:
+        """(メタファイル, エントリの合計サイズ, 最終アクセス時刻) を列挙"""
+        for meta_path in self.directory.glob("*/*.json"):
+            body_path = meta_path.with_name(meta_path.stem + ".body.gz")
+            try:
+                atime = meta_path.stat().st_mtime
+            except OSError:
+                continue
+            yield meta_path, self._size(meta_path, body_path), atime
+
+    def evict(self, target_ratio: float = 0.9) -> None:
+        """合計サイズが max_bytes * target_ratio 以下になるまで古いものから削除"""
+        with self._usage.lock:
+            entries = sorted(self._scan(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            limit = self.max_bytes * target_ratio
+            for meta_path, size, _ in entries:
+                if total <= limit:
+                    break
+                body_path = meta_path.with_name(meta_path.stem + ".body.gz")
+                for p in (meta_path, body_path):
+                    try:
+                        p.unlink()
+                    except OSError:
+                        pass
+                total -= size
+            self._usage.total = total
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+追記専用の実行ジャーナル（チェックポイント / 再開用）
+- 1行1JSON: {"url": ..., "status": "ok"|"failed", "records": [...], "reason": ...}
+- 完了ごとに追記・flush するので、途中で落ちても完了分は残る
+- --resume 時は完了済みURLを飛ばし、最後に失敗分だけ再試行する
+- メモリに持つのは完了済みURLの 64bit ダイジェスト（1件あたり数十バイト）と失敗分のURL・理由だけで、
+  レコード本体はファイルから逐次読み出す（URL文字列は件数に比例して溜めない）
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+
+def _digest(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class RunJournal:
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ok: Set[int] = set()  # 成功したURLのダイジェスト
+        self._failed: Dict[str, Optional[str]] = {}  # 失敗したURL -> 理由
+        if resume:
+            for entry in self._read():
+                # 同じURLが複数回あれば後の結果（再試行分）を優先
+                self._set(entry)
+        else:
+            # 新規実行時は前回のジャーナルを捨てる
+            open(self.path, "w", encoding="utf-8").close()
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+    def _read(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # 書き込み途中で落ちた最終行は無視
+                    continue
+
+    def _set(self, entry: dict) -> None:
+        url = entry["url"]
+        if entry["status"] == "ok":
+            self._ok.add(_digest(url))
+            self._failed.pop(url, None)
+        else:
+            self._ok.discard(_digest(url))
+            self._failed[url] = entry.get("reason")
+
+    def _append(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._set(entry)
+            self._f.write(line + "\n")
+            self._f.flush()
+
+    def record_ok(self, url: str, records: List[Dict[str, str]]) -> None:
+        self._append({"url": url, "status": "ok", "records": records})
+
+    def record_failure(self, url: str, reason: str) -> None:
+        self._append({"url": url, "status": "failed", "reason": reason})
+
+    def is_done(self, url: str) -> bool:
+        return _digest(url) in self._ok
+
+    def pending(self, urls: Iterable[str]) -> Iterator[str]:
+        """未完了（未処理 / 失敗）のURLだけを順に返す（入力は遅延のまま流す）"""
+        return (u for u in urls if not self.is_done(u))
+
+    def failed_urls(self) -> List[str]:
+        return list(self._failed)
+
+    def counts(self) -> Dict[str, int]:
+        """状態ごとのURL数（{"ok": n, "failed": m}）"""
+        return {"ok": len(self._ok), "failed": len(self._failed)}
+
+    def failure_reason(self, url: str) -> Optional[str]:
+        return self._failed.get(url)
+
+    def iter_records(self) -> Iterator[Dict[str, str]]:
+        """成功したURLのレコードをファイルから順に返す（再開時の出力の再生用）"""
+        with self._lock:
+            self._f.flush()
+        for entry in self._read():
+            if entry["status"] == "ok":
+                yield from entry.get("records") or []
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+th→td（ラベル→値）行のインデックス
+ページ内の全 <tr> を1回だけ走査してラベル文字列と値セルを記録し、
+各項目（店名・住所・電話番号・HP など）はこのインデックスから引く。
+"""
+
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+
+
+class LabelIndex:
+    def __init__(self, soup: BeautifulSoup):
+        # (th のテキスト, td) を文書順に保持
+        self.rows: List[Tuple[str, Tag]] = []
+        for row in soup.find_all("tr"):
+            th = row.find("th")
+            td = row.find("td")
+            if th and td:
+                self.rows.append((th.get_text(strip=True), td))
+
+    def cells(self, labels: Iterable[str]) -> Iterator[Tag]:
+        """ラベルのいずれかを含む行の td を文書順に返す"""
+        labels = tuple(labels)
+        for text, td in self.rows:
+            if any(lbl in text for lbl in labels):
+                yield td
+
+    def first(self, labels: Iterable[str]) -> Optional[Tag]:
+        return next(self.cells(labels), None)
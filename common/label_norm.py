@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+表のラベル（「所在地」「代表取締役」など）を出力列名へ寄せる共通エンジン
+- サイトごとの同義語表 [(同義語, 列名), ...] を1本の正規表現にまとめてコンパイルする
+- 判定は「ラベルに含まれる同義語のうち、表で先に書かれたもの」が勝つ
+  （従来の「表を先頭から順に試して最初に含まれたもの」と同じ結果）
+- 同じラベルは何度も出てくるので、結果はラベルごとにメモ化する
+
+使い方:
+  norm = LabelNormalizer([("会社名", "名称"), ("所在地", "住所")])
+  norm("本社所在地")  # -> "住所"
+  norm("備考")        # -> "備考"（どれにも当たらなければ default、未指定ならラベルそのまま）
+"""
+
+import re
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class LabelNormalizer:
+    def __init__(
+        self,
+        synonyms: Iterable[Tuple[str, str]],
+        ignore_case: bool = False,
+        max_cache: int = 65536,
+    ):
+        self.synonyms = list(synonyms)
+        self.max_cache = max_cache
+        # 同義語ごとに1グループ。当たったグループ番号 - 1 が表での位置（優先度）になる。
+        # 先読み (?=...) で各位置から始まる同義語を重なりも含めて拾い、
+        # 同じ位置で複数が当たる場合は表で先のものが選ばれる
+        alternation = "|".join(f"({re.escape(syn)})" for syn, _ in self.synonyms)
+        self._pat = re.compile(
+            f"(?={alternation})", re.IGNORECASE if ignore_case else 0
+        )
+        self._cache: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def match(self, label: str) -> Optional[str]:
+        """ラベルに含まれる同義語のうち最優先のものの列名。無ければ None"""
+        cached = self._cache.get(label, self)
+        if cached is not self:
+            return cached
+        best = None
+        if self.synonyms:
+            for m in self._pat.finditer(label):
+                i = m.lastindex - 1
+                if best is None or i < best:
+                    best = i
+                    if best == 0:
+                        break
+        result = self.synonyms[best][1] if best is not None else None
+        with self._lock:
+            if len(self._cache) >= self.max_cache:
+                self._cache.clear()
+            self._cache[label] = result
+        return result
+
+    def __call__(self, label: str, default: Optional[str] = None) -> str:
+        key = self.match(label)
+        if key is not None:
+            return key
+        return label if default is None else default
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+実行メトリクス（段ごとの所要時間とホストごとのカウンタ）
+- 段（STAGES）ごとのヒストグラム: URL1件ごとの所要時間を記録し、遅いURLの上位も残す
+    dns / connect / ttfb / download  取得（AsyncFetcher が aiohttp のトレースで計測）
+    charset                          文字コード判定（FetchResult.encoding）
+    decode / prune / parse / extract 解析（ParsePool のワーカー側で計測して持ち帰る。
+                                     prune は ParseScope による script / style の除去）
+- ホストごとのカウンタ: リクエスト数・受信バイト数・ステータスコード・再試行・エラー・キャッシュヒット
+- 共有フェッチ・解析経路で常に記録し（軽い）、出力は環境変数 SCRAPE_METRICS_DIR を
+  設定したときだけ行う:
+    <ディレクトリ>/<名前>.metrics.json  実行サマリ（ヒストグラム・パーセンタイル推定・遅いURL）
+    <ディレクトリ>/<名前>.prom          Prometheus の textfile collector 形式
+
+使い方:
+  from common.metrics import METRICS, export_metrics
+  ...
+  export_metrics("dairitenhonpo")  # 実行の最後に
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+STAGES = ("dns", "connect", "ttfb", "download", "charset", "decode", "prune", "parse", "extract")
+# 秒。Prometheus の le ラベルになる（+Inf は暗黙）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SLOWEST_KEEP = 10  # 段ごとに残す遅いURLの件数
+METRICS_DIR_ENV = "SCRAPE_METRICS_DIR"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.slowest: List[Tuple[float, str]] = []  # (秒, URL) の最小ヒープ
+
+    def observe(self, seconds: float, url: Optional[str] = None) -> None:
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+        if url is not None:
+            if len(self.slowest) < SLOWEST_KEEP:
+                heapq.heappush(self.slowest, (seconds, url))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, url))
+
+    def quantile(self, q: float) -> float:
+        """バケットの上限で近似したパーセンタイル（+Inf に入った場合は最大のバケット上限）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[min(i, len(BUCKETS) - 1)]
+        return BUCKETS[-1]
+
+    def to_dict(self) -> dict:
+        cumulative = []
+        seen = 0
+        for n in self.counts:
+            seen += n
+            cumulative.append(seen)
+        return {
+            "count": self.count,
+            "sum_sec": round(self.sum, 6),
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_le_ms": self.quantile(0.50) * 1000,
+            "p90_le_ms": self.quantile(0.90) * 1000,
+            "p99_le_ms": self.quantile(0.99) * 1000,
+            "buckets": {
+                **{str(le): c for le, c in zip(BUCKETS, cumulative)},
+                "+Inf": cumulative[-1],
+            },
+            "slowest": [
+                {"ms": round(s * 1000, 3), "url": u}
+                for s, u in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+class RunMetrics:
+    """スレッドセーフなメトリクス置き場（プロセスに1つ: METRICS）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.stages: Dict[str, Histogram] = {s: Histogram() for s in STAGES}
+        self.hosts: Dict[str, Counter] = {}
+
+    def observe(self, stage: str, seconds: float, url: Optional[str] = None) -> None:
+        self.observe_all({stage: seconds}, url)
+
+    def observe_all(self, timings: Dict[str, float], url: Optional[str] = None) -> None:
+        with self._lock:
+            for stage, seconds in timings.items():
+                hist = self.stages.get(stage)
+                if hist is None:
+                    hist = self.stages[stage] = Histogram()
+                hist.observe(seconds, url)
+
+    def count(self, host: str, key: str, n: int = 1) -> None:
+        """key の例: requests / bytes / status_200 / retries / error_timeout / cache_hits"""
+        with self._lock:
+            counter = self.hosts.get(host)
+            if counter is None:
+                counter = self.hosts[host] = Counter()
+            counter[key] += n
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "elapsed_sec": round(time.perf_counter() - self._t0, 3),
+                "stages": {s: h.to_dict() for s, h in self.stages.items() if h.count},
+                "hosts": {host: _host_dict(c) for host, c in sorted(self.hosts.items())},
+            }
+
+    def prometheus(self, job: str) -> str:
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP scrape_stage_seconds URL1件あたりの段ごとの所要時間")
+            lines.append("# TYPE scrape_stage_seconds histogram")
+            for stage, h in self.stages.items():
+                if not h.count:
+                    continue
+                labels = f'job="{job}",stage="{stage}"'
+                seen = 0
+                for le, n in zip(BUCKETS, h.counts):
+                    seen += n
+                    lines.append(f'scrape_stage_seconds_bucket{{{labels},le="{le}"}} {seen}')
+                lines.append(f'scrape_stage_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"scrape_stage_seconds_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"scrape_stage_seconds_count{{{labels}}} {h.count}")
+            per_key: Dict[str, List[str]] = {}
+            for host, c in sorted(self.hosts.items()):
+                for key, n in sorted(c.items()):
+                    name, extra = _prom_name(key)
+                    per_key.setdefault(name, []).append(
+                        f'{name}{{job="{job}",host="{_escape(host)}"{extra}}} {n}'
+                    )
+            for name, samples in per_key.items():
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(samples)
+            lines.append("# TYPE scrape_run_duration_seconds gauge")
+            lines.append(
+                f'scrape_run_duration_seconds{{job="{job}"}} {time.perf_counter() - self._t0:.3f}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _host_dict(c: Counter) -> dict:
+    out: dict = {"status": {}, "errors": {}}
+    for key, n in sorted(c.items()):
+        if key.startswith("status_"):
+            out["status"][key[len("status_"):]] = n
+        elif key.startswith("error_"):
+            out["errors"][key[len("error_"):]] = n
+        else:
+            out[key] = n
+    return out
+
+
+def _prom_name(key: str) -> Tuple[str, str]:
+    if key.startswith("status_"):
+        return "scrape_host_responses_total", f',code="{key[len("status_"):]}"'
+    if key.startswith("error_"):
+        return "scrape_host_errors_total", f',error="{_escape(key[len("error_"):])}"'
+    return f"scrape_host_{key}_total", ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, text: str) -> None:
+    # textfile collector が書きかけを読まないように置き換えで書く
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+METRICS = RunMetrics()
+
+
+# ---- ワーカー側の計測（スレッドごとの累積秒。ParsePool が呼び出しごとの差分を取る）
+_local = threading.local()
+
+
+def clock_add(stage: str, seconds: float) -> None:
+    totals = getattr(_local, "totals", None)
+    if totals is None:
+        totals = _local.totals = {}
+    totals[stage] = totals.get(stage, 0.0) + seconds
+
+
+def clock_snapshot() -> Dict[str, float]:
+    return dict(getattr(_local, "totals", None) or {})
+
+
+def export_metrics(name: str, directory: Optional[str] = None) -> Optional[str]:
+    """
+    METRICS を <directory>/<name>.metrics.json と <name>.prom に書き出す。
+    directory 省略時は環境変数 SCRAPE_METRICS_DIR。どちらも無ければ何もしない
+    """
+    directory = directory or os.environ.get(METRICS_DIR_ENV)
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    _write_atomic(
+        base + ".metrics.json",
+        json.dumps(METRICS.summary(), ensure_ascii=False, indent=2) + "\n",
+    )
+    _write_atomic(base + ".prom", METRICS.prometheus(name))
+    print(f"[INFO] メトリクスを出力: {base}.metrics.json / {base}.prom")
+    return base
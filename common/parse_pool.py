@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+解析（CPU処理）専用の実行ステージ
+- 取得（I/O）は Fetcher / AsyncFetcher、解析はこのプールと、段ごとに別々の並列数を持つ
+- 取得側は生バイト列と判定済みの文字コードだけを渡し、デコード以降はワーカー側で行う
+- 実行方式は環境変数 SCRAPE_PARSE_EXECUTOR で選択
+    "process":     ProcessPoolExecutor（既定。GIL を避けてコア数までスケールする）
+    "interpreter": InterpreterPoolExecutor（Python 3.14 以降。無ければ process）
+    "thread":      ThreadPoolExecutor（デバッグ用。解析は1コア分しか進まない）
+- 並列数は SCRAPE_PARSE_WORKERS（既定は CPU コア数）
+- ワーカー側でデコード・パース（ツリー構築）・抽出の所要時間を測り、
+  結果と一緒に持ち帰って common.metrics.METRICS に記録する
+
+解析関数はワーカーへ参照で渡すため、モジュール直下で定義した関数にすること。
+
+使い方（同期）:
+  with ParsePool() as pool:
+      for res, fut in pool.map_results(fetcher.iter_fetch(urls), extract_record):
+          if fut is not None:
+              rec = fut.result()
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, InvalidStateError
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from common.fetcher import FetchResult
+from common.metrics import METRICS, clock_add, clock_snapshot
+
+EXECUTORS = ("process", "interpreter", "thread")
+
+
+def _default_kind() -> str:
+    kind = os.environ.get("SCRAPE_PARSE_EXECUTOR", "process")
+    if kind not in EXECUTORS:
+        raise ValueError(f"SCRAPE_PARSE_EXECUTOR は {EXECUTORS} のいずれかを指定してください: {kind}")
+    return kind
+
+
+def _default_workers() -> int:
+    n = os.environ.get("SCRAPE_PARSE_WORKERS")
+    return int(n) if n else (os.cpu_count() or 1)
+
+
+def _make_executor(kind: str, workers: int) -> Executor:
+    if kind == "interpreter":
+        pool_cls = getattr(concurrent.futures, "InterpreterPoolExecutor", None)
+        if pool_cls is not None:
+            return pool_cls(max_workers=workers)
+        kind = "process"
+    if kind == "process":
+        # 取得側はスレッド（イベントループ）を動かしているので fork は避ける
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx
+        )
+    return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+
+def decode_and_call(fn: Callable, url: str, body: bytes, encoding: str):
+    """ワーカー側で本文をデコードしてから fn(url, html) を呼ぶ"""
+    t0 = time.perf_counter()
+    html = body.decode(encoding, errors="replace")
+    clock_add("decode", time.perf_counter() - t0)
+    return fn(url, html)
+
+
+def call_with_bytes(fn: Callable, url: str, body: bytes, encoding: str):
+    """デコードも解析器に任せる場合: fn(url, body, encoding) を呼ぶ"""
+    return fn(url, body, encoding)
+
+
+def timed_call(fn: Callable, *args) -> Tuple[object, Dict[str, float]]:
+    """
+    ワーカー側で fn(*args) を呼び、(結果, 段ごとの所要時間) を返す。
+    decode / prune / parse は計測済みの累積時間の差分、残りを extract とする
+    """
+    before = clock_snapshot()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    total = time.perf_counter() - t0
+    after = clock_snapshot()
+    timings = {k: v - before.get(k, 0.0) for k, v in after.items() if v != before.get(k)}
+    timings["extract"] = max(0.0, total - sum(timings.values()))
+    return result, timings
+
+
+class ParsePool:
+    def __init__(self, workers: Optional[int] = None, kind: Optional[str] = None):
+        self.workers = workers or _default_workers()
+        self.kind = kind or _default_kind()
+        self.executor = _make_executor(self.kind, self.workers)
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args, url: Optional[str] = None) -> Future:
+        """
+        fn(*args) をワーカーで実行する。所要時間は METRICS に記録し、
+        返す Future の結果は fn の戻り値そのもの（url は遅いURLの記録用）
+        """
+        inner = self.executor.submit(timed_call, fn, *args)
+        outer: Future = Future()
+
+        def done(f: Future) -> None:
+            try:
+                if f.cancelled():
+                    outer.cancel()
+                elif f.exception() is not None:
+                    outer.set_exception(f.exception())
+                else:
+                    result, timings = f.result()
+                    METRICS.observe_all(timings, url)
+                    outer.set_result(result)
+            except InvalidStateError:
+                pass  # 呼び出し側で先にキャンセル済み
+
+        def cancelled(f: Future) -> None:
+            if f.cancelled():
+                inner.cancel()
+
+        outer.add_done_callback(cancelled)
+        inner.add_done_callback(done)
+        return outer
+
+    async def run(self, fn: Callable, *args, url: Optional[str] = None):
+        """イベントループを止めずに解析を実行する（AsyncFetcher と組み合わせる用）"""
+        return await asyncio.wrap_future(self.submit(fn, *args, url=url))
+
+    def map_results(
+        self,
+        results: Iterable[FetchResult],
+        parse: Callable,
+        decode: bool = True,
+        final_url: bool = False,
+        window: Optional[int] = None,
+    ) -> Iterator[Tuple[FetchResult, Optional[Future]]]:
+        """
+        取得結果を受け取ったそばから解析ステージへ回し、解析が終わった順に
+        (取得結果, 解析の Future) を返す。取得に失敗した結果は Future=None ですぐ返す。
+        decode=True なら parse(url, html)、False なら parse(url, body, encoding) で呼ぶ。
+        url は要求したURL（final_url=True ならリダイレクト後のURL）。
+        解析待ちは window 件まで（既定はワーカー数の4倍）で、超えたら取得側を待たせる。
+        """
+        window = window or self.workers * 4
+        call = decode_and_call if decode else call_with_bytes
+        pending: Set[Future] = set()
+        owner = {}
+
+        def finished(block: bool) -> Iterator[Tuple[FetchResult, Future]]:
+            if not pending:
+                return
+            done, _ = concurrent.futures.wait(
+                pending,
+                timeout=None if block else 0,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for fut in done:
+                pending.discard(fut)
+                yield owner.pop(fut), fut
+
+        try:
+            for res in results:
+                if not res.ok:
+                    yield res, None
+                    continue
+                # 文字コード判定（ホストごとの学習を含む）は取得側のプロセスで済ませる
+                url = res.final_url if final_url else res.url
+                fut = self.submit(call, parse, url, res.body, res.encoding, url=url)
+                pending.add(fut)
+                owner[fut] = res
+                yield from finished(block=len(pending) >= window)
+            while pending:
+                yield from finished(block=True)
+        finally:
+            for fut in pending:
+                fut.cancel()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+ホスト単位のトークンバケット式レート制限
+- rate: 1秒あたりに補充されるトークン数（= 許容リクエスト/秒）
+- burst: バケット容量（連続で即時に出せるリクエスト数）
+- 予約方式: 取得時に待ち時間を計算してトークンを先取りするので、
+  スレッド / コルーチンが同時に呼んでも合計レートは rate を超えない
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate は正の値を指定してください")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        トークンを1つ予約し、使えるようになるまでの待ち秒数を返す。
+        トークンが足りない場合は残量をマイナスにして後続の待ち時間に反映する。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """
+    ホストごとに TokenBucket を持つレート制限器。
+    default_rate が None のホストは制限しない。
+    """
+
+    def __init__(
+        self,
+        default_rate: Optional[float] = None,
+        default_burst: int = 1,
+        per_host: Optional[Dict[str, Tuple[float, int]]] = None,
+    ):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self._limits: Dict[str, Tuple[float, int]] = dict(per_host or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def set_rate(self, host: str, rate: float, burst: int = 1) -> None:
+        with self._lock:
+            self._limits[host] = (rate, burst)
+            self._buckets.pop(host, None)
+
+    def bucket(self, host: str) -> Optional[TokenBucket]:
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is not None:
+                return b
+            rate, burst = self._limits.get(
+                host, (self.default_rate, self.default_burst)
+            )
+            if rate is None:
+                return None
+            b = TokenBucket(rate, burst)
+            self._buckets[host] = b
+            return b
+
+    def reserve(self, url: str) -> float:
+        b = self.bucket(urlsplit(url).hostname or "")
+        return b.reserve() if b else 0.0
+
+    def acquire(self, url: str) -> None:
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str) -> None:
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
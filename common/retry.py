@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+取得失敗の再試行スケジュールとホスト単位のサーキットブレーカー
+- 待ち時間は Retry-After（秒数 / HTTP日付）があればそれ、無ければジッター付き指数バックオフ
+    base × 2^試行回数 の半分〜全部のあいだでランダム（同時に失敗したURLが同時に戻ってこない）
+- RetryQueue: 再試行待ちのURLを期限まで寝かせておく。ワーカーは待たずに次のURLへ進み、
+  期限が来たURLは作業キューへ戻る（待機中のURLはワーカーも同時数の枠も占有しない）。
+  寝かせている件数が backlog に達したら、新しいURLを流す側（ワーカーではない）が待つ
+- CircuitBreaker: ホストごとに連続 threshold 回失敗したら cooldown 秒そのホストへの送信を止める。
+  再開後の最初の失敗でまた止め、止める時間は倍々（max_cooldown まで）。成功で元に戻る。
+  fail_fast_after 回続けて止めたホストは落ちているとみなし、止めている間のURLは待たせずに
+  失敗として返す（止めるたびに1件だけ試し、成功すれば元に戻る）。
+  429 / 503 の Retry-After はそのホスト全体の一時停止としても扱う
+
+使い方（ワーカー方式）:
+  retry = RetryQueue(backlog=workers * BACKLOG_PER_WORKER)
+  feeder = asyncio.create_task(retry.feed(queue))
+  ... 入力側: await retry.wait_room(); await queue.put(url)
+  ... ワーカー: res = await fetcher.fetch_or_defer(url, retry)  # None なら後で再試行
+  await retry.drain(queue)  # 入力を流し終えた後、再試行待ちも含めて全部終わるまで待つ
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import sys
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from common.metrics import METRICS
+
+# 寝かせておくURLの上限（同時数あたり）。超えたら新しいURLは流さずに待つ
+BACKLOG_PER_WORKER = 4
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After ヘッダを秒数にする（解釈できなければ None）"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def retry_delay(
+    attempt: int, backoff: float, max_delay: float, retry_after: Optional[str] = None
+) -> float:
+    """attempt 回目（0始まり）の失敗の後、次の試行まで待つ秒数"""
+    delay = parse_retry_after(retry_after)
+    if delay is not None:
+        return min(delay, max_delay)
+    base = min(max_delay, backoff * 2 ** attempt)
+    return random.uniform(base / 2, base)
+
+
+class CircuitBreaker:
+    """ホストごとの送信停止（イベントループ内でのみ使う）"""
+
+    def __init__(
+        self,
+        threshold: int = 5,
+        cooldown: float = 10.0,
+        max_cooldown: float = 300.0,
+        fail_fast_after: int = 3,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.fail_fast_after = fail_fast_after
+        self._failures: Dict[str, int] = {}
+        self._trips: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+
+    def wait_time(self, host: str) -> float:
+        """送信を再開できるまでの秒数（0 なら送ってよい）"""
+        until = self._open_until.get(host)
+        if until is None:
+            return 0.0
+        return max(0.0, until - time.monotonic())
+
+    def fail_fast(self, host: str) -> bool:
+        """止めている最中で、待たせずに失敗として返すべきか"""
+        return (
+            self._trips.get(host, 0) >= self.fail_fast_after and self.wait_time(host) > 0
+        )
+
+    def pause(self, host: str, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        if until > self._open_until.get(host, 0.0):
+            self._open_until[host] = until
+
+    def record(self, host: str, ok: bool) -> None:
+        if ok:
+            self._failures.pop(host, None)
+            self._trips.pop(host, None)
+            return
+        # 止めている間に返ってきた（止める前に送った）分の失敗は数えない
+        if self.wait_time(host) > 0:
+            return
+        failures = self._failures.get(host, 0) + 1
+        if failures < self.threshold:
+            self._failures[host] = failures
+            return
+        trips = self._trips.get(host, 0) + 1
+        self._trips[host] = trips
+        seconds = min(self.max_cooldown, self.cooldown * 2 ** (trips - 1))
+        self.pause(host, seconds)
+        # 再開後は1回の失敗でまた止める（半開）
+        self._failures[host] = self.threshold - 1
+        METRICS.count(host, "breaker_open")
+        print(f"[WARN] {host}: 失敗が続いたため {seconds:.1f} 秒送信を止めます", file=sys.stderr)
+
+
+class RetryQueue:
+    """
+    再試行待ちのURLを期限順に持つ。URLごとの試行回数もここで数える。
+    backlog を超えて寝かせている間、wait_room() は空きができるまで待つ
+    （ワーカーが呼ぶと作業キューへ戻せなくなるので、呼ぶのは入力側だけ）
+    """
+
+    def __init__(self, backlog: int = 0):
+        self.backlog = backlog
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._attempts: Dict[str, int] = {}
+        self._changed = asyncio.Event()
+        self._in_transit = 0  # 取り出し済みで作業キューへ入れている途中の件数
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def attempt(self, url: str) -> int:
+        return self._attempts.get(url, 0)
+
+    def defer(self, url: str, delay: float, count: bool = True) -> None:
+        """url を delay 秒後に再試行する。count=False は送らずに延期した場合（試行回数に含めない）"""
+        if count:
+            self._attempts[url] = self._attempts.get(url, 0) + 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), url))
+        self._changed.set()
+
+    def forget(self, url: str) -> None:
+        self._attempts.pop(url, None)
+
+    def next_delay(self) -> Optional[float]:
+        """次の期限までの秒数（寝かせているURLが無ければ None）"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def pop_due(self, limit: int) -> List[str]:
+        """期限の来たURLを最大 limit 件取り出す"""
+        now = time.monotonic()
+        due: List[str] = []
+        while self._heap and len(due) < limit and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        if due:
+            self._changed.set()
+        return due
+
+    def has_room(self) -> bool:
+        return self.backlog <= 0 or len(self._heap) < self.backlog
+
+    async def _wait_changed(self, timeout: Optional[float]) -> None:
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_room(self) -> None:
+        while not self.has_room():
+            await self._wait_changed(self.next_delay())
+
+    async def feed(self, queue: asyncio.Queue) -> None:
+        """期限の来たURLを作業キューへ戻し続ける（タスクとして動かし、終わったらキャンセルする）"""
+        while True:
+            due = self.pop_due(len(self._heap))
+            self._in_transit = len(due)
+            for url in due:
+                await queue.put(url)
+                self._in_transit -= 1
+            if due:
+                self._changed.set()
+            await self._wait_changed(self.next_delay())
+
+    async def drain(self, queue: asyncio.Queue) -> None:
+        """作業キューが空になり、再試行待ちも残っていない状態まで待つ"""
+        while True:
+            await queue.join()
+            if not self._heap and not self._in_transit:
+                return
+            await self._wait_changed(None)
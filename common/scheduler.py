@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+複数サイトを1プロセスで同時に回すスケジューラ
+- 各サイトは SiteAdapter（URLの供給元 + 抽出器 + 出力先）として登録する
+- 取得の同時数は全サイト共通の FetchBudget（全体の上限 + ホストごとの上限）で抑え、
+  ホストの違うサイト同士は並行して進む（adaptive を渡すとホストごとの上限は AIMD で自動調整）
+- 解析は全サイトで1つの ParsePool を共有する
+- サイトごとにジャーナル・CSVを持ち、--resume と「最後に失敗分だけ再試行」は単体実行と同じ
+- 取得の再試行は RetryQueue に預け、待っている間もワーカーはほかのURLを処理する
+
+使い方:
+  adapters = [dairitenhonpo.make_adapter(...), repre.make_adapter(...)]
+  summary = asyncio.run(run_sites(adapters, total=64, per_host=8))
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+)
+
+from common.csv_sink import CsvSink
+from common.adaptive import AimdConfig
+from common.fetcher import AsyncFetcher, FetchBudget, FetchConfig
+from common.journal import RunJournal
+from common.parse_pool import ParsePool, call_with_bytes, decode_and_call
+from common.retry import BACKLOG_PER_WORKER, RetryQueue
+
+Record = Dict[str, Any]
+
+
+@dataclass
+class SiteAdapter:
+    name: str
+    fetch_config: FetchConfig
+    # URLの供給元。取得を伴う（一覧ページを辿るなど）場合のためにフェッチャーを受け取る
+    urls: Callable[[AsyncFetcher], AsyncIterator[str]]
+    # 解析関数（ParsePool に渡すのでモジュール直下の関数）。parse(url, html) の形
+    parse: Callable
+    # 解析結果 -> 出力するレコード群（メインプロセス側で呼ぶ）
+    to_records: Callable[[Any], List[Record]]
+    open_sink: Callable[[], CsvSink]
+    journal_path: str
+    decode: bool = True  # False なら parse(url, body, encoding)
+    final_url: bool = False  # parse に渡すURLをリダイレクト後のものにする
+    workers: int = 0  # サイト内の同時処理数（0 なら fetch_config.concurrency）
+    # 再試行後の後処理（失敗分をエラー行として残すなど）
+    finish: Optional[Callable[[RunJournal, CsvSink], None]] = None
+    # 全URLの処理が終わった後の確定処理（サイトマップの差分状態の保存など）。途中で止まったら呼ばない
+    commit: Optional[Callable[[RunJournal], None]] = None
+
+
+async def from_list(urls: Iterable[str]) -> AsyncIterator[str]:
+    """URLのリストを SiteAdapter.urls の形にする"""
+    for u in urls:
+        yield u
+
+
+def list_source(urls: Iterable[str]) -> Callable[[AsyncFetcher], AsyncIterator[str]]:
+    return lambda fetcher: from_list(urls)
+
+
+@dataclass
+class SiteSummary:
+    name: str
+    ok: int = 0
+    failed: int = 0
+    rows: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+async def _process(
+    adapter: SiteAdapter,
+    fetcher: AsyncFetcher,
+    pool: ParsePool,
+    url: str,
+    journal: RunJournal,
+    sink: CsvSink,
+    retry: RetryQueue,
+) -> None:
+    res = await fetcher.fetch_or_defer(url, retry)
+    if res is None:
+        return  # 再試行待ち（期限が来たら作業キューへ戻る）
+    if not res.ok:
+        journal.record_failure(url, res.error or "fetch failed")
+        return
+    call = decode_and_call if adapter.decode else call_with_bytes
+    target = res.final_url if adapter.final_url else res.url
+    try:
+        result = await pool.run(
+            call, adapter.parse, target, res.body, res.encoding, url=target
+        )
+        records = adapter.to_records(result)
+    except Exception as e:
+        journal.record_failure(url, str(e))
+        return
+    journal.record_ok(url, records)
+    for r in records:
+        sink.write(r)
+
+
+async def _run_pass(
+    adapter: SiteAdapter,
+    fetcher: AsyncFetcher,
+    pool: ParsePool,
+    urls: AsyncIterator[str],
+    journal: RunJournal,
+    sink: CsvSink,
+) -> None:
+    workers = adapter.workers or adapter.fetch_config.concurrency
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    retry = RetryQueue(backlog=workers * BACKLOG_PER_WORKER)
+    # 処理中のURL（最大 workers 件）。入力の重複は完了済みならジャーナルで、処理中ならここで飛ばす
+    active: Set[str] = set()
+
+    async def worker() -> None:
+        while True:
+            url = await queue.get()
+            try:
+                if url is None:
+                    return
+                # 再開時・入力の重複は完了済みを飛ばす
+                if journal.is_done(url) or url in active:
+                    continue
+                active.add(url)
+                try:
+                    await _process(adapter, fetcher, pool, url, journal, sink, retry)
+                finally:
+                    active.discard(url)
+            finally:
+                queue.task_done()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    feeder = asyncio.create_task(retry.feed(queue))
+    try:
+        async for url in urls:
+            # 再試行待ちが溜まっている間は新しいURLを流さない
+            await retry.wait_room()
+            await queue.put(url)
+        await retry.drain(queue)
+    finally:
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+        feeder.cancel()
+
+
+async def run_site(
+    adapter: SiteAdapter, budget: FetchBudget, pool: ParsePool, resume: bool = False
+) -> SiteSummary:
+    summary = SiteSummary(adapter.name)
+    start = time.perf_counter()
+    with RunJournal(adapter.journal_path, resume=resume) as journal, adapter.open_sink() as sink:
+        # 前回までの完了分を出力に書き戻す
+        if resume:
+            for r in journal.iter_records():
+                sink.write(r)
+        async with AsyncFetcher(adapter.fetch_config, budget) as fetcher:
+            await _run_pass(adapter, fetcher, pool, adapter.urls(fetcher), journal, sink)
+            # 失敗分だけ再試行
+            retry_urls = journal.failed_urls()
+            if retry_urls:
+                print(f"[INFO] {adapter.name}: 失敗分を再試行 {len(retry_urls)} 件")
+                await _run_pass(adapter, fetcher, pool, from_list(retry_urls), journal, sink)
+        counts = journal.counts()
+        summary.ok, summary.failed = counts["ok"], counts["failed"]
+        if adapter.finish is not None:
+            adapter.finish(journal, sink)
+        if adapter.commit is not None:
+            adapter.commit(journal)
+    summary.rows = sink.count
+    summary.elapsed = time.perf_counter() - start
+    return summary
+
+
+async def run_sites(
+    adapters: List[SiteAdapter],
+    total: int,
+    per_host: int = 0,
+    resume: bool = False,
+    pool: Optional[ParsePool] = None,
+    adaptive: Optional[AimdConfig] = None,
+) -> List[SiteSummary]:
+    """
+    全サイトを同時に実行する。1サイトが例外で止まってもほかのサイトは続ける。
+    adaptive を渡すとホストごとの同時数は per_host ではなく adaptive.max_limit までの自動調整
+    """
+    budget = FetchBudget(total, per_host, adaptive)
+    own_pool = pool is None
+    pool = pool or ParsePool()
+    try:
+        results = await asyncio.gather(
+            *(run_site(a, budget, pool, resume) for a in adapters),
+            return_exceptions=True,
+        )
+    finally:
+        if own_pool:
+            pool.close()
+    for host, limit in sorted(budget.limits().items()):
+        print(f"[INFO] {host}: 終了時の同時数の上限 {limit}")
+    summaries: List[SiteSummary] = []
+    for a, r in zip(adapters, results):
+        if isinstance(r, BaseException):
+            summaries.append(SiteSummary(a.name, error=f"{type(r).__name__}: {r}"))
+        else:
+            summaries.append(r)
+    return summaries
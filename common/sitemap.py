@@ -0,0 +1,540 @@
+# -*- coding: utf-8 -*-
+"""
+サイトマップからのURL収集（ストリーミング・並列）
+- robots.txt の Sitemap: 行（無ければ既定の場所）を起点に、サイトマップインデックスの
+  子サイトマップを並列に取得する
+- 本文は受信したそばから解析する（gzip も逐次展開）。ファイル全体やURL一覧をメモリに持たない
+- 見つけたページURLは上限付きキュー経由で順次返すので、出力CSVやスクレイパーのキューへ
+  そのまま流せる（受け手が遅ければ取得側が待つ）
+- <lastmod> があれば SitemapEntry.lastmod に入れる
+- 差分収集: 前回の {URL: lastmod} を状態ファイル（SitemapState）に残し、
+  新規・lastmod が変わったURLだけを返す。前回あって今回ないURLは削除分として別に出力する
+  （lastmod の無いURLは変化を判定できないので毎回返す）
+- 状態はスクレイプが最後まで終わってから保存し、返したURLのうちジャーナルで成功したものだけ
+  新しい lastmod にする（失敗・未処理のURLは次回も新規・変更として返る）
+    スクレイパーへ直接流す場合（sitemap_source）: SitemapSource.commit を SiteAdapter.commit に渡す
+    CSVへ書き出す場合（save_sitemap_urls）: 保存候補を <状態ファイル>.pending に書き、
+      スクレイパーの実行後に commit_pending_state(状態ファイル, ジャーナル) で確定する
+
+使い方:
+  save_sitemap_urls("https://example.com/", "all_urls.csv")   # 同期・CSV出力（全件）
+  save_sitemap_urls("https://example.com/", "changed_urls.csv", state_path="sitemap_state.jsonl",
+                    removed_csv="removed_urls.csv")           # 差分のみ（状態は保留）
+  commit_pending_state("sitemap_state.jsonl", journal)         # スクレイプ後に確定
+  save_sitemap_urls("https://example.com/", "urls.csv", keep=UrlRules(include=[r"/detail/"]))
+  async for entry in iter_homepage_urls(fetcher, "https://example.com/"):
+      ...
+"""
+
+import asyncio
+import csv
+import json
+import os
+import sys
+import zlib
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Set
+from urllib.parse import urljoin
+from xml.etree import ElementTree as ET
+
+import aiohttp
+
+from common.fetcher import AsyncFetcher, FetchConfig
+from common.journal import RunJournal
+
+DEFAULT_SITEMAP_PATHS = ["/sitemap.xml", "/sitemap_index.xml", "/sitemap.xml.gz"]
+SITEMAP_PARALLEL = 8  # 同時に読むサイトマップ数
+PENDING_SUFFIX = ".pending"  # 確定前の状態ファイルの接尾辞
+SITEMAP_QUEUE_SIZE = 1000  # 返却待ちURLの上限（受け手が遅いときはここで止まる）
+CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class SitemapError(Exception):
+    pass
+
+
+@dataclass
+class SitemapEntry:
+    loc: str
+    lastmod: Optional[str] = None
+    is_sitemap: bool = False  # True ならサイトマップインデックス内の子サイトマップ
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+class SitemapParser:
+    """
+    サイトマップ本文をチャンクごとに feed し、<url> / <sitemap> を読み終えた順に返す。
+    gzip（先頭のマジックで判定）と、URLを1行ずつ並べたテキスト形式にも対応
+    """
+
+    def __init__(self):
+        self._inflate = None
+        self._checked_gzip = False
+        self._mode: Optional[str] = None  # "xml" / "text"
+        self._xml = ET.XMLPullParser(events=("start", "end"))
+        self._root: Optional[ET.Element] = None
+        self._rest = b""  # テキスト形式の行の途中
+
+    def feed(self, data: bytes) -> List[SitemapEntry]:
+        if not self._checked_gzip:
+            self._checked_gzip = True
+            if data[:2] == GZIP_MAGIC:
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._inflate is not None:
+            data = self._inflate.decompress(data)
+        return self._feed_plain(data)
+
+    def close(self) -> List[SitemapEntry]:
+        out: List[SitemapEntry] = []
+        if self._inflate is not None:
+            out.extend(self._feed_plain(self._inflate.flush()))
+        if self._mode == "xml":
+            self._xml.close()
+            out.extend(self._read_events())
+        elif self._mode == "text" and self._rest:
+            out.extend(self._text_lines([self._rest]))
+            self._rest = b""
+        return out
+
+    def _feed_plain(self, data: bytes) -> List[SitemapEntry]:
+        if not data:
+            return []
+        if self._mode is None:
+            head = data.lstrip(b"\xef\xbb\xbf \t\r\n")
+            if not head:
+                return []
+            self._mode = "xml" if head.startswith(b"<") else "text"
+        if self._mode == "text":
+            lines = (self._rest + data).split(b"\n")
+            self._rest = lines.pop()
+            return self._text_lines(lines)
+        self._xml.feed(data)
+        return self._read_events()
+
+    def _read_events(self) -> List[SitemapEntry]:
+        out: List[SitemapEntry] = []
+        for event, el in self._xml.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = el
+                continue
+            tag = _local(el.tag)
+            if tag not in ("url", "sitemap"):
+                continue
+            loc = lastmod = None
+            for child in el:
+                name = _local(child.tag)
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = (child.text or "").strip() or None
+            if loc:
+                out.append(SitemapEntry(loc, lastmod, tag == "sitemap"))
+            # 読み終えた要素を捨てて、メモリを件数に依存させない
+            if self._root is not None:
+                self._root.clear()
+        return out
+
+    @staticmethod
+    def _text_lines(lines: Iterable[bytes]) -> List[SitemapEntry]:
+        out: List[SitemapEntry] = []
+        for line in lines:
+            url = line.decode("utf-8", errors="replace").strip()
+            if url.startswith("http"):
+                out.append(SitemapEntry(url))
+        return out
+
+
+class SitemapState:
+    """
+    前回収集したサイトマップの {URL: lastmod}（JSONL）。
+    is_changed() で新規・変更を判定しながら今回分を記録し、save() で書き戻す
+    （すぐに確定できない場合は save_pending() で保留し、commit_pending_state() で確定する）。
+    complete は読み終えたときに入る（None なら未完了、False なら読めなかったサイトマップあり）
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._prev: Dict[str, Optional[str]] = {}
+        self._cur: Dict[str, Optional[str]] = {}
+        self._emitted: Set[str] = set()  # 新規・変更として返したURL
+        self.complete: Optional[bool] = None
+        self.new = self.changed = self.unchanged = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 書きかけの行
+                    self._prev[entry["url"]] = entry.get("lastmod")
+
+    def is_changed(self, entry: SitemapEntry) -> bool:
+        url = entry.loc
+        if url in self._cur:
+            return False  # 同じURLが複数のサイトマップに載っている
+        self._cur[url] = entry.lastmod
+        if url not in self._prev:
+            self.new += 1
+            return True
+        prev = self._prev[url]
+        if entry.lastmod is None or prev is None or entry.lastmod != prev:
+            self.changed += 1
+            return True
+        self.unchanged += 1
+        return False
+
+    def emitted(self, url: str) -> None:
+        """is_changed() が True で実際に返したURLを記録する（save の done で確認する対象）"""
+        self._emitted.add(url)
+
+    def removed(self) -> List[str]:
+        return [u for u in self._prev if u not in self._cur]
+
+    def save(self, complete: bool = True, done: Optional[Callable[[str], bool]] = None) -> None:
+        """
+        今回分を書き戻す。complete=False（読めなかったサイトマップがある）場合は
+        今回見つからなかったURLも削除扱いにせず前回の値のまま残す。
+        done を渡すと、返したURLのうち done(url) が偽のものは前回の値に戻す
+        （前回なければ記録しない）ので、次回も新規・変更として返る
+        """
+        state = dict(self._cur)
+        if done is not None:
+            for url in self._emitted:
+                if done(url):
+                    continue
+                if url in self._prev:
+                    state[url] = self._prev[url]
+                else:
+                    del state[url]
+        if not complete:
+            for url, lastmod in self._prev.items():
+                state.setdefault(url, lastmod)
+        _write_jsonl(
+            self.path, ({"url": url, "lastmod": lastmod} for url, lastmod in state.items())
+        )
+
+    def save_pending(self, complete: bool = True) -> None:
+        """
+        保存候補を <path>.pending に書く（状態ファイル自体は変えない）。
+        返したURLには前回の値を添えておき、commit_pending_state() で成功しなかった分を戻す
+        """
+        state = dict(self._cur)
+        if not complete:
+            for url, lastmod in self._prev.items():
+                state.setdefault(url, lastmod)
+
+        def rows() -> Iterator[dict]:
+            for url, lastmod in state.items():
+                row = {"url": url, "lastmod": lastmod}
+                if url in self._emitted:
+                    row["emitted"] = True
+                    if url in self._prev:
+                        row["prev"] = self._prev[url]
+                yield row
+
+        _write_jsonl(self.path + PENDING_SUFFIX, rows())
+
+    def summary(self) -> str:
+        return f"新規 {self.new} / 変更 {self.changed} / 変更なし {self.unchanged}"
+
+
+def _write_jsonl(path: str, rows: Iterable[dict]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+def commit_pending_state(path: str, journal: RunJournal) -> bool:
+    """
+    save_pending() で保留した状態を確定する（スクレイパーの実行が最後まで終わってから呼ぶ）。
+    返したURLのうちジャーナルで成功していないものは前回の値に戻す（前回なければ記録しない）。
+    保留分が無ければ何もせず False
+    """
+    pending = path + PENDING_SUFFIX
+    if not os.path.exists(pending):
+        return False
+
+    def rows() -> Iterator[dict]:
+        with open(pending, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                url = row["url"]
+                if row.get("emitted") and not journal.is_done(url):
+                    if "prev" not in row:
+                        continue
+                    row["lastmod"] = row["prev"]
+                yield {"url": url, "lastmod": row["lastmod"]}
+
+    _write_jsonl(path, rows())
+    os.remove(pending)
+    return True
+
+
+def write_url_csv(path: str, urls: Iterable[str]) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["url"])
+        for url in urls:
+            writer.writerow([url])
+            count += 1
+    return count
+
+
+async def read_sitemap(fetcher: AsyncFetcher, url: str) -> AsyncIterator[SitemapEntry]:
+    """サイトマップ1本を受信しながら解析して返す"""
+    async with fetcher.stream(url) as resp:
+        if resp.status != 200:
+            raise SitemapError(f"HTTP {resp.status}")
+        parser = SitemapParser()
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            for entry in parser.feed(chunk):
+                yield entry
+        for entry in parser.close():
+            yield entry
+
+
+async def find_sitemaps(fetcher: AsyncFetcher, homepage: str) -> List[str]:
+    """
+    robots.txt の Sitemap: 行を返す。
+    無ければ既定の場所を順に試し、最初に見つかったもの
+    """
+    found: List[str] = []
+    res = await fetcher.fetch(urljoin(homepage, "/robots.txt"))
+    if res.ok:
+        for line in res.text.splitlines():
+            key, _, value = line.partition(":")
+            if key.strip().lower() == "sitemap" and value.strip():
+                found.append(urljoin(homepage, value.strip()))
+    if found:
+        return list(dict.fromkeys(found))
+    for path in DEFAULT_SITEMAP_PATHS:
+        url = urljoin(homepage, path)
+        try:
+            async with fetcher.stream(url) as resp:
+                if resp.status == 200:
+                    return [url]
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+    return []
+
+
+async def iter_sitemap_urls(
+    fetcher: AsyncFetcher,
+    roots: Iterable[str],
+    parallel: int = SITEMAP_PARALLEL,
+    failed: Optional[List[str]] = None,
+) -> AsyncIterator[SitemapEntry]:
+    """
+    roots から辿れる全サイトマップのページURLを返す。
+    子サイトマップは parallel 本まで同時に読み、見つけた順に返す（順序は保証しない）。
+    同じホストのページ取得が枠を使えるよう、parallel はホストごとの同時数の上限より小さく抑える。
+    failed を渡すと、読めなかったサイトマップのURLを追加する
+    """
+    roots = list(roots)
+    if roots:
+        host_limit = fetcher.host_limit(roots[0])
+        if host_limit > 0:
+            parallel = max(1, min(parallel, host_limit - 1))
+    out: asyncio.Queue = asyncio.Queue(maxsize=SITEMAP_QUEUE_SIZE)
+    todo: asyncio.Queue = asyncio.Queue()
+    seen: Set[str] = set()
+    done = object()
+
+    def add(url: str) -> None:
+        # インデックスが互いを参照していても同じサイトマップは1回だけ読む
+        if url not in seen:
+            seen.add(url)
+            todo.put_nowait(url)
+
+    async def worker() -> None:
+        while True:
+            url = await todo.get()
+            try:
+                async for entry in read_sitemap(fetcher, url):
+                    if entry.is_sitemap:
+                        add(urljoin(url, entry.loc))
+                    else:
+                        await out.put(entry)
+            except (
+                SitemapError,
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+                ET.ParseError,
+                zlib.error,
+            ) as e:
+                # 1本の失敗でほかのサイトマップは止めない
+                print(f"[WARN] sitemap failed: {url} ({type(e).__name__}: {e})", file=sys.stderr)
+                if failed is not None:
+                    failed.append(url)
+            finally:
+                todo.task_done()
+
+    async def supervise() -> None:
+        workers = [asyncio.create_task(worker()) for _ in range(parallel)]
+        try:
+            await todo.join()
+            await out.put(done)
+        finally:
+            for w in workers:
+                w.cancel()
+
+    for root in roots:
+        add(root)
+    task = asyncio.create_task(supervise())
+    try:
+        while True:
+            entry = await out.get()
+            if entry is done:
+                break
+            yield entry
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def iter_homepage_urls(
+    fetcher: AsyncFetcher,
+    homepage: str,
+    parallel: int = SITEMAP_PARALLEL,
+    failed: Optional[List[str]] = None,
+) -> AsyncIterator[SitemapEntry]:
+    roots = await find_sitemaps(fetcher, homepage)
+    if not roots:
+        print(f"[WARN] sitemap not found: {homepage}", file=sys.stderr)
+        if failed is not None:
+            failed.append(homepage)
+        return
+    async for entry in iter_sitemap_urls(fetcher, roots, parallel, failed):
+        yield entry
+
+
+async def iter_changed_urls(
+    fetcher: AsyncFetcher,
+    homepage: str,
+    keep: Optional[Callable[[str], bool]] = None,
+    state: Optional[SitemapState] = None,
+    removed_csv: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    サイトマップのページURLのうち keep に合うものを返す。
+    state があれば新規・変更分だけにし、最後まで読み終えたら state.complete を設定して
+    削除分（前回あって今回ないURL）を removed_csv に書く。state はここでは保存しない
+    （呼び出し側が処理を終えてから state.save(state.complete, done) などで保存する）。
+    読めなかったサイトマップがある場合は削除分を出さない（判定できないため）
+    """
+    failed: List[str] = []
+    async for entry in iter_homepage_urls(fetcher, homepage, failed=failed):
+        # 状態には keep で外れるURLも記録する（keep を変えたときに新規扱いにしない）
+        if state is not None and not state.is_changed(entry):
+            continue
+        if keep is None or keep(entry.loc):
+            if state is not None:
+                state.emitted(entry.loc)
+            yield entry.loc
+    if state is None:
+        return
+    complete = state.complete = not failed
+    removed = [u for u in state.removed() if keep is None or keep(u)] if complete else []
+    if removed_csv:
+        write_url_csv(removed_csv, removed)
+    print(
+        f"[INFO] sitemap {homepage}: {state.summary()} / 削除 {len(removed)}"
+        + ("" if complete else "（読めなかったサイトマップがあるため削除は判定せず）"),
+        file=sys.stderr,
+    )
+
+
+class SitemapSource:
+    """
+    サイトマップを SiteAdapter.urls の形にしたもの（sitemap_source で作る）。
+    状態は読み終えた時点では保存せず、サイトの実行後に commit(journal) で保存する
+    """
+
+    def __init__(
+        self,
+        homepage: str,
+        keep: Optional[Callable[[str], bool]] = None,
+        state_path: Optional[str] = None,
+        removed_csv: Optional[str] = None,
+    ):
+        self.homepage = homepage
+        self.keep = keep
+        self.state_path = state_path
+        self.removed_csv = removed_csv
+        self.state: Optional[SitemapState] = None
+
+    def __call__(self, fetcher: AsyncFetcher) -> AsyncIterator[str]:
+        self.state = SitemapState(self.state_path) if self.state_path else None
+        return iter_changed_urls(
+            fetcher, self.homepage, self.keep, self.state, self.removed_csv
+        )
+
+    def commit(self, journal: RunJournal) -> None:
+        """返したURLのうちジャーナルで成功したものだけ新しい lastmod にして状態を保存する"""
+        state = self.state
+        if state is None or state.complete is None:
+            return  # 差分収集していない / サイトマップを読み終えていない
+        state.save(state.complete, journal.is_done)
+
+
+def sitemap_source(
+    homepage: str,
+    keep: Optional[Callable[[str], bool]] = None,
+    state_path: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+) -> SitemapSource:
+    """
+    サイトマップを SiteAdapter.urls の形にする（keep で対象URLを絞る）。
+    state_path を渡すと前回から新規・変更のあったURLだけを流す。
+    状態の保存は SiteAdapter.commit に SitemapSource.commit を渡して実行後に行う
+    """
+    return SitemapSource(homepage, keep, state_path, removed_csv)
+
+
+async def write_sitemap_urls(
+    homepage: str,
+    out_csv: str,
+    keep: Optional[Callable[[str], bool]] = None,
+    state_path: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+    config: Optional[FetchConfig] = None,
+) -> int:
+    """
+    サイトマップのページURL（keep に合うもの）を1列のCSVへ書き出す。戻り値は件数。
+    state_path を渡すと新規・変更分だけを書き、状態は保留（<state_path>.pending）にする
+    """
+    state = SitemapState(state_path) if state_path else None
+    count = 0
+    async with AsyncFetcher(config or FetchConfig(concurrency=SITEMAP_PARALLEL)) as fetcher:
+        with open(out_csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["url"])
+            async for url in iter_changed_urls(fetcher, homepage, keep, state, removed_csv):
+                writer.writerow([url])
+                count += 1
+    if state is not None and state.complete is not None:
+        state.save_pending(state.complete)
+    return count
+
+
+def save_sitemap_urls(
+    homepage: str,
+    out_csv: str,
+    keep: Optional[Callable[[str], bool]] = None,
+    state_path: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+) -> int:
+    count = asyncio.run(write_sitemap_urls(homepage, out_csv, keep, state_path, removed_csv))
+    print(f"{out_csv} に {count} 件出力しました。")
+    return count
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+サイトごとの対象URLの判定（include / exclude の正規表現）
+- include のどれかに当たり、exclude のどれにも当たらないURLを対象にする（include が空なら全URL）
+- パターン群はそれぞれ1本の正規表現にまとめてコンパイルし、1URLあたり最大2回の検索で済ませる
+- サイトマップ収集中にそのまま keep として渡せる（対象外のURLは取得キューに入らない）
+
+使い方:
+  rules = UrlRules(include=[r"/detail/"], exclude=[r"\\.pdf$"])
+  rules("https://example.com/detail/1")  # -> True
+"""
+
+import re
+from typing import Iterable, Optional, Pattern
+
+
+def _compile(patterns: Iterable[str]) -> Optional[Pattern[str]]:
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+
+class UrlRules:
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = ()):
+        self._include = _compile(include)
+        self._exclude = _compile(exclude)
+
+    def __call__(self, url: str) -> bool:
+        if self._include is not None and not self._include.search(url):
+            return False
+        return self._exclude is None or not self._exclude.search(url)
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+入力URLの遅延読み込みの補助
+- 各サイトの入力CSVの読み込み関数はジェネレータにして、1行ずつ流す
+- 取得（Fetcher.iter_fetch / スケジューラのキュー）と解析（ParsePool.map_results）は
+  どちらも上限付きの窓で進み、結果はそのまま CsvSink とジャーナルへ書くので、
+  入力を遅延で流せばメモリに載るのは窓の中の分だけになる（入力の件数に依存しない）
+
+使い方:
+  urls = peek(read_urls(path))
+  if urls is None:
+      ...  # 入力が空
+  run_pass(fetcher, pool, journal.pending(urls), journal, sink)
+"""
+
+import itertools
+from typing import Iterable, Iterator, Optional
+
+
+def peek(urls: Iterable[str]) -> Optional[Iterator[str]]:
+    """空なら None、そうでなければ先頭を読んだ分も含めて同じ順で返すイテレータ"""
+    it = iter(urls)
+    for first in it:
+        return itertools.chain((first,), it)
+    return None
@@ -1,11 +1,21 @@
-from usp.tree import sitemap_tree_for_homepage
-import pandas as pd
+import sys
+from pathlib import Path
 
-tree = sitemap_tree_for_homepage('https://b-seeds.com')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.sitemap import save_sitemap_urls
+from dairitenbosyuu.scrape import SITEMAP_HOME, SITEMAP_STATE, URL_RULES
 
-urls = []
-for page in tree.all_pages():
-    urls.append(page.url)
-
-df = pd.DataFrame(urls)
-df.to_csv("all_urls.csv", index=False)
+# サイトマップを並列・逐次に読み、対象URL（URL_RULES）だけを見つけた順に urls.csv へ全件書き出す。
+# --incremental なら前回の lastmod（sitemap_state.jsonl）と比べて新規・変更分だけを
+# changed_urls.csv に書き（urls.csv はそのまま）、消えたURLは removed_urls.csv に書く。
+# 状態はここでは確定せず、scrape.py の実行後にジャーナルで成功したURLの分だけ確定する
+if "--incremental" in sys.argv[1:]:
+    save_sitemap_urls(
+        SITEMAP_HOME,
+        "changed_urls.csv",
+        keep=URL_RULES,
+        state_path=SITEMAP_STATE,
+        removed_csv="removed_urls.csv",
+    )
+else:
+    save_sitemap_urls(SITEMAP_HOME, "urls.csv", keep=URL_RULES)
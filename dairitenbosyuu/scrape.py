@@ -14,17 +14,42 @@ import datetime
 import re
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from functools import cached_property
+from typing import Dict, Iterable, Iterator, List, Optional
 
-import requests
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.adaptive import AimdConfig
+from common.csv_sink import CsvSink
+from common.fetcher import Fetcher, FetchConfig
+from common.html_parser import ParseScope, make_soup
+from common.http_cache import DEFAULT_CACHE_DIR, HttpCache
+from common.journal import RunJournal
+from common.metrics import export_metrics
+from common.parse_pool import ParsePool
+from common.scheduler import SiteAdapter, list_source
+from common.sitemap import commit_pending_state, sitemap_source
+from common.url_rules import UrlRules
+from common.url_source import peek
 
 # 設定
 INPUT_CSV = "urls.csv"
 OUTPUT_CSV = "scraped_companies.csv"
-CONCURRENCY = 10
+JOURNAL_PATH = "scraped_companies.journal.jsonl"  # 完了URLの記録（--resume で再開）
+# 同時リクエスト数は応答時間と 429/503 を見て INITIAL_CONCURRENCY から CONCURRENCY の間で自動調整する
+# （解析の並列数は ParsePool 側で別に決まる）
+INITIAL_CONCURRENCY = 10
+CONCURRENCY = 32
 REQUEST_TIMEOUT = 20
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR  # 再実行時に再取得しないためのレスポンスキャッシュ
+HTTP_CACHE_TTL_SEC = 24 * 3600
+SITEMAP_HOME = "https://b-seeds.com"  # fetch_urls.py / 一括実行でのURL収集元
+SITEMAP_STATE = "sitemap_state.jsonl"  # fetch_urls.py --incremental の前回の lastmod
+# ドメイン直下1階層のページ（https://<ホスト>/<名前>）だけを対象にする
+URL_RULES = UrlRules(include=[r"^[^/]*//[^/]*/[^/]*$"])
+# 本文全体のテキストも使うので、タグは絞らず script / style だけ除く
+PARSE_SCOPE = ParseScope()
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; CompanyScraper/1.0; +https://example.com/bot)"
 }
@@ -51,13 +76,17 @@ ADDRESS_PAT = re.compile(r"(〒?\s*\d{3}-\d{4}\s*)?([都道府県].*?(区|市|
 PHONE_PAT = re.compile(r"0\d{1,4}-\d{1,4}-\d{4}")
 EMAIL_PAT = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
 
+NAME_LABELS = ["募集企業", "企業名", "会社名", "運営会社", "事業者名"]
+NAME_LABEL_PATS = [re.compile(label) for label in NAME_LABELS]
+HEADING_NAME_PAT = re.compile(r"(募集企業|企業名|会社名)\s*[:：]\s*(.+)")
+
 
-def read_urls(path: str) -> List[str]:
-    urls: List[str] = []
+def read_urls(path: str) -> Iterator[str]:
+    """入力CSVの1列目のURLを1行ずつ返す（全体をメモリに読み込まない）"""
     p = Path(path)
     if not p.exists():
         print(f"入力CSVが見つかりません: {path}", file=sys.stderr)
-        return urls
+        return
     with p.open("r", newline="", encoding="utf-8") as f:
         reader = csv.reader(f)
         for row in reader:
@@ -65,22 +94,23 @@ def read_urls(path: str) -> List[str]:
                 continue
             url = row[0].strip()
             if url and url.startswith(("http://", "https://")):
-                urls.append(url)
-    return urls
-
-
-def fetch(url: str) -> Optional[str]:
-    try:
-        resp = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        # 一部サイトで日本語文字化け防止
-        if resp.encoding is None or resp.encoding == "ISO-8859-1":
-            resp.encoding = resp.apparent_encoding
-        if resp.status_code == 200:
-            return resp.text
-        else:
-            return None
-    except requests.RequestException:
-        return None
+                yield url
+
+
+def fetch_config() -> FetchConfig:
+    # 取得失敗（非200・通信エラー）はリトライせず None 扱い
+    return FetchConfig(
+        concurrency=CONCURRENCY,
+        adaptive=AimdConfig(initial=INITIAL_CONCURRENCY, max_limit=CONCURRENCY),
+        timeout=REQUEST_TIMEOUT,
+        retries=0,
+        headers=HEADERS,
+        cache=HttpCache(HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL_SEC),
+    )
+
+
+def build_fetcher() -> Fetcher:
+    return Fetcher(fetch_config())
 
 
 def textnorm(s: str) -> str:
@@ -106,14 +136,66 @@ def extract_table_kv(soup: BeautifulSoup) -> Dict[str, str]:
     return kv
 
 
-def guess_name_from_headings(soup: BeautifulSoup) -> Optional[str]:
+class PageDoc:
+    """
+    1ページ分の解析結果。テーブルKV・見出し・ブロック要素のテキスト・全文は
+    最初に必要になったときに1回だけ作り、各抽出器で共有する。
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self.soup = soup
+        self._blocks: List[str] = []
+        self._block_nodes: Optional[Iterator] = None
+
+    @cached_property
+    def kv(self) -> Dict[str, str]:
+        return extract_table_kv(self.soup)
+
+    @cached_property
+    def headings(self) -> List[str]:
+        """h1 → h2 → h3 の順に見出しテキスト"""
+        return [
+            textnorm(h.get_text(" ", strip=True))
+            for tag in ["h1", "h2", "h3"]
+            for h in self.soup.find_all(tag)
+        ]
+
+    @cached_property
+    def full_text(self) -> str:
+        return textnorm(self.soup.get_text(" ", strip=True))
+
+    def block_texts(self) -> Iterator[str]:
+        """
+        p → li → div の順に空でないテキストを返す。
+        呼び出し側が途中でやめれば、それ以降の要素のテキストは作らない
+        """
+        if self._block_nodes is None:
+            self._block_nodes = (
+                node for sel in ["p", "li", "div"] for node in self.soup.find_all(sel)
+            )
+        i = 0
+        while True:
+            if i < len(self._blocks):
+                yield self._blocks[i]
+                i += 1
+                continue
+            node = next(self._block_nodes, None)
+            if node is None:
+                return
+            t = textnorm(node.get_text(" ", strip=True))
+            if t:
+                self._blocks.append(t)
+
+
+def guess_name_from_headings(doc: PageDoc) -> Optional[str]:
     """
     ページの見出しから名称（会社名や募集企業名）を推定。
     """
+    soup = doc.soup
     # 明示的な「募集企業」「企業名」など
     candidates = []
-    for label in ["募集企業", "企業名", "会社名", "運営会社", "事業者名"]:
-        node = soup.find(string=re.compile(label))
+    for label_pat in NAME_LABEL_PATS:
+        node = soup.find(string=label_pat)
         if node:
             # 近傍のテキストを拾ってみる
             txt = textnorm(node)
@@ -123,19 +205,17 @@ def guess_name_from_headings(soup: BeautifulSoup) -> Optional[str]:
                     candidates.append(part)
 
     # h1/h2/h3から推定（「募集企業：SMBC GMO PAYMENT株式会社」などのパターン）
-    for tag in ["h1", "h2", "h3"]:
-        for h in soup.find_all(tag):
-            t = textnorm(h.get_text(" ", strip=True))
-            # 「募集企業：XXX」「企業名：XXX」
-            m = re.search(r"(募集企業|企業名|会社名)\s*[:：]\s*(.+)", t)
-            if m:
-                candidates.append(textnorm(m.group(2)))
-            # 括弧内やタイトルに社名が含まれる場合
-            if "株式会社" in t or "有限会社" in t:
-                candidates.append(t)
+    for t in doc.headings:
+        # 「募集企業：XXX」「企業名：XXX」
+        m = HEADING_NAME_PAT.search(t)
+        if m:
+            candidates.append(textnorm(m.group(2)))
+        # 括弧内やタイトルに社名が含まれる場合
+        if "株式会社" in t or "有限会社" in t:
+            candidates.append(t)
 
     # テーブルKVに「募集企業」「企業名」があれば優先
-    kv = extract_table_kv(soup)
+    kv = doc.kv
     for key in ["募集企業", "企業名", "会社名"]:
         if key in kv and kv[key]:
             candidates.insert(0, kv[key])
@@ -155,26 +235,19 @@ def guess_name_from_headings(soup: BeautifulSoup) -> Optional[str]:
     return unique[0] if unique else None
 
 
-def extract_address(soup: BeautifulSoup, kv: Dict[str, str]) -> Optional[str]:
+def extract_address(doc: PageDoc) -> Optional[str]:
     """
     住所を抽出。テーブルKVの「所在地」「住所」があればそのまま。
     無ければ本文から郵便番号+都道府県などのパターンを検出。
     """
+    kv = doc.kv
     for key in ["所在地", "住所"]:
         if key in kv and kv[key]:
             return kv[key]
 
     # 本文から探索
-    # 代表的な住所が書かれやすい要素を優先
-    text_blobs: List[str] = []
-    for sel in ["p", "li", "div"]:
-        for node in soup.find_all(sel):
-            t = textnorm(node.get_text(" ", strip=True))
-            if t:
-                text_blobs.append(t)
-
-    # 住所正規表現で最初にマッチしたものを返す
-    for t in text_blobs:
+    # 代表的な住所が書かれやすい要素（p → li → div）の順に、最初にマッチしたものを返す
+    for t in doc.block_texts():
         m = ADDRESS_PAT.search(t)
         if m:
             addr = textnorm(m.group(0))
@@ -183,10 +256,11 @@ def extract_address(soup: BeautifulSoup, kv: Dict[str, str]) -> Optional[str]:
     return None
 
 
-def extract_extras(soup: BeautifulSoup, kv: Dict[str, str]) -> Dict[str, str]:
+def extract_extras(doc: PageDoc) -> Dict[str, str]:
     """
     任意カラムを抽出（代表者・設立・資本金・事業内容・電話番号・メールなど）
     """
+    kv = doc.kv
     out: Dict[str, str] = {}
 
     # テーブル優先
@@ -195,17 +269,15 @@ def extract_extras(soup: BeautifulSoup, kv: Dict[str, str]) -> Dict[str, str]:
             out[key] = kv[key]
 
     # 本文から補完
-    whole_text = textnorm(soup.get_text(" ", strip=True))
-
     # 電話番号
     if "電話番号" not in out:
-        m = PHONE_PAT.search(whole_text)
+        m = PHONE_PAT.search(doc.full_text)
         if m:
             out["電話番号"] = m.group(0)
 
     # メール
     if "メール" not in out:
-        m = EMAIL_PAT.search(whole_text)
+        m = EMAIL_PAT.search(doc.full_text)
         if m:
             out["メール"] = m.group(0)
 
@@ -216,20 +288,19 @@ def parse_page(url: str, html: str) -> Optional[Dict[str, str]]:
     """
     単一ページからレコードを生成。名称が取れない場合は None を返す。
     """
-    soup = BeautifulSoup(html, "html.parser")
-
-    kv = extract_table_kv(soup)
-    name = guess_name_from_headings(soup)
+    doc = PageDoc(make_soup(html, scope=PARSE_SCOPE))
+    kv = doc.kv
+    name = guess_name_from_headings(doc)
 
     # 名称が取れない場合は出力しない
     if not name:
         return None
 
     # 住所の抽出
-    addr = extract_address(soup, kv)
+    addr = extract_address(doc)
 
     # 任意項目
-    extras = extract_extras(soup, kv)
+    extras = extract_extras(doc)
 
     # 必須レコード
     record: Dict[str, str] = {
@@ -252,63 +323,102 @@ def parse_page(url: str, html: str) -> Optional[Dict[str, str]]:
     return record
 
 
-def process_url(url: str) -> Optional[Dict[str, str]]:
-    html = fetch(url)
-    if not html:
-        return None
-    return parse_page(url, html)
-
-
-def unify_columns(records: List[Dict[str, str]]) -> List[str]:
+def open_sink(path: str) -> CsvSink:
     """
-    出力CSVの列順を決める。
-    必須カラムは先頭に固定、任意カラムは出現したものを続ける。
+    出力CSVを開く。
+    必須カラムは先頭に固定、任意カラムは出現したものを続ける（途中で増えた列は最後に統合）。
     """
-    cols = list(REQUIRED_COLUMNS)
-    seen = set(cols)
-    for rec in records:
-        if not rec:
+    return CsvSink(path, REQUIRED_COLUMNS)
+
+
+def run_pass(
+    fetcher: Fetcher,
+    pool: ParsePool,
+    urls: Iterable[str],
+    journal: RunJournal,
+    sink: CsvSink,
+) -> None:
+    # 取得と解析（別プロセス）を並行して進め、解析が終わった順に書き出す
+    for res, fut in pool.map_results(fetcher.iter_fetch(urls), parse_page):
+        if fut is None or res.status != 200:
+            journal.record_failure(res.url, res.error or f"HTTP {res.status}")
             continue
-        for k in rec.keys():
-            if k not in seen:
-                seen.add(k)
-                cols.append(k)
-    return cols
+        try:
+            rec = fut.result()
+        except Exception as e:
+            # ページごとの失敗は全体に影響させない
+            print(f"処理失敗: {res.url} - {e}", file=sys.stderr)
+            journal.record_failure(res.url, str(e))
+            continue
+        records = to_records(rec)
+        journal.record_ok(res.url, records)
+        for r in records:
+            sink.write(r)
 
 
-def save_csv(path: str, records: List[Dict[str, str]]) -> None:
-    if not records:
-        print("出力対象レコードがありません（全ページで名称が取得できませんでした）")
-        return
-    cols = unify_columns(records)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
-        writer.writeheader()
-        for rec in records:
-            writer.writerow(rec)
-    print(f"書き出し完了: {path}（{len(records)}件）")
+def to_records(rec: Optional[Dict[str, str]]) -> List[Dict[str, str]]:
+    # 名称が取れたページだけ出力する
+    return [rec] if rec and rec.get("名称") else []
+
+
+def make_adapter(
+    input_csv: Optional[str],
+    output_csv: str,
+    journal_path: str,
+    sitemap_state: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+) -> SiteAdapter:
+    """
+    一括実行（run_all.py）用のアダプター。input_csv が None ならサイトマップから直接URLを流す
+    （sitemap_state を渡すと前回から新規・変更のあったURLだけ）
+    """
+    commit = None
+    if input_csv:
+        urls = list_source(read_urls(input_csv))
+    else:
+        urls = sitemap_source(SITEMAP_HOME, URL_RULES, sitemap_state, removed_csv)
+        commit = urls.commit
+    return SiteAdapter(
+        name="dairitenbosyuu",
+        fetch_config=fetch_config(),
+        urls=urls,
+        parse=parse_page,
+        to_records=to_records,
+        open_sink=lambda: open_sink(output_csv),
+        journal_path=journal_path,
+        commit=commit,
+    )
 
 
 def main():
-    urls = read_urls(INPUT_CSV)
-    if not urls:
+    # --resume: 前回のジャーナルから完了済みURLを引き継ぐ
+    resume = "--resume" in sys.argv[1:]
+
+    urls = peek(read_urls(INPUT_CSV))
+    if urls is None:
         print("all_urls.csv にURLがありません。")
         return
 
-    results: List[Dict[str, str]] = []
-    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
-        future_map = {executor.submit(process_url, url): url for url in urls}
-        for fut in as_completed(future_map):
-            url = future_map[fut]
-            try:
-                rec = fut.result()
-                if rec and rec.get("名称"):
-                    results.append(rec)
-            except Exception as e:
-                # ページごとの失敗は全体に影響させない
-                print(f"処理失敗: {url} - {e}", file=sys.stderr)
-
-    save_csv(OUTPUT_CSV, results)
+    with RunJournal(JOURNAL_PATH, resume=resume) as journal, open_sink(
+        OUTPUT_CSV
+    ) as sink, build_fetcher() as fetcher, ParsePool() as pool:
+        # 前回までの完了分を出力に書き戻す
+        if resume:
+            for rec in journal.iter_records():
+                sink.write(rec)
+        run_pass(fetcher, pool, journal.pending(urls), journal, sink)
+        # 失敗分だけ再試行
+        retry_urls = journal.failed_urls()
+        if retry_urls:
+            print(f"失敗分を再試行: {len(retry_urls)}件", file=sys.stderr)
+            run_pass(fetcher, pool, retry_urls, journal, sink)
+        commit_pending_state(SITEMAP_STATE, journal)
+
+    export_metrics("dairitenbosyuu")
+    if not sink.count:
+        print("出力対象レコードがありません（全ページで名称が取得できませんでした）")
+        return
+    print(f"書き出し完了: {OUTPUT_CSV}（{sink.count}件）")
 
 
 if __name__ == "__main__":
@@ -1,15 +1,29 @@
 # scrape.py
 import csv
+import itertools
 import sys
-import time
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
 
-import requests
 from bs4 import BeautifulSoup
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.adaptive import AimdConfig
+from common.csv_sink import CsvSink
+from common.fetcher import Fetcher, FetchConfig
+from common.html_parser import ParseScope, make_soup
+from common.http_cache import DEFAULT_CACHE_DIR, HttpCache
+from common.journal import RunJournal
+from common.label_norm import LabelNormalizer
+from common.metrics import export_metrics
+from common.parse_pool import ParsePool
+from common.scheduler import SiteAdapter, list_source
+from common.sitemap import commit_pending_state, sitemap_source
+from common.url_rules import UrlRules
+from common.url_source import peek
+
 JST = timezone(timedelta(hours=9))
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -17,9 +31,20 @@ USER_AGENT = (
     "Chrome/120.0.0.0 Safari/537.36"
 )
 REQUEST_TIMEOUT = 25
-MAX_WORKERS = 8
+# 同時リクエスト数は応答時間と 429/503 を見て INITIAL_WORKERS から MAX_WORKERS の間で自動調整する
+# （解析の並列数は ParsePool 側で別に決まる）
+INITIAL_WORKERS = 8
+MAX_WORKERS = 32
 RETRY_COUNT = 2
 RETRY_BACKOFF_SEC = 2.0
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR  # 再実行時に再取得しないためのレスポンスキャッシュ
+HTTP_CACHE_TTL_SEC = 24 * 3600
+SITEMAP_HOME = "https://dairitenboshu.com/"  # fetch_urls.py / 一括実行でのURL収集元
+SITEMAP_STATE = "sitemap_state.jsonl"  # fetch_urls.py --incremental の前回の lastmod
+# 会社ページ（/syo/<番号>）だけを対象にする
+URL_RULES = UrlRules(include=[r"/syo/"])
+# 抽出は見出し（h2/h3）とテーブルの中だけを見るので、それ以外は木にしない
+PARSE_SCOPE = ParseScope(tags=("h2", "h3", "table"))
 
 KNOWN_FIELD_MAP = {
     "会社名": "名称",
@@ -35,6 +60,7 @@ KNOWN_FIELD_MAP = {
     "メール": "メール",
     "E-mail": "メール",
 }
+FIELD_LABELS = LabelNormalizer(KNOWN_FIELD_MAP.items())
 
 REQUIRED_COLUMNS = ["取得日時", "取得URL", "名称", "住所"]
 
@@ -43,47 +69,25 @@ def now_jst_iso() -> str:
     return datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S")
 
 
-def fetch_html(url: str) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+def fetch_config() -> FetchConfig:
     """
-    HTMLを取得して返す。戻り値は (html, status_code, error_message)。
-    - 成功: (html, 200, None)
-    - 失敗: (None, status_code or None, error_message)
+    共通フェッチエンジンの設定。
+    4xx は即終了、5xx / 通信エラーは RETRY_COUNT 回まで再試行する
+    （Retry-After かジッター付き指数バックオフで待ち、待っている間はほかのURLを取得する）。
     """
-    for attempt in range(RETRY_COUNT + 1):
-        try:
-            resp = requests.get(
-                url,
-                headers={"User-Agent": USER_AGENT},
-                timeout=REQUEST_TIMEOUT,
-            )
-            status = resp.status_code
-
-            # 4xx はリトライせず即終了
-            if 400 <= status < 500:
-                return None, status, f"HTTP {status}"
+    return FetchConfig(
+        concurrency=MAX_WORKERS,
+        adaptive=AimdConfig(initial=INITIAL_WORKERS, max_limit=MAX_WORKERS),
+        timeout=REQUEST_TIMEOUT,
+        retries=RETRY_COUNT,
+        retry_backoff=RETRY_BACKOFF_SEC,
+        headers={"User-Agent": USER_AGENT},
+        cache=HttpCache(HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL_SEC),
+    )
 
-            # 5xx はリトライ対象
-            resp.raise_for_status()
-
-            resp.encoding = resp.apparent_encoding or "utf-8"
-            return resp.text, status, None
-
-        except requests.HTTPError as e:
-            status = getattr(e.response, "status_code", None)
-            if status and 400 <= status < 500:
-                return None, status, f"HTTP {status}"
-            if attempt < RETRY_COUNT:
-                time.sleep(RETRY_BACKOFF_SEC * (attempt + 1))
-            else:
-                return None, status, f"HTTP {status}" if status else str(e)
-
-        except Exception as e:
-            if attempt < RETRY_COUNT:
-                time.sleep(RETRY_BACKOFF_SEC * (attempt + 1))
-            else:
-                return None, None, str(e)
 
-    return None, None, "unknown error"
+def build_fetcher() -> Fetcher:
+    return Fetcher(fetch_config())
 
 
 def normalize_text(s: Optional[str]) -> str:
@@ -125,13 +129,7 @@ def parse_company_table(soup: BeautifulSoup) -> Dict[str, str]:
 
             val_raw = val_raw.replace("\r", "").replace("\n", " ").strip()
 
-            normalized_key = None
-            for k, colname in KNOWN_FIELD_MAP.items():
-                if k in key_raw:
-                    normalized_key = colname
-                    break
-            if normalized_key is None:
-                normalized_key = key_raw
+            normalized_key = FIELD_LABELS(key_raw)
 
             prev = result.get(normalized_key, "")
             if len(val_raw) > len(prev):
@@ -144,22 +142,13 @@ def parse_company_table(soup: BeautifulSoup) -> Dict[str, str]:
     return result
 
 
-def extract_record(url: str) -> Optional[Dict[str, str]]:
+def extract_record(url: str, html: str) -> Optional[Dict[str, str]]:
     """
-    1URLからレコードを抽出。
+    取得済みHTMLからレコードを抽出。
     - 名称が空の場合は None を返してスキップ
-    - 失敗（404等）も None を返してスキップ
     """
-    html, status, err = fetch_html(url)
-    if html is None:
-        print(
-            f"[WARN] fetch failed, skip url={url} status={status} err={err}",
-            file=sys.stderr,
-        )
-        return None
-
     try:
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(html, scope=PARSE_SCOPE)
         table_data = parse_company_table(soup)
 
         name = table_data.get("名称", "").strip()
@@ -189,69 +178,129 @@ def extract_record(url: str) -> Optional[Dict[str, str]]:
         return None
 
 
-def read_urls(csv_path: str) -> List[str]:
-    urls: List[str] = []
+def read_urls(csv_path: str) -> Iterator[str]:
+    """入力CSVの1列目のURLを1行ずつ返す（全体をメモリに読み込まない）"""
     with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
         reader = csv.reader(f)
-        rows = list(reader)
-        if not rows:
-            return urls
+        first = next(reader, None)
+        if first is None:
+            return
         # 先頭セルがURLでなければヘッダとみなしてスキップ
-        start_idx = 0
-        first_cell = rows[0][0] if rows[0] else ""
-        if not first_cell.startswith("http"):
-            start_idx = 1
-        for row in rows[start_idx:]:
+        first_cell = first[0] if first else ""
+        rows = reader if not first_cell.startswith("http") else itertools.chain([first], reader)
+        for row in rows:
             if not row:
                 continue
             url = row[0].strip()
             if url:
-                urls.append(url)
-    return urls
-
-
-def write_csv(output_path: str, records: List[Dict[str, str]]) -> None:
-    # ヘッダは必須 + その他カラム（出現順）で重複なく作成
-    header: List[str] = list(REQUIRED_COLUMNS)
-    seen = set(header)
-    for rec in records:
-        for k in rec.keys():
-            if k not in seen:
-                header.append(k)
-                seen.add(k)
-
-    with open(output_path, "w", encoding="utf-8-sig", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
-        writer.writeheader()
+                yield url
+
+
+def open_sink(output_path: str) -> CsvSink:
+    # ヘッダは必須 + その他カラム（出現順）。途中で増えた列は最後に統合
+    # 書き終えたら取得URL順に並べ替える（取得・解析の完了順によらず毎回同じ順にする）
+    return CsvSink(output_path, REQUIRED_COLUMNS, encoding="utf-8-sig", sort_by="取得URL")
+
+
+def run_pass(
+    fetcher: Fetcher,
+    pool: ParsePool,
+    urls: Iterable[str],
+    journal: RunJournal,
+    sink: CsvSink,
+) -> None:
+    """
+    URL群を取得・抽出し、1件ごとにジャーナルと出力CSVへ書く。
+    取得は fetcher、解析は pool（別プロセス）で並行して進める。
+    urls は遅延で読み、取得・解析中のものは上限付きの窓の分だけ持つ
+    """
+    for res, fut in pool.map_results(fetcher.iter_fetch(urls), extract_record):
+        # 失敗（404等）はスキップ（最後にもう一度だけ再試行）
+        if fut is None:
+            print(
+                f"[WARN] fetch failed, skip url={res.url} status={res.status} err={res.error}",
+                file=sys.stderr,
+            )
+            journal.record_failure(res.url, res.error or "unknown error")
+            continue
+        try:
+            records = to_records(fut.result())
+        except Exception as e:
+            # 解析プロセスの異常（BrokenProcessPool 等）も1件の失敗として扱い、パスは続ける
+            print(f"[WARN] parse failed, skip url={res.url} err={e!r}", file=sys.stderr)
+            journal.record_failure(res.url, repr(e))
+            continue
+        journal.record_ok(res.url, records)
         for rec in records:
-            writer.writerow(rec)
+            sink.write(rec)
+
+
+def to_records(rec: Optional[Dict[str, str]]) -> List[Dict[str, str]]:
+    return [rec] if rec is not None else []
+
+
+def make_adapter(
+    input_csv: Optional[str],
+    output_csv: str,
+    journal_path: str,
+    sitemap_state: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+) -> SiteAdapter:
+    """
+    一括実行（run_all.py）用のアダプター。input_csv が None ならサイトマップから直接URLを流す
+    （sitemap_state を渡すと前回から新規・変更のあったURLだけ）
+    """
+    commit = None
+    if input_csv:
+        urls = list_source(read_urls(input_csv))
+    else:
+        urls = sitemap_source(SITEMAP_HOME, URL_RULES, sitemap_state, removed_csv)
+        commit = urls.commit
+    return SiteAdapter(
+        name="dairitenhonpo",
+        fetch_config=fetch_config(),
+        urls=urls,
+        parse=extract_record,
+        to_records=to_records,
+        open_sink=lambda: open_sink(output_csv),
+        journal_path=journal_path,
+        commit=commit,
+    )
 
 
 def main():
     input_csv = "all_urls.csv"
     output_csv = "company_info.csv"
+    journal_path = "company_info.journal.jsonl"
+    # --resume: 前回のジャーナルから完了済みURLを引き継ぐ
+    resume = "--resume" in sys.argv[1:]
 
-    urls = read_urls(input_csv)
-    if not urls:
+    urls = peek(read_urls(input_csv))
+    if urls is None:
         print(
             "all_urls.csv にURLが見つかりませんでした。1列目にURLを記載してください。",
             file=sys.stderr,
         )
         sys.exit(1)
 
-    records: List[Dict[str, str]] = []
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_map = {executor.submit(extract_record, url): url for url in urls}
-        for future in as_completed(future_map):
-            rec = future.result()
-            if rec is not None:
-                records.append(rec)
-
-    # 安定ソート
-    records.sort(key=lambda r: r.get("取得URL", ""))
-
-    write_csv(output_csv, records)
-    print(f"完了: {output_csv} に {len(records)} 件出力しました。（名称ありのみ）")
+    with RunJournal(journal_path, resume=resume) as journal, open_sink(
+        output_csv
+    ) as sink, build_fetcher() as fetcher, ParsePool() as pool:
+        # 前回までの完了分を出力に書き戻す
+        if resume:
+            for rec in journal.iter_records():
+                sink.write(rec)
+        run_pass(fetcher, pool, journal.pending(urls), journal, sink)
+        # 失敗分だけ再試行
+        retry_urls = journal.failed_urls()
+        if retry_urls:
+            print(f"[INFO] retry failed urls: {len(retry_urls)}", file=sys.stderr)
+            run_pass(fetcher, pool, retry_urls, journal, sink)
+        # fetch_urls.py --incremental で保留した lastmod を、成功したURLの分だけ確定する
+        commit_pending_state(SITEMAP_STATE, journal)
+
+    export_metrics("dairitenhonpo")
+    print(f"完了: {output_csv} に {sink.count} 件出力しました。（名称ありのみ）")
 
 
 if __name__ == "__main__":
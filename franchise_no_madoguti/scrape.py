@@ -1,21 +1,32 @@
 # scrape_fc_mado_company_info.py
 
-import concurrent.futures
 import csv
 import datetime
 import os
 import re
 import sys
-import time
-from typing import Dict, List, Tuple, Optional
-
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
 from tqdm import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.adaptive import AimdConfig
+from common.csv_sink import CsvSink
+from common.fetcher import Fetcher, FetchConfig
+from common.html_parser import ParseScope, make_soup
+from common.http_cache import DEFAULT_CACHE_DIR, HttpCache
+from common.journal import RunJournal
+from common.label_norm import LabelNormalizer
+from common.metrics import export_metrics
+from common.parse_pool import ParsePool
+from common.rate_limit import HostRateLimiter
+from common.scheduler import SiteAdapter, list_source
+from common.sitemap import commit_pending_state, sitemap_source
+from common.url_rules import UrlRules
+from common.url_source import peek
+
 # ユーザーエージェント（一般的なブラウザ文字列）
 DEFAULT_HEADERS = {
     "User-Agent": (
@@ -25,31 +36,48 @@ DEFAULT_HEADERS = {
     )
 }
 REQUEST_TIMEOUT = 20  # 秒
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR  # 再実行時に再取得しないためのレスポンスキャッシュ
+HTTP_CACHE_TTL_SEC = 24 * 3600
+SITEMAP_HOME = "https://www.fc-mado.com/"  # fetch_urls.py / 一括実行でのURL収集元
+SITEMAP_STATE = "sitemap_state.jsonl"  # fetch_urls.py --incremental の前回の lastmod
+# 詳細ページだけを対象にする
+URL_RULES = UrlRules(include=[r"detail"])
+# 文書全体を走査するので、タグは絞らず script / style だけ除く（デコード前のバイト列のまま）
+PARSE_SCOPE = ParseScope()
 
 CPU_COUNT = os.cpu_count() or 4
-# I/Oバウンドなので並列数はCPUの4倍程度、上限32
-MAX_WORKERS = min(32, CPU_COUNT * 4)
+# 取得はI/Oバウンドなので並列数はCPUの4倍程度から始め、応答時間と 429/503 を見て
+# MAX_WORKERS までの間で自動調整する
+MAX_WORKERS = 32
+INITIAL_WORKERS = min(MAX_WORKERS, CPU_COUNT * 4)
 
-# 軽いレート制御（高速過ぎる連打を避ける）
+# 軽いレート制御（高速過ぎる連打を避ける）: ホストごとに 1/REQUEST_INTERVAL_SEC 件/秒
 REQUEST_INTERVAL_SEC = 0.2
+REQUEST_BURST = 1
+RATE_LIMITER = HostRateLimiter(
+    default_rate=1.0 / REQUEST_INTERVAL_SEC, default_burst=REQUEST_BURST
+)
+
+
+# リトライ設定（429 / 5xx / 通信エラーを再試行）
+def fetch_config() -> FetchConfig:
+    return FetchConfig(
+        concurrency=MAX_WORKERS,
+        adaptive=AimdConfig(initial=INITIAL_WORKERS, max_limit=MAX_WORKERS),
+        timeout=REQUEST_TIMEOUT,
+        retries=3,
+        retry_backoff=0.5,
+        headers=DEFAULT_HEADERS,
+        rate_limiter=RATE_LIMITER,
+        cache=HttpCache(HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL_SEC),
+    )
 
 
-# リトライ設定
-def build_session() -> requests.Session:
-    session = requests.Session()
-    retries = Retry(
-        total=3,
-        backoff_factor=0.5,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "HEAD", "OPTIONS"],
-    )
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-    session.headers.update(DEFAULT_HEADERS)
-    return session
+def build_fetcher() -> Fetcher:
+    return Fetcher(fetch_config())
 
 
+# ラベルの同義語（| 区切り）と列名。上にあるものほど優先
 LABEL_PATTERNS: List[Tuple[str, str]] = [
     (r"会社情報|会社概要", "会社情報セクション"),
     (r"住所|所在地", "住所"),
@@ -62,10 +90,14 @@ LABEL_PATTERNS: List[Tuple[str, str]] = [
     (r"電話|TEL|電話番号", "電話"),
     (r"所在地", "住所"),
 ]
+LABELS = LabelNormalizer(
+    [(syn, key) for pat, key in LABEL_PATTERNS for syn in pat.split("|")],
+    ignore_case=True,
+)
 
 
-def load_urls_from_csv(csv_path: str) -> List[str]:
-    urls: List[str] = []
+def load_urls_from_csv(csv_path: str) -> Iterator[str]:
+    """入力CSVの1列目のURLを1行ずつ返す（全体をメモリに読み込まない）"""
     with open(csv_path, "r", encoding="utf-8") as f:
         reader = csv.reader(f)
         for row in reader:
@@ -76,31 +108,7 @@ def load_urls_from_csv(csv_path: str) -> List[str]:
                 continue
             if val.lower() in {"url", "リンク", "urls"}:
                 continue
-            urls.append(val)
-    return urls
-
-
-_session = build_session()
-_last_request_time = 0.0
-
-
-def fetch(url: str) -> Optional[str]:
-    global _last_request_time
-    # レート制御
-    now = time.time()
-    elapsed = now - _last_request_time
-    if elapsed < REQUEST_INTERVAL_SEC:
-        time.sleep(REQUEST_INTERVAL_SEC - elapsed)
-    try:
-        r = _session.get(url, timeout=REQUEST_TIMEOUT)
-        _last_request_time = time.time()
-        if not (200 <= r.status_code < 300):
-            return None
-        # エンコーディング推定
-        r.encoding = r.apparent_encoding or r.encoding
-        return r.text
-    except requests.RequestException:
-        return None
+            yield val
 
 
 def normalize_space(s: str) -> str:
@@ -108,11 +116,7 @@ def normalize_space(s: str) -> str:
 
 
 def label_to_key(label: str) -> str:
-    lab = normalize_space(label)
-    for pat, key in LABEL_PATTERNS:
-        if re.search(pat, lab, flags=re.IGNORECASE):
-            return key
-    return lab
+    return LABELS(normalize_space(label))
 
 
 def extract_text(el) -> str:
@@ -122,32 +126,84 @@ def extract_text(el) -> str:
     return normalize_space(txt)
 
 
-def find_company_section(soup: BeautifulSoup) -> List[BeautifulSoup]:
-    candidates: List[BeautifulSoup] = []
+SECTION_PAT = re.compile(r"(会社情報|会社概要)")
+CRUMB_PAT = re.compile(r"(株式会社|有限会社|組合|合同会社)")
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+CRUMB_TAGS = ("li", "span", "a")
+# get_text() の既定で対象になる文字列型（コメントや script 内の文字列は除く）
+TEXT_TYPES = (NavigableString, CData)
+
+
+def scan_page(soup: BeautifulSoup) -> Tuple[List[Tag], Optional[Tag]]:
+    """
+    文書を1回だけ葉から根へ集計し、(会社情報セクション候補, 社名パンくず) を返す。
+    要素ごとに extract_text() を作り直す代わりに、部分木のトークン数・文字数と
+    目印（会社情報/会社概要、株式会社 など）の有無を子から親へ積み上げる。
+    目印は空白を含まないので、連結後のテキストに現れるのはいずれかの文字列に
+    含まれるときに限られる。
+    セクション候補の順序は「見出し(h1→h6) → a → div」で、従来の走査と同じ。
+    パンくずは li/span/a のうち社名を含む最短のもの（同じ長さなら文書順で先）。
+    """
+    headings: List[Tuple[int, int, Tag]] = []
+    anchors: List[Tuple[int, Tag]] = []
+    divs: List[Tuple[int, Tag]] = []
+    crumb: Optional[Tuple[int, int, Tag]] = None
+
+    # 要素ごとの集計: [文字数, トークン数, セクション目印, 社名目印]
+    order = 0
+    stack = [(soup, iter(soup.contents), [0, 0, False, False], order)]
+    while stack:
+        el, children, acc, idx = stack[-1]
+        child = next(children, None)
+        if child is not None:
+            if isinstance(child, Tag):
+                order += 1
+                stack.append((child, iter(child.contents), [0, 0, False, False], order))
+            elif type(child) in TEXT_TYPES:
+                tokens = child.split()
+                if tokens:
+                    acc[0] += sum(map(len, tokens))
+                    acc[1] += len(tokens)
+                    acc[2] = acc[2] or SECTION_PAT.search(child) is not None
+                    acc[3] = acc[3] or CRUMB_PAT.search(child) is not None
+            continue
 
-    for tag_name in ["h1", "h2", "h3", "h4", "h5", "h6"]:
-        for h in soup.find_all(tag_name):
-            text = extract_text(h)
-            if re.search(r"(会社情報|会社概要)", text):
-                sib = h.find_next_sibling()
-                if sib:
-                    candidates.append(sib)
-                if h.parent:
-                    candidates.append(h.parent)
-
-    for a in soup.find_all("a"):
-        text = extract_text(a)
-        if re.search(r"(会社情報|会社概要)", text):
-            if a.parent:
-                candidates.append(a.parent)
-            sib = a.find_next_sibling()
-            if sib:
-                candidates.append(sib)
-
-    for div in soup.find_all("div"):
-        txt = extract_text(div)
-        if re.search(r"(会社情報|会社概要)", txt) and len(txt) < 3000:
-            candidates.append(div)
+        # 子をすべて見終わった要素を評価し、親へ積み上げる
+        stack.pop()
+        length = acc[0] + max(acc[1] - 1, 0)  # extract_text() の長さ
+        name = el.name
+        if acc[2]:
+            if name in HEADING_TAGS:
+                headings.append((HEADING_TAGS.index(name), idx, el))
+            elif name == "a":
+                anchors.append((idx, el))
+            elif name == "div" and length < 3000:
+                divs.append((idx, el))
+        if acc[3] and name in CRUMB_TAGS:
+            if crumb is None or (length, idx) < crumb[:2]:
+                crumb = (length, idx, el)
+        if stack:
+            parent = stack[-1][2]
+            parent[0] += acc[0]
+            parent[1] += acc[1]
+            parent[2] = parent[2] or acc[2]
+            parent[3] = parent[3] or acc[3]
+
+    candidates: List[Tag] = []
+    for _, _, h in sorted(headings, key=lambda t: t[:2]):
+        sib = h.find_next_sibling()
+        if sib:
+            candidates.append(sib)
+        if h.parent:
+            candidates.append(h.parent)
+    for _, a in sorted(anchors, key=lambda t: t[0]):
+        if a.parent:
+            candidates.append(a.parent)
+        sib = a.find_next_sibling()
+        if sib:
+            candidates.append(sib)
+    for _, div in sorted(divs, key=lambda t: t[0]):
+        candidates.append(div)
 
     uniq = []
     seen = set()
@@ -156,7 +212,7 @@ def find_company_section(soup: BeautifulSoup) -> List[BeautifulSoup]:
         if key not in seen:
             seen.add(key)
             uniq.append(c)
-    return uniq
+    return uniq, (crumb[2] if crumb else None)
 
 
 def parse_label_value_text(raw: str) -> List[Tuple[str, str]]:
@@ -227,15 +283,10 @@ def extract_company_info_from_section(section: BeautifulSoup) -> Dict[str, str]:
     return data
 
 
-def pick_name(soup: BeautifulSoup) -> Optional[str]:
-    breadcrumbs = soup.find_all(["li", "span", "a"])
-    crumb_candidates = []
-    for el in breadcrumbs:
-        txt = extract_text(el)
-        if re.search(r"(株式会社|有限会社|組合|合同会社)", txt):
-            crumb_candidates.append(txt)
-    if crumb_candidates:
-        return sorted(crumb_candidates, key=len)[0]
+def pick_name(soup: BeautifulSoup, crumb: Optional[Tag] = None) -> Optional[str]:
+    # パンくず（scan_page で見つけた社名入りの最短要素）
+    if crumb is not None:
+        return extract_text(crumb)
 
     for tag_name in ["h1", "h2"]:
         for h in soup.find_all(tag_name):
@@ -264,8 +315,13 @@ def pick_address(info_map: Dict[str, str], soup: BeautifulSoup) -> Optional[str]
     return None
 
 
-def scrape_one(url: str) -> Dict[str, str]:
-    html = fetch(url)
+def scrape_one(
+    url: str, html: Optional[bytes], encoding: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    取得済みの生バイト列から1件分の行を作る。
+    デコードは lxml に任せ、文字コードは取得側で判定済みのものを渡す。
+    """
     now_str = datetime.datetime.now().strftime("%Y/%m/%d %H:%M:%S")
     base: Dict[str, str] = {
         "取得日時": now_str,
@@ -276,8 +332,8 @@ def scrape_one(url: str) -> Dict[str, str]:
     if html is None:
         return base
 
-    soup = BeautifulSoup(html, "lxml")
-    sections = find_company_section(soup)
+    soup = make_soup(html, from_encoding=encoding, scope=PARSE_SCOPE)
+    sections, crumb = scan_page(soup)
 
     info_map: Dict[str, str] = {}
     for sec in sections:
@@ -286,7 +342,7 @@ def scrape_one(url: str) -> Dict[str, str]:
             if k not in info_map and v:
                 info_map[k] = v
 
-    name = pick_name(soup)
+    name = pick_name(soup, crumb)
     address = pick_address(info_map, soup)
 
     for k in ["会社名", "商号", "法人名", "名称"]:
@@ -316,57 +372,120 @@ def scrape_one(url: str) -> Dict[str, str]:
     return base
 
 
-def to_dataframe(rows: List[Dict[str, str]]) -> pd.DataFrame:
-    df = pd.DataFrame(rows)
-    for col in ["取得日時", "取得URL", "名称", "住所"]:
-        if col not in df.columns:
-            df[col] = ""
-    other_cols = [
-        c for c in df.columns if c not in ["取得日時", "取得URL", "名称", "住所"]
-    ]
-    ordered = ["取得日時", "取得URL", "名称", "住所"] + sorted(other_cols)
-    df = df[ordered]
-    return df
+def open_sink(path: str) -> CsvSink:
+    # 必須4列のあとに、その他の列を名前順で並べる（途中で増えた列は最後に統合）
+    return CsvSink(
+        path,
+        ["取得日時", "取得URL", "名称", "住所"],
+        sort_extra=True,
+        encoding="utf-8-sig",
+    )
+
+
+def run_pass(
+    fetcher: Fetcher,
+    pool: ParsePool,
+    urls: Iterable[str],
+    journal: RunJournal,
+    sink: CsvSink,
+    desc: str,
+) -> None:
+    # 生バイト列と文字コードを解析プロセスへ渡し、デコードも向こうで行う
+    results = pool.map_results(fetcher.iter_fetch(urls), scrape_one, decode=False)
+    # 入力を遅延で読む本処理は件数が分からないので、進捗は件数と速度だけ出す
+    total = len(urls) if isinstance(urls, list) else None
+    for res, fut in tqdm(results, total=total, desc=desc):
+        if fut is None:
+            journal.record_failure(res.url, res.error or "fetch failed")
+            continue
+        try:
+            row = fut.result()
+        except Exception as e:
+            journal.record_failure(res.url, str(e))
+            continue
+        journal.record_ok(res.url, [row])
+        sink.write(row)
+
+
+def write_failures(journal: RunJournal, sink: CsvSink) -> None:
+    # 再試行しても失敗したURLは空行＋エラー理由で残す
+    now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for url in journal.failed_urls():
+        sink.write(
+            {
+                "取得日時": now_str,
+                "取得URL": url,
+                "名称": "",
+                "住所": "",
+                "エラー": journal.failure_reason(url) or "",
+            }
+        )
+
+
+def make_adapter(
+    input_csv: Optional[str],
+    output_csv: str,
+    journal_path: str,
+    sitemap_state: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+) -> SiteAdapter:
+    """
+    一括実行（run_all.py）用のアダプター。input_csv が None ならサイトマップから直接URLを流す
+    （sitemap_state を渡すと前回から新規・変更のあったURLだけ）
+    """
+    commit = None
+    if input_csv:
+        urls = list_source(load_urls_from_csv(input_csv))
+    else:
+        urls = sitemap_source(SITEMAP_HOME, URL_RULES, sitemap_state, removed_csv)
+        commit = urls.commit
+    return SiteAdapter(
+        name="franchise_no_madoguti",
+        fetch_config=fetch_config(),
+        urls=urls,
+        parse=scrape_one,
+        to_records=lambda row: [row],
+        open_sink=lambda: open_sink(output_csv),
+        journal_path=journal_path,
+        decode=False,
+        finish=write_failures,
+        commit=commit,
+    )
 
 
 def main():
-    if len(sys.argv) < 2:
+    # --resume: 前回のジャーナルから完了済みURLを引き継ぐ
+    resume = "--resume" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--resume"]
+    if len(args) < 1:
         csv_path = "urls.csv"
     else:
-        csv_path = sys.argv[1]
+        csv_path = args[0]
 
-    urls = load_urls_from_csv(csv_path)
-    if not urls:
+    urls = peek(load_urls_from_csv(csv_path))
+    if urls is None:
         print("all_urls.csv にURLがありません。1列目にURLを配置してください。")
         sys.exit(1)
 
-    results: List[Dict[str, str]] = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(scrape_one, u): u for u in urls}
-        for fut in tqdm(
-            concurrent.futures.as_completed(futures),
-            total=len(futures),
-            desc="Scraping",
-        ):
-            try:
-                row = fut.result()
-                results.append(row)
-            except Exception as e:
-                url = futures[fut]
-                now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                results.append(
-                    {
-                        "取得日時": now_str,
-                        "取得URL": url,
-                        "名称": "",
-                        "住所": "",
-                        "エラー": str(e),
-                    }
-                )
-
-    df = to_dataframe(results)
-    df.to_csv("company_info_output.csv", index=False, encoding="utf-8-sig")
-    print("Saved company_info_output.csv ({} rows)".format(len(df)))
+    out_csv = "company_info_output.csv"
+    journal_path = "company_info_output.journal.jsonl"
+    with RunJournal(journal_path, resume=resume) as journal, open_sink(out_csv) as sink:
+        # 前回までの完了分を出力に書き戻す
+        if resume:
+            for row in journal.iter_records():
+                sink.write(row)
+        with build_fetcher() as fetcher, ParsePool() as pool:
+            run_pass(fetcher, pool, journal.pending(urls), journal, sink, "Scraping")
+            # 失敗分だけ再試行
+            retry_urls = journal.failed_urls()
+            if retry_urls:
+                run_pass(fetcher, pool, retry_urls, journal, sink, "Retrying")
+
+        write_failures(journal, sink)
+        commit_pending_state(SITEMAP_STATE, journal)
+
+    export_metrics("franchise_no_madoguti")
+    print("Saved {} ({} rows)".format(out_csv, sink.count))
 
 
 if __name__ == "__main__":
@@ -3,19 +3,44 @@ import csv
 import datetime
 import re
 import sys
-from typing import Dict, List, Tuple, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from concurrent.futures import Future
+from typing import Dict, Iterable, Iterator, List, Optional
 
-import requests
 from bs4 import BeautifulSoup, Tag
 
-REQUEST_TIMEOUT = 30
-DEFAULT_MAX_WORKERS = 10  # 並列数のデフォルト
-
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.adaptive import AimdConfig
+from common.csv_sink import CsvSink
+from common.fetcher import FetchResult, Fetcher, FetchConfig
+from common.html_parser import ParseScope, make_soup
+from common.http_cache import DEFAULT_CACHE_DIR, HttpCache
+from common.journal import RunJournal
+from common.label_norm import LabelNormalizer
+from common.metrics import export_metrics
+from common.parse_pool import ParsePool
+from common.scheduler import SiteAdapter, list_source
+from common.sitemap import commit_pending_state, sitemap_source
+from common.url_rules import UrlRules
+from common.url_source import peek
 
-def fetch_html(url: str) -> Tuple[str, str]:
+REQUEST_TIMEOUT = 30
+# 同時リクエスト数は応答時間と 429/503 を見て INITIAL_WORKERS から max_workers の間で自動調整する
+INITIAL_WORKERS = 10
+DEFAULT_MAX_WORKERS = 32  # 同時リクエスト数の上限のデフォルト
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR  # 再実行時に再取得しないためのレスポンスキャッシュ
+HTTP_CACHE_TTL_SEC = 24 * 3600
+SITEMAP_HOME = "https://bahn-rep.com/"  # fetch_urls.py / 一括実行でのURL収集元
+SITEMAP_STATE = "sitemap_state.jsonl"  # fetch_urls.py --incremental の前回の lastmod
+# サイトマップの全ページが対象（会社表の無いページは抽出側で0行になる）
+URL_RULES = UrlRules()
+# 会社表は見出しの親・兄弟から探すので、タグは絞らず script / style だけ除く
+PARSE_SCOPE = ParseScope()
+
+
+def fetch_config(max_workers: int = DEFAULT_MAX_WORKERS) -> FetchConfig:
     """
-    指定URLのHTMLを取得して (最終URL, HTMLテキスト) を返す
+    共通フェッチエンジンの設定（文字化け対策は FetchResult.text 側で実施）
     """
     headers = {
         "User-Agent": (
@@ -24,12 +49,36 @@ def fetch_html(url: str) -> Tuple[str, str]:
             "Chrome/120.0.0.0 Safari/537.36"
         )
     }
-    resp = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-    resp.raise_for_status()
-    # 文字化け対策
-    if resp.encoding is None or resp.encoding.lower() in ("iso-8859-1", "latin-1"):
-        resp.encoding = resp.apparent_encoding or "utf-8"
-    return resp.url, resp.text
+    return FetchConfig(
+        concurrency=max_workers,
+        adaptive=AimdConfig(
+            initial=min(INITIAL_WORKERS, max_workers), max_limit=max_workers
+        ),
+        timeout=REQUEST_TIMEOUT,
+        retries=0,
+        headers=headers,
+        cache=HttpCache(HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL_SEC),
+    )
+
+
+def build_fetcher(max_workers: int) -> Fetcher:
+    return Fetcher(fetch_config(max_workers))
+
+
+# 日本語ラベルの同義語 -> 列名（上にあるものほど優先）
+KEY_MAP = {
+    "名称": "名称",
+    "住所": "住所",
+    "TEL": "TEL",
+    "電話": "TEL",
+    "設立": "設立",
+    "資本金": "資本金",
+    "年商": "年商",
+    "部署": "部署",
+    "従業員": "従業員",
+    "事業": "事業",
+}
+COMPANY_LABELS = LabelNormalizer(KEY_MAP.items())
 
 
 def find_recruit_company_table(soup: BeautifulSoup) -> Optional[Tag]:
@@ -92,25 +141,7 @@ def parse_company_table(table: Tag) -> Dict[str, str]:
         # 空白を正規化
         val = re.sub(r"\s+", " ", val).strip()
 
-        key_map = {
-            "名称": "名称",
-            "住所": "住所",
-            "TEL": "TEL",
-            "電話": "TEL",
-            "設立": "設立",
-            "資本金": "資本金",
-            "年商": "年商",
-            "部署": "部署",
-            "従業員": "従業員",
-            "事業": "事業",
-        }
-        norm_key = key
-        for k in key_map.keys():
-            if k in norm_key:
-                norm_key = key_map[k]
-                break
-
-        data[norm_key] = val
+        data[COMPANY_LABELS(key)] = val
 
     # TELが無い場合は空欄を補完
     if "TEL" not in data:
@@ -141,12 +172,11 @@ def build_row(url: str, parsed: Dict[str, str]) -> Dict[str, str]:
     return row
 
 
-def scrape_company_info_single(url: str) -> List[Dict[str, str]]:
+def scrape_company_info_single(final_url: str, html: str) -> List[Dict[str, str]]:
     """
     単一ページから会社情報行を抽出して返す
     """
-    final_url, html = fetch_html(url)
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html, scope=PARSE_SCOPE)
 
     rows: List[Dict[str, str]] = []
 
@@ -165,13 +195,13 @@ def scrape_company_info_single(url: str) -> List[Dict[str, str]]:
     return rows
 
 
-def read_urls_from_csv(path: str) -> List[str]:
+def read_urls_from_csv(path: str) -> Iterator[str]:
     """
-    all_urls.csvからURLリストを読み込む
+    all_urls.csvからURLを1行ずつ読み込む（全体をメモリに読み込まない）
     - 1列CSV（ヘッダ有無どちらでも可）
     - 複数列なら先頭列をURLとして扱う
     """
-    urls: List[str] = []
+    found = False
     with open(path, newline="", encoding="utf-8-sig") as f:
         reader = csv.reader(f)
         for row in reader:
@@ -181,83 +211,140 @@ def read_urls_from_csv(path: str) -> List[str]:
             if not candidate:
                 continue
             # 先頭行がhttpで始まらなければヘッダとみなしてスキップ
-            if len(urls) == 0 and not candidate.lower().startswith("http"):
+            if not found and not candidate.lower().startswith("http"):
                 continue
-            urls.append(candidate)
-    return urls
-
-
-def save_csv(rows: List[Dict[str, str]], out_path: str) -> None:
+            found = True
+            yield candidate
+
+
+OUTPUT_COLUMNS = [
+    "取得日時",
+    "取得URL",
+    "名称",
+    "住所",
+    "TEL",
+    "設立",
+    "資本金",
+    "年商",
+    "部署",
+    "従業員",
+    "事業",
+]
+
+
+def open_sink(out_path: str) -> CsvSink:
     """
-    固定カラム順でCSV保存（UTF-8 BOM; Excel対策）
+    固定カラム順でCSV保存（UTF-8 BOM; Excel対策）。行は完了順に逐次書き込む
     """
-    fieldnames = [
-        "取得日時",
-        "取得URL",
-        "名称",
-        "住所",
-        "TEL",
-        "設立",
-        "資本金",
-        "年商",
-        "部署",
-        "従業員",
-        "事業",
-    ]
-    with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-
-
-def process_url(url: str) -> List[Dict[str, str]]:
+    return CsvSink(out_path, OUTPUT_COLUMNS, dynamic=False, encoding="utf-8-sig")
+
+
+def process_result(
+    res: FetchResult, fut: Optional[Future], journal: RunJournal, sink: CsvSink
+) -> None:
     """
-    単一URLのラッパー（例外処理込み）。失敗時は空リストを返す
+    取得結果1件と解析結果（fut）のラッパー（例外処理込み）。結果はジャーナルに記録する
     """
+    if res.status is not None and not res.ok:
+        print(f"[HTTPError] {res.url}: {res.error}")
+        journal.record_failure(res.url, res.error or "http error")
+        return
+    if res.error == "timeout":
+        print(f"[Timeout] {res.url}: request timed out")
+        journal.record_failure(res.url, "timeout")
+        return
+    if res.error:
+        print(f"[Error] {res.url}: {res.error}")
+        journal.record_failure(res.url, res.error)
+        return
     try:
-        return scrape_company_info_single(url)
-    except requests.HTTPError as e:
-        print(f"[HTTPError] {url}: {e}")
-    except requests.Timeout:
-        print(f"[Timeout] {url}: request timed out")
+        rows = fut.result()
     except Exception as e:
-        print(f"[Error] {url}: {e}")
-    return []
+        print(f"[Error] {res.url}: {e}")
+        journal.record_failure(res.url, str(e))
+        return
+    journal.record_ok(res.url, rows)
+    for row in rows:
+        sink.write(row)
+
+
+def make_adapter(
+    in_csv: Optional[str],
+    out_csv: str,
+    journal_path: str,
+    sitemap_state: Optional[str] = None,
+    removed_csv: Optional[str] = None,
+) -> SiteAdapter:
+    """
+    一括実行（run_all.py）用のアダプター。in_csv が None ならサイトマップから直接URLを流す
+    （sitemap_state を渡すと前回から新規・変更のあったURLだけ）
+    """
+    commit = None
+    if in_csv:
+        urls = list_source(read_urls_from_csv(in_csv))
+    else:
+        urls = sitemap_source(SITEMAP_HOME, URL_RULES, sitemap_state, removed_csv)
+        commit = urls.commit
+    return SiteAdapter(
+        name="repre",
+        fetch_config=fetch_config(),
+        urls=urls,
+        parse=scrape_company_info_single,
+        to_records=list,
+        open_sink=lambda: open_sink(out_csv),
+        journal_path=journal_path,
+        final_url=True,
+        commit=commit,
+    )
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python scrape.py <all_urls.csv> [out.csv] [max_workers]")
+    # --resume: 前回のジャーナルから完了済みURLを引き継ぐ
+    resume = "--resume" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--resume"]
+    if len(args) < 1:
+        print("Usage: python scrape.py <all_urls.csv> [out.csv] [max_workers] [--resume]")
         print("Example:")
         print("  python scrape.py all_urls.csv company_info_all.csv 16")
         sys.exit(1)
 
-    in_csv = sys.argv[1]
-    out_csv = sys.argv[2] if len(sys.argv) >= 3 else "company_info_all.csv"
-    max_workers = int(sys.argv[3]) if len(sys.argv) >= 4 else DEFAULT_MAX_WORKERS
+    in_csv = args[0]
+    out_csv = args[1] if len(args) >= 2 else "company_info_all.csv"
+    max_workers = int(args[2]) if len(args) >= 3 else DEFAULT_MAX_WORKERS
+    journal_path = str(Path(out_csv).with_suffix(".journal.jsonl"))
 
-    urls = read_urls_from_csv(in_csv)
-    if not urls:
+    urls = peek(read_urls_from_csv(in_csv))
+    if urls is None:
         print("No URLs found in the input CSV.")
         sys.exit(1)
 
-    all_rows: List[Dict[str, str]] = []
-
-    # 並列スクレイピング
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_map = {executor.submit(process_url, url): url for url in urls}
-        for future in as_completed(future_map):
-            url = future_map[future]
-            try:
-                rows = future.result()
-                all_rows.extend(rows)
-            except Exception as e:
-                # process_url内で未捕捉の例外が発生した場合のみここに来る
-                print(f"[FutureError] {url}: {e}")
-
-    save_csv(all_rows, out_csv)
-    print(f"Processed {len(urls)} URL(s). Saved {len(all_rows)} row(s) to {out_csv}")
+    def run_pass(target_urls: Iterable[str]) -> None:
+        results = fetcher.iter_fetch(target_urls)
+        for res, fut in pool.map_results(
+            results, scrape_company_info_single, final_url=True
+        ):
+            process_result(res, fut, journal, sink)
+
+    # 並列スクレイピング（取得は共通フェッチエンジン、解析は別プロセスで完了順に実施）
+    # max_workers は取得側の同時リクエスト数の上限。解析の並列数は ParsePool が CPU 数から決める
+    with RunJournal(journal_path, resume=resume) as journal, open_sink(
+        out_csv
+    ) as sink, build_fetcher(max_workers) as fetcher, ParsePool() as pool:
+        # 前回までの完了分を出力に書き戻す
+        if resume:
+            for row in journal.iter_records():
+                sink.write(row)
+        run_pass(journal.pending(urls))
+        # 失敗分だけ再試行
+        retry_urls = journal.failed_urls()
+        if retry_urls:
+            print(f"Retrying {len(retry_urls)} failed URL(s)")
+            run_pass(retry_urls)
+        commit_pending_state(SITEMAP_STATE, journal)
+
+    export_metrics("repre")
+    processed = sum(journal.counts().values())
+    print(f"Processed {processed} URL(s). Saved {sink.count} row(s) to {out_csv}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+全スクレイパーを1プロセスで同時に実行する
+- 取得の同時数は全サイト共通の上限（--concurrency）とホストごとの上限（--per-host）で抑える
+  （ホストごとの同時数は --per-host を上限に応答時間・429/503 を見て自動調整。--fixed-per-host で固定）
+- 解析は全サイトで1つの ParsePool を共有する
+- 出力は <出力ディレクトリ>/<サイト>.csv、ジャーナルは <サイト>.journal.jsonl
+- 入力を指定したサイトだけ実行する（1サイトが失敗してもほかは続ける）
+- --metrics-dir（既定は環境変数 SCRAPE_METRICS_DIR）を指定すると、段ごとの所要時間と
+  ホストごとのカウンタを run_all.metrics.json / run_all.prom に出力する
+- 入力に sitemap を指定すると、CSVの代わりにサイトマップから見つけたURLを直接流す
+  （--incremental なら前回から新規・lastmod 変更のあったURLだけ。前回の状態は <サイト>.sitemap.jsonl、
+  消えたURLは <サイト>.removed.csv）
+
+使い方:
+  python run_all.py --dairitenhonpo dairitenhonpo/all_urls.csv \\
+      --repre repre/all_urls.csv --franchise-no-madoguti franchise_no_madoguti/urls.csv \\
+      --tabelog https://tabelog.com/osaka/A2701/A270108/rstLst/ --out-dir out
+  python run_all.py --dairitenhonpo sitemap --repre sitemap --incremental
+  python run_all.py ... --resume   # 前回のジャーナルから再開
+"""
+
+import argparse
+import asyncio
+import importlib
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+
+from common.adaptive import AimdConfig
+from common.metrics import export_metrics
+from common.scheduler import run_sites
+
+# 引数名 -> 入力CSVを取るサイトのモジュール
+CSV_SITES = {
+    "dairitenhonpo": "dairitenhonpo.scrape",
+    "repre": "repre.scrape",
+    "dairitenbosyuu": "dairitenbosyuu.scrape",
+    "franchise_no_madoguti": "franchise_no_madoguti.scrape",
+}
+SITEMAP = "sitemap"  # 入力CSVの代わりにサイトマップを使う指定
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST = 8
+
+
+def main():
+    ap = argparse.ArgumentParser(description="全スクレイパーを1プロセスで同時に実行する")
+    for name in CSV_SITES:
+        ap.add_argument(f"--{name.replace('_', '-')}", dest=name, metavar="CSV", help="入力CSV（sitemap ならサイトマップから）")
+    ap.add_argument("--tabelog", metavar="URL", help="食べログの一覧URL（rstLst）")
+    ap.add_argument("--out-dir", default="out")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="全体の同時リクエスト数")
+    ap.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="ホストごとの同時リクエスト数（0 で無制限）")
+    ap.add_argument("--fixed-per-host", action="store_true", help="ホストごとの同時数を自動調整せず --per-host に固定する")
+    ap.add_argument("--resume", action="store_true")
+    ap.add_argument("--metrics-dir", help="メトリクスの出力先（JSON と Prometheus textfile）")
+    ap.add_argument("--incremental", action="store_true", help="サイトマップ入力で差分だけ取得する")
+    args = ap.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def paths(name: str):
+        return str(out_dir / f"{name}.csv"), str(out_dir / f"{name}.journal.jsonl")
+
+    adapters = []
+    for name, module in CSV_SITES.items():
+        input_csv = getattr(args, name)
+        if not input_csv:
+            continue
+        state = {}
+        if input_csv == SITEMAP:
+            input_csv = None
+            if args.incremental:
+                state = {
+                    "sitemap_state": str(out_dir / f"{name}.sitemap.jsonl"),
+                    "removed_csv": str(out_dir / f"{name}.removed.csv"),
+                }
+        site = importlib.import_module(module)
+        adapters.append(site.make_adapter(input_csv, *paths(name), **state))
+    if args.tabelog:
+        import tabelog_all
+
+        adapters.append(tabelog_all.make_adapter(args.tabelog, *paths("tabelog")))
+    if not adapters:
+        ap.error("実行するサイトの入力を1つ以上指定してください")
+
+    adaptive = None
+    if not args.fixed_per_host:
+        adaptive = AimdConfig(max_limit=args.per_host or args.concurrency)
+    summaries = asyncio.run(
+        run_sites(
+            adapters,
+            args.concurrency,
+            args.per_host,
+            resume=args.resume,
+            adaptive=adaptive,
+        )
+    )
+    export_metrics("run_all", args.metrics_dir)
+    failed = False
+    for s in summaries:
+        if s.error:
+            failed = True
+            print(f"[ERROR] {s.name}: {s.error}")
+        else:
+            print(
+                f"[INFO] {s.name}: 成功 {s.ok} / 失敗 {s.failed} URL、"
+                f"{s.rows} 行出力（{s.elapsed:.1f} 秒）"
+            )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
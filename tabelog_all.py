@@ -7,49 +7,86 @@
 使い方:
   python tabelog_scrape_all.py https://tabelog.com/osaka/A2701/A270108/rstLst/  output.csv
 
+処理の流れ:
+- 一覧ページのページネーションと詳細ページの取得を並行して進めるパイプライン
+  （一覧の解析結果を上限付きキューに流し、詳細ワーカー群が順次取り出して取得する）
+- 詳細ページの解析は別プロセス（ParsePool）で行い、取得の並列数とは別に CPU 数で回す
+- 詳細ページの再試行（Retry-After / 指数バックオフ）は待ち行列に預け、待っている間も
+  詳細ワーカーはほかの店舗を取得する
+
 注意:
 - 必ず対象サイトの利用規約・robots.txtを確認し、過度なアクセスを避けてください。
 - 一覧URLは都道府県・エリアの一覧ページ(rstLst)を指定してください。
   例: https://tabelog.com/osaka/A2701/A270108/rstLst/
 """
 
+import asyncio
 import sys
 import re
-import time
-import csv
-from typing import List, Dict, Optional, Tuple
-import requests
-from bs4 import BeautifulSoup
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+
+from common.csv_sink import CsvSink
+from common.fetcher import DEFAULT_HEADERS, AsyncFetcher, FetchConfig
+from common.html_parser import CssDoc, ParseScope, make_soup
+from common.http_cache import DEFAULT_CACHE_DIR, HttpCache
+from common.journal import RunJournal
+from common.label_index import LabelIndex
+from common.metrics import export_metrics
+from common.parse_pool import ParsePool, decode_and_call
+from common.rate_limit import HostRateLimiter
+from common.retry import RetryQueue
+from common.scheduler import SiteAdapter
 
 UA = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-HEADERS = {
-    "User-Agent": UA,
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    "Accept-Language": "ja,en;q=0.9",
-    "Connection": "keep-alive",
-}
+HEADERS = {**DEFAULT_HEADERS, "User-Agent": UA}
 
 REQ_TIMEOUT = 20
 MAX_RETRIES = 3
 RETRY_SLEEP = 1.5
 REQUEST_INTERVAL = 1.0  # レート制限（秒）
+REQUEST_BURST = 1  # 連続で即時送信してよいリクエスト数
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR  # 再実行時に再取得しないためのレスポンスキャッシュ
+HTTP_CACHE_TTL_SEC = 24 * 3600
+DETAIL_WORKERS = 4  # 詳細ページを取得するワーカー数
+DETAIL_QUEUE_SIZE = 200  # 一覧→詳細の受け渡しキューの上限（一覧側が先行しすぎない）
+LIST_PAGE_SIZE = 20  # 一覧1ページあたりの店舗数
+MAX_LIST_PAGES = 60  # 食べログの一覧は60ページまでしか表示されない
+# 一覧ページの件数表示はタグが決まっていないので、タグは絞らず script / style だけ除く
+LIST_PARSE_SCOPE = ParseScope()
+# 詳細ページは電話番号の補完で全文を使うので、タグは絞らず script / style だけ除く
+DETAIL_PARSE_SCOPE = ParseScope()
+
+# 一覧URL: .../rstLst/[カテゴリ/...][ページ番号/][?クエリ]
+LIST_URL_PAT = re.compile(r"^(https?://tabelog\.com/.*?/rstLst/(?:[A-Za-z][^/?]*/)*)(\d+/)?(\?.*)?$")
+
+# 一覧・詳細の全取得で共有するホスト単位のレート制限
+RATE_LIMITER = HostRateLimiter(
+    default_rate=1.0 / REQUEST_INTERVAL, default_burst=REQUEST_BURST
+)
 
 class ScrapeError(Exception):
     pass
 
-def fetch_html(url: str) -> str:
-    last_err: Optional[Exception] = None
-    for attempt in range(MAX_RETRIES):
-        try:
-            resp = requests.get(url, headers=HEADERS, timeout=REQ_TIMEOUT)
-            if resp.status_code != 200:
-                raise ScrapeError(f"HTTP {resp.status_code}: {url}")
-            resp.encoding = resp.apparent_encoding
-            return resp.text
-        except Exception as e:
-            last_err = e
-            time.sleep(RETRY_SLEEP)
-    raise ScrapeError(f"Failed to fetch {url}: {last_err}")
+def fetch_config() -> FetchConfig:
+    # 一覧1本 + 詳細ワーカー分の同時接続（keep-alive で使い回す）
+    return FetchConfig(
+        concurrency=DETAIL_WORKERS + 1,
+        timeout=REQ_TIMEOUT,
+        retries=MAX_RETRIES - 1,
+        retry_backoff=RETRY_SLEEP,
+        headers=HEADERS,
+        rate_limiter=RATE_LIMITER,
+        cache=HttpCache(HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL_SEC),
+    )
+
+def build_fetcher() -> AsyncFetcher:
+    return AsyncFetcher(fetch_config())
+
+async def fetch_html(fetcher: AsyncFetcher, url: str) -> str:
+    res = await fetcher.fetch(url)
+    if not res.ok:
+        raise ScrapeError(f"Failed to fetch {url}: {res.error}")
+    return res.text
 
 def absolutize(base: str, href: str) -> Optional[str]:
     if not href:
@@ -64,15 +101,60 @@ def absolutize(base: str, href: str) -> Optional[str]:
             return m.group(1) + href
     return None
 
+def parse_list_page(html: str, base_url: str) -> Tuple[List[str], Optional[str], Optional[int]]:
+    """
+    一覧ページから (店舗詳細URL群, 「次へ」ページURL, 総件数) を抽出
+    """
+    # 一覧ページはCSSセレクタだけで足りるので、設定次第で selectolax の高速パスを使う
+    doc = CssDoc(html, scope=LIST_PARSE_SCOPE)
+    detail_urls, next_url = extract_list_links(doc, base_url)
+    return detail_urls, next_url, parse_total_count(doc)
+
 def parse_list_page_for_detail_urls(html: str, base_url: str) -> Tuple[List[str], Optional[str]]:
     """
     一覧ページから店舗詳細URL群と「次へ」ページURLを抽出
     """
-    soup = BeautifulSoup(html, "html.parser")
+    detail_urls, next_url, _ = parse_list_page(html, base_url)
+    return detail_urls, next_url
+
+def parse_total_count(doc: CssDoc) -> Optional[int]:
+    """
+    一覧ページの「全 N 件」表示から総件数を読む。見つからなければ None
+    """
+    el = doc.select_one("p.c-page-count, .list-condition__count")
+    if not el:
+        return None
+    txt = el.text(" ", strip=True)
+    m = re.search(r"全\s*([\d,]+)\s*件", txt) or re.search(r"([\d,]+)", txt)
+    if not m:
+        return None
+    try:
+        return int(m.group(1).replace(",", ""))
+    except ValueError:
+        return None
+
+def predict_page_urls(list_url: str, total: int) -> Optional[List[str]]:
+    """
+    rstLst/N/ 形式のページURLを2ページ目から最終ページまで生成。
+    URLが想定外の形なら None（「次へ」リンクを辿る方式にフォールバック）
+    """
+    m = LIST_URL_PAT.match(list_url)
+    if not m or total <= 0:
+        return None
+    base, page, query = m.group(1), m.group(2), m.group(3) or ""
+    if page and page != "1/":
+        return None
+    pages = min(MAX_LIST_PAGES, -(-total // LIST_PAGE_SIZE))
+    return [f"{base}{n}/{query}" for n in range(2, pages + 1)]
+
+def extract_list_links(doc: CssDoc, base_url: str) -> Tuple[List[str], Optional[str]]:
+    """
+    一覧ページから店舗詳細URL群と「次へ」ページURLを抽出
+    """
     detail_urls: List[str] = []
 
     # 店舗カード内のリンク: a.rstname or a.list-rst__rst-name-target など
-    for a in soup.select("a.list-rst__rst-name-target, a.rstname, a.js-clickable-area"):
+    for a in doc.select("a.list-rst__rst-name-target, a.rstname, a.js-clickable-area"):
         href = a.get("href")
         if not href:
             continue
@@ -85,7 +167,7 @@ def parse_list_page_for_detail_urls(html: str, base_url: str) -> Tuple[List[str]
 
     # フォールバック: 店名リンク以外でも rstinfo への導線がある場合
     if not detail_urls:
-        for a in soup.select("a[href]"):
+        for a in doc.select("a[href]"):
             href = a.get("href") or ""
             if re.search(r"^https?://tabelog\.com/.+/\d{6,}/?$", href):
                 detail_urls.append(href)
@@ -93,7 +175,7 @@ def parse_list_page_for_detail_urls(html: str, base_url: str) -> Tuple[List[str]
     # 「次へ」ページ
     next_url = None
     # 代表的なページネーション: a.next, a.pagination__next
-    next_candidates = soup.select("a.next, a.pagination__next, a.c-pagination__arrow--next")
+    next_candidates = doc.select("a.next, a.pagination__next, a.c-pagination__arrow--next")
     for a in next_candidates:
         href = a.get("href")
         absu = absolutize(base_url, href) if href else None
@@ -105,15 +187,15 @@ def parse_list_page_for_detail_urls(html: str, base_url: str) -> Tuple[List[str]
     if not next_url:
         current_page_num = None
         # 現在ページは span.curr, li.is-current など
-        curr = soup.select_one("span.curr, li.is-current")
+        curr = doc.select_one("span.curr, li.is-current")
         if curr:
             try:
-                current_page_num = int(curr.get_text(strip=True))
+                current_page_num = int(curr.text(strip=True))
             except:
                 current_page_num = None
         if current_page_num:
-            for a in soup.select("a[href]"):
-                txt = a.get_text(strip=True)
+            for a in doc.select("a[href]"):
+                txt = a.text(strip=True)
                 try:
                     n = int(txt)
                 except:
@@ -134,8 +216,14 @@ def text_or_none(el) -> Optional[str]:
     txt = el.get_text(strip=True)
     return txt or None
 
+PHONE_PAT = re.compile(r"\b0\d{1,4}-\d{1,4}-\d{3,4}\b")
+PHONE_LABELS = ["電話番号", "予約・お問い合わせ", "電話受付"]
+HP_LABELS = ["HP", "ホームページ", "オフィシャルサイト", "公式サイト", "公式ホームページ"]
+
 def extract_store_info(html: str) -> Dict[str, Optional[str]]:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html, scope=DETAIL_PARSE_SCOPE)
+    # th→td 行は1回だけ走査して、各項目はここから引く
+    index = LabelIndex(soup)
 
     # 店舗名
     name = None
@@ -146,28 +234,17 @@ def extract_store_info(html: str) -> Dict[str, Optional[str]]:
             break
     if not name:
         # テーブルの「店名」
-        for table in soup.find_all("table"):
-            for row in table.find_all("tr"):
-                th = row.find("th")
-                td = row.find("td")
-                if th and td and "店名" in th.get_text(strip=True):
-                    name = text_or_none(td)
-                    break
+        for td in index.cells(["店名"]):
+            name = text_or_none(td)
             if name:
                 break
 
     # 住所
     address = None
-    for table in soup.find_all("table"):
-        for row in table.find_all("tr"):
-            th = row.find("th")
-            td = row.find("td")
-            if th and td and "住所" in th.get_text(strip=True):
-                parts = [s for s in td.stripped_strings]
-                addr = " ".join(parts)
-                addr = re.sub(r"(地図|大きな地図を見る|周辺のお店を探す).*", "", addr)
-                address = addr.strip()
-                break
+    for td in index.cells(["住所"]):
+        addr = " ".join(td.stripped_strings)
+        addr = re.sub(r"(地図|大きな地図を見る|周辺のお店を探す).*", "", addr)
+        address = addr.strip()
         if address:
             break
     if not address:
@@ -176,47 +253,32 @@ def extract_store_info(html: str) -> Dict[str, Optional[str]]:
 
     # 電話番号（「予約・お問い合わせ」「電話番号」など）
     phone = None
-    phone_labels = ["電話番号", "予約・お問い合わせ", "電話受付"]
-    for table in soup.find_all("table"):
-        for row in table.find_all("tr"):
-            th = row.find("th")
-            td = row.find("td")
-            if th and td and any(lbl in th.get_text(strip=True) for lbl in phone_labels):
-                txt = td.get_text(" ", strip=True)
-                m = re.search(r"\b0\d{1,4}-\d{1,4}-\d{3,4}\b", txt)
-                if m:
-                    phone = m.group(0)
-                    break
-                tel_a = td.find("a", href=re.compile(r"^tel:"))
-                if tel_a:
-                    phone = tel_a.get_text(strip=True)
-                    break
-        if phone:
+    for td in index.cells(PHONE_LABELS):
+        m = PHONE_PAT.search(td.get_text(" ", strip=True))
+        if m:
+            phone = m.group(0)
+            break
+        tel_a = td.find("a", href=re.compile(r"^tel:"))
+        if tel_a:
+            phone = tel_a.get_text(strip=True)
             break
     if not phone:
-        m = re.search(r"\b0\d{1,4}-\d{1,4}-\d{3,4}\b", soup.get_text(" ", strip=True))
+        m = PHONE_PAT.search(soup.get_text(" ", strip=True))
         if m:
             phone = m.group(0)
 
     # HP
     hp = None
-    hp_labels = ["HP", "ホームページ", "オフィシャルサイト", "公式サイト", "公式ホームページ"]
-    for table in soup.find_all("table"):
-        for row in table.find_all("tr"):
-            th = row.find("th")
-            td = row.find("td")
-            if th and td and any(lbl in th.get_text(strip=True) for lbl in hp_labels):
-                a = td.find("a", href=True)
-                if a and a["href"].startswith("http"):
-                    hp = a["href"]
-                    break
-        if hp:
+    for td in index.cells(HP_LABELS):
+        a = td.find("a", href=True)
+        if a and a["href"].startswith("http"):
+            hp = a["href"]
             break
     if not hp:
         for a in soup.find_all("a", href=True):
             text = a.get_text(strip=True)
             href = a["href"]
-            if any(lbl in text for lbl in hp_labels) and href.startswith("http"):
+            if any(lbl in text for lbl in HP_LABELS) and href.startswith("http"):
                 hp = href
                 break
 
@@ -227,60 +289,236 @@ def extract_store_info(html: str) -> Dict[str, Optional[str]]:
         "HP": hp,
     }
 
-def crawl_all_details(list_url: str) -> List[str]:
+async def crawl_all_details(
+    fetcher: AsyncFetcher, list_url: str, queue: asyncio.Queue, predict: bool = True
+) -> int:
     """
-    一覧ページのページネーションを辿って、全詳細URLを収集
+    一覧ページを辿り、見つけた詳細URLをその場でキューに流す。戻り値は収集件数。
+    predict=True の場合は1ページ目の総件数から全ページURLを生成して並列取得し、
+    生成できない / 取得に失敗したページがあれば「次へ」リンクを辿る方式で補う。
+    キューが満杯なら詳細ワーカーが追いつくまで待つ。
     """
-    all_urls: List[str] = []
+    # 一覧をまたいだ重複排除（順序付き集合）。一覧は MAX_LIST_PAGES ページまでなので
+    # 件数は MAX_LIST_PAGES * LIST_PAGE_SIZE を超えない
+    seen_urls: Dict[str, None] = {}
+    # 取得済みページ -> その「次へ」URL
+    next_of: Dict[str, Optional[str]] = {}
+
+    async def load(page_url: str) -> bool:
+        try:
+            html = await fetch_html(fetcher, page_url)
+        except ScrapeError as e:
+            print(f"[WARN] 一覧ページの取得に失敗: {e}")
+            return False
+        detail_urls, nxt, total = parse_list_page(html, page_url)
+        next_of[page_url] = nxt
+        if page_url == list_url:
+            totals.append(total)
+        for u in detail_urls:
+            if u not in seen_urls:
+                seen_urls[u] = None
+                await queue.put(u)
+        return True
+
+    totals: List[Optional[int]] = []
+    if not await load(list_url):
+        print("[ERROR] 1ページ目の取得に失敗したため収集を打ち切ります")
+        return 0
+
+    predicted = None
+    if predict and totals and totals[0]:
+        predicted = predict_page_urls(list_url, totals[0])
+    if predicted:
+        print(f"[INFO] 総件数 {totals[0]} 件から {len(predicted) + 1} ページ分を並列取得")
+        results = await asyncio.gather(*(load(u) for u in predicted))
+        if all(results):
+            return len(seen_urls)
+        print("[INFO] 取得できなかったページがあるため「次へ」リンクで補完します")
+
+    # フォールバック: 「次へ」リンクを辿る（取得済みページは再取得しない）
     seen_pages = set()
-    next_url = list_url
-    while next_url and next_url not in seen_pages:
+    next_url: Optional[str] = list_url
+    while next_url and next_url not in seen_pages and len(seen_pages) < MAX_LIST_PAGES:
         seen_pages.add(next_url)
-        time.sleep(REQUEST_INTERVAL)
-        html = fetch_html(next_url)
-        detail_urls, nxt = parse_list_page_for_detail_urls(html, next_url)
-        # 追加
-        for u in detail_urls:
-            if u not in all_urls:
-                all_urls.append(u)
-        next_url = nxt
-    return all_urls
+        if next_url not in next_of and not await load(next_url):
+            print(f"[ERROR] 一覧ページの取得に失敗したため収集を打ち切ります: {next_url}")
+            break
+        next_url = next_of.get(next_url)
+    return len(seen_urls)
 
-def main():
-    if len(sys.argv) < 3:
-        print("使い方: python tabelog_scrape_all.py <一覧URL(rstLst)> <出力CSV>")
-        sys.exit(1)
-    list_url = sys.argv[1].strip()
-    out_csv = sys.argv[2].strip()
+FIELDNAMES = ["店舗名", "住所", "電話番号", "HP", "詳細URL"]
+
+def parse_detail(url: str, html: str) -> Dict[str, Optional[str]]:
+    info = extract_store_info(html)
+    info["詳細URL"] = url
+    return info
+
+async def detail_worker(
+    fetcher: AsyncFetcher,
+    pool: ParsePool,
+    queue: asyncio.Queue,
+    journal: RunJournal,
+    sink: CsvSink,
+    counter: List[int],
+    retry: RetryQueue,
+) -> None:
+    """
+    キューから詳細URLを取り出して取得・抽出する。None を受け取ったら終了。
+    再試行が必要なURLは retry に預けて次のURLへ進む（期限が来たらキューに戻ってくる）
+    """
+    while True:
+        url = await queue.get()
+        try:
+            if url is None:
+                return
+            # 再開時は完了済みを飛ばす
+            if journal.is_done(url):
+                continue
+            res = await fetcher.fetch_or_defer(url, retry)
+            if res is None:
+                continue
+            counter[0] += 1
+            i = counter[0]
+            try:
+                if not res.ok:
+                    raise ScrapeError(f"Failed to fetch {url}: {res.error}")
+                # デコード・解析はCPU処理なので解析プロセスに任せ、その間も取得を進める
+                info = await pool.run(
+                    decode_and_call, parse_detail, url, res.body, res.encoding, url=url
+                )
+                journal.record_ok(url, [info])
+                sink.write(info)
+                print(f"[{i}] OK: {info.get('店舗名') or ''} ({url})")
+            except Exception as e:
+                journal.record_failure(url, str(e))
+                print(f"[{i}] ERROR: {url} -> {e}")
+        finally:
+            queue.task_done()
 
-    # 詳細URL収集
-    print(f"[INFO] 一覧URLから詳細URLを収集: {list_url}")
-    detail_urls = crawl_all_details(list_url)
-    print(f"[INFO] 収集件数: {len(detail_urls)}")
+async def run_pipeline(
+    fetcher: AsyncFetcher,
+    pool: ParsePool,
+    produce,
+    journal: RunJournal,
+    sink: CsvSink,
+):
+    """
+    produce(queue) が詳細URLを流し込む間、DETAIL_WORKERS 本のワーカーで並行して処理する
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=DETAIL_QUEUE_SIZE)
+    # 一覧は最大 MAX_LIST_PAGES ページなので、再試行待ちの件数は制限しない
+    retry = RetryQueue()
+    counter = [0]
+    workers = [
+        asyncio.create_task(
+            detail_worker(fetcher, pool, queue, journal, sink, counter, retry)
+        )
+        for _ in range(DETAIL_WORKERS)
+    ]
+    feeder = asyncio.create_task(retry.feed(queue))
+    try:
+        total = await produce(queue)
+        # 再試行待ちの分も含めて処理し終えるまで待つ
+        await retry.drain(queue)
+        return total
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        feeder.cancel()
+
+async def scrape(
+    list_url: str, journal: RunJournal, sink: CsvSink, predict: bool = True
+) -> None:
+    async with build_fetcher() as fetcher:
+        pool = ParsePool()
+        try:
+            # 詳細URL収集と詳細取得を並行実行
+            print(f"[INFO] 一覧URLから詳細URLを収集しつつ詳細を取得: {list_url}")
+            total = await run_pipeline(
+                fetcher,
+                pool,
+                lambda q: crawl_all_details(fetcher, list_url, q, predict),
+                journal,
+                sink,
+            )
+            print(f"[INFO] 収集件数: {total}")
+
+            # 失敗分だけ再試行
+            retry_urls = journal.failed_urls()
+            if retry_urls:
+                print(f"[INFO] 失敗分を再試行: {len(retry_urls)} 件")
+
+                async def feed(q: asyncio.Queue) -> None:
+                    for u in retry_urls:
+                        await q.put(u)
+
+                await run_pipeline(fetcher, pool, feed, journal, sink)
+        finally:
+            pool.close()
+
+async def iter_detail_urls(
+    fetcher: AsyncFetcher, list_url: str, predict: bool = True
+) -> AsyncIterator[str]:
+    """crawl_all_details を非同期イテレータにしたもの（一括実行のURL供給元）"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=DETAIL_QUEUE_SIZE)
 
-    # 各詳細をスクレイプ
-    rows: List[Dict[str, Optional[str]]] = []
-    for i, url in enumerate(detail_urls, 1):
+    async def produce() -> None:
         try:
-            time.sleep(REQUEST_INTERVAL)
-            html = fetch_html(url)
-            info = extract_store_info(html)
-            info["詳細URL"] = url
-            rows.append(info)
-            print(f"[{i}/{len(detail_urls)}] OK: {info.get('店舗名') or ''} ({url})")
-        except Exception as e:
-            print(f"[{i}/{len(detail_urls)}] ERROR: {url} -> {e}")
-
-    # CSV保存
-    fieldnames = ["店舗名", "住所", "電話番号", "HP", "詳細URL"]
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+            await crawl_all_details(fetcher, list_url, queue, predict)
+        finally:
+            await queue.put(None)
 
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            url = await queue.get()
+            if url is None:
+                break
+            yield url
+    finally:
+        if not task.done():
+            task.cancel()
+
+def make_adapter(
+    list_url: str, output_csv: str, journal_path: str, predict: bool = True
+) -> SiteAdapter:
+    """一括実行（run_all.py）用のアダプター"""
+    return SiteAdapter(
+        name="tabelog",
+        fetch_config=fetch_config(),
+        urls=lambda fetcher: iter_detail_urls(fetcher, list_url, predict),
+        parse=parse_detail,
+        to_records=lambda info: [info],
+        open_sink=lambda: CsvSink(output_csv, FIELDNAMES, dynamic=False),
+        journal_path=journal_path,
+        workers=DETAIL_WORKERS,
+    )
+
+def main():
+    # --resume: 前回のジャーナル（<出力CSV>.journal.jsonl）から完了済みURLを引き継ぐ
+    resume = "--resume" in sys.argv[1:]
+    # --no-predict: 総件数からのページURL生成をせず「次へ」リンクを順に辿る
+    predict = "--no-predict" not in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a not in ("--resume", "--no-predict")]
+    if len(args) < 2:
+        print("使い方: python tabelog_scrape_all.py <一覧URL(rstLst)> <出力CSV> [--resume] [--no-predict]")
+        sys.exit(1)
+    list_url = args[0].strip()
+    out_csv = args[1].strip()
+    journal_path = out_csv + ".journal.jsonl"
+
+    # CSVは完了したそばから書き出す
+    with RunJournal(journal_path, resume=resume) as journal, CsvSink(
+        out_csv, FIELDNAMES, dynamic=False
+    ) as sink:
+        if resume:
+            for r in journal.iter_records():
+                sink.write(r)
+        asyncio.run(scrape(list_url, journal, sink, predict))
+
+    export_metrics("tabelog")
     print(f"[INFO] 書き出し完了: {out_csv}")
 
 if __name__ == "__main__":
     main()
-